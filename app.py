@@ -2,6 +2,10 @@ import os
 import logging
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
+from compression import CompressionMiddleware
+from fragment_cache import FragmentCacheExtension
+from static_assets import StaticAssets
+from utils import current_data_generation
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -11,6 +15,21 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Compress large HTML/JSON/CSV responses for clients that accept it
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+app.extensions['compression'] = app.wsgi_app
+
+# Content-hashed static URLs with immutable caching and precompressed gzip
+app.extensions['static_assets'] = StaticAssets(app)
+
+# Template fragment caching: {% cache key, data_generation %}
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+@app.context_processor
+def inject_data_generation():
+    # Passed uncalled: {% cache %} resolves it, so pages without cached fragments never look it up
+    return {'data_generation': current_data_generation}
+
 # Import routes after app creation to avoid circular imports
 from routes import *
 from emergency import *
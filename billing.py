@@ -1,52 +1,61 @@
-from flask import render_template, request, redirect, url_for, flash, make_response
+from flask import render_template, request, redirect, url_for, flash, Response, jsonify, send_file, stream_with_context
 from app import app
-from utils import load_patients_from_csv, calculate_dashboard_stats
-from models import ReportData
+from utils import (
+    calculate_dashboard_stats, get_patient_snapshot, iter_filtered_patients,
+    post_payments, get_aging_summary, get_revenue_rollup, get_data_last_modified
+)
+from models import ReportData, ROLLUP_DIMENSIONS
+from response_cache import cached_response
+from billing_anomalies import get_billing_anomalies
+from invoices import start_invoice_job, running_invoice_job, invoice_job_status, invoice_job_file
 from datetime import datetime
 import csv
 import io
+import itertools
 import logging
-from flask import send_file
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+import math
+import tempfile
+from werkzeug.wsgi import wrap_file
+
+# Flagged bills listed on the dashboard; the API returns the full list
+DASHBOARD_ANOMALIES = 10
+
 @app.route('/billing_dashboard')
+@cached_response(daily=True)
 def billing_dashboard():
     """Billing dashboard with financial overview"""
     try:
-        patients = load_patients_from_csv()
-        stats = calculate_dashboard_stats()
-        
-        # Calculate additional billing metrics
-        unpaid_patients = [p for p in patients if p.payment_status == 'Unpaid']
-        partially_paid_patients = [p for p in patients if p.payment_status == 'Partially Paid']
-        fully_paid_patients = [p for p in patients if p.payment_status == 'Fully Paid']
+        snapshot = get_patient_snapshot()
+        patients = snapshot.patients
+        # Payment status counts and the unpaid amount come from the maintained aggregates
+        stats = calculate_dashboard_stats(snapshot)
+        aging = get_aging_summary()
+        anomalies = get_billing_anomalies(snapshot)
         
         billing_stats = {
             **stats,
-            'unpaid_count': len(unpaid_patients),
-            'partially_paid_count': len(partially_paid_patients),
-            'fully_paid_count': len(fully_paid_patients),
-            'unpaid_amount': sum(p.outstanding_amount for p in unpaid_patients),
-            'overdue_amount': sum(p.outstanding_amount for p in patients if p.outstanding_amount > 0)
+            # Every positive balance, as before; the aging summary already sums exactly these
+            'overdue_amount': aging['total_outstanding']
         }
         
         return render_template('billing_dashboard.html', 
                              stats=billing_stats,
+                             aging=aging,
+                             anomaly_summary=anomalies.summary(),
+                             anomalies=anomalies.flagged(DASHBOARD_ANOMALIES),
                              patients=patients[:20])  # Show recent 20 for performance
     except Exception as e:
         logging.error(f"Error loading billing dashboard: {e}")
         return render_template('error.html', error="Error loading billing data")
 
 @app.route('/financial_report')
+@cached_response
 def financial_report():
     """Generate financial report"""
     try:
-        patients = load_patients_from_csv()
-        stats = calculate_dashboard_stats()
+        snapshot = get_patient_snapshot()
+        patients = snapshot.patients
+        stats = calculate_dashboard_stats(snapshot)
         
         # Create report data
         report = ReportData(
@@ -65,157 +74,280 @@ def financial_report():
         logging.error(f"Error generating financial report: {e}")
         return render_template('error.html', error="Error generating financial report")
 
+# Rows formatted per chunk of the streamed CSV export
+CSV_EXPORT_CHUNK_ROWS = 500
+
+def _csv_export_chunks(rows):
+    """Yield the billing CSV a chunk of rows at a time, reusing one small buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([
+        'Patient ID', 'Name', 'Admission Date', 'Bill Amount',
+        'Amount Paid', 'Outstanding Amount', 'Payment Status', 'Insurance Coverage'
+    ])
+    
+    for count, (_, patient) in enumerate(rows, 1):
+        writer.writerow([
+            patient.patient_id,
+            patient.name,
+            patient.admission_date,
+            f"{patient.bill_amount:.2f}",
+            f"{patient.amount_paid:.2f}",
+            f"{patient.outstanding_amount:.2f}",
+            patient.payment_status,
+            patient.insurance_coverage
+        ])
+        if count % CSV_EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
 @app.route('/download_report_data_csv')
 def download_report_data_csv():
-    """Download billing data as CSV"""
+    """Download billing data as CSV, streamed as it is formatted.
+
+    Optional filters: from/to (admission date, YYYY-MM-DD), status
+    (Active/Discharged) and payment_status.
+    """
     try:
-        patients = load_patients_from_csv()
+        admitted_from = request.args.get('from', '')
+        admitted_to = request.args.get('to', '')
+        for value in (admitted_from, admitted_to):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
         
-        # Create CSV data
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            'Patient ID', 'Name', 'Admission Date', 'Bill Amount',
-            'Amount Paid', 'Outstanding Amount', 'Payment Status', 'Insurance Coverage'
-        ])
+        rows = iter_filtered_patients(
+            {'status': request.args.get('status', ''), 'payment_status': request.args.get('payment_status', '')},
+            admitted_from, admitted_to
+        )
         
-        # Write data
-        for patient in patients:
-            writer.writerow([
-                patient.patient_id,
-                patient.name,
-                patient.admission_date,
-                f"{patient.bill_amount:.2f}",
-                f"{patient.amount_paid:.2f}",
-                f"{patient.outstanding_amount:.2f}",
-                patient.payment_status,
-                patient.insurance_coverage
-            ])
-        
-        # Create response
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv'
+        # Keep the request context (and its snapshot) for the rows read while streaming
+        response = Response(stream_with_context(_csv_export_chunks(rows)), mimetype='text/csv')
         response.headers['Content-Disposition'] = f'attachment; filename=billing_report_{datetime.now().strftime("%Y%m%d")}.csv'
-        
         return response
+    except ValueError:
+        return render_template('error.html', error="Invalid date range: use YYYY-MM-DD"), 400
     except Exception as e:
         logging.error(f"Error downloading CSV: {e}")
         return render_template('error.html', error="Error generating CSV download")
 
+def render_billing_pdf(stats: dict, as_of: datetime) -> bytes:
+    """Render the one-page billing summary PDF for a set of dashboard stats, written at `as_of`"""
+    # reportlab is only needed here, so keep it out of worker boot
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # Title
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawCentredString(width / 2, height - 60, "🏥 Hospital Billing Report")
+
+    # When the data was last written, not when the PDF was rendered: the bytes are cached per generation
+    pdf.setFont("Helvetica", 11)
+    pdf.drawCentredString(width / 2, height - 80, f"Data As Of: {as_of.astimezone().strftime('%B %d, %Y %I:%M %p')}")
+
+    # Horizontal line
+    pdf.setStrokeColor(colors.grey)
+    pdf.setLineWidth(0.5)
+    pdf.line(50, height - 90, width - 50, height - 90)
+
+    # Stats section
+    stats_y = height - 130
+    line_height = 22
+
+    def draw_stat(label, value, y_pos):
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.drawString(60, y_pos, f"{label}:")
+        pdf.setFont("Helvetica", 12)
+        pdf.drawString(250, y_pos, value)
+
+    draw_stat("Total Patients", f"{stats['total_patients']}", stats_y)
+    draw_stat("Total Billed", f"₹{stats['total_billed']:,.2f}", stats_y - line_height)
+    draw_stat("Total Paid", f"₹{stats['total_paid']:,.2f}", stats_y - 2 * line_height)
+    draw_stat("Outstanding Amount", f"₹{stats['total_outstanding']:,.2f}", stats_y - 3 * line_height)
+    draw_stat("Collection Rate", f"{stats['collection_rate']:.2f}%", stats_y - 4 * line_height)
+
+    # Optional footer
+    pdf.setFont("Helvetica-Oblique", 9)
+    pdf.setFillColor(colors.grey)
+    pdf.drawRightString(width - 50, 30, "Generated by Hospital Management System")
+
+    # Save the PDF
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
 @app.route('/download_report_pdf')
+@cached_response
 def download_report_pdf():
+    """Billing summary PDF, rendered once per data generation and then served from cache.
+
+    It is stamped with the generation's write time, which stays true for as
+    long as the cached bytes are served.
+    """
     try:
-        patients = load_patients_from_csv()
-        stats = calculate_dashboard_stats()
+        # The PDF only shows the aggregate stats, so no patient rows are loaded
+        response = Response(render_billing_pdf(calculate_dashboard_stats(), get_data_last_modified()),
+                            mimetype='application/pdf')
+        response.headers['Content-Disposition'] = 'attachment; filename=billing_report.pdf'
+        return response
+    except Exception as e:
+        logging.error(f"Error generating PDF: {e}")
+        return render_template('error.html', error="Error generating billing PDF")
+
+# Ledger columns on a landscape letter page: (header, x position, right-aligned, value)
+LEDGER_COLUMNS = [
+    ('Patient ID', 40, False, lambda p: p.patient_id),
+    ('Name', 165, False, lambda p: p.name[:32]),
+    ('Admitted', 345, False, lambda p: p.admission_date),
+    ('Billed', 490, True, lambda p: f"{p.bill_amount:,.2f}"),
+    ('Paid', 570, True, lambda p: f"{p.amount_paid:,.2f}"),
+    ('Outstanding', 660, True, lambda p: f"{p.outstanding_amount:,.2f}"),
+    ('Status', 680, False, lambda p: p.payment_status)
+]
+LEDGER_ROW_HEIGHT = 14
+LEDGER_SPOOL_SIZE = 8 * 1024 * 1024
 
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
+# reportlab holds every finished page until save(), so memory grows with the
+# page count: about 65 MB RSS at this cap; larger exports should use the CSV
+MAX_LEDGER_ROWS = 100000
 
-        # Title
-        pdf.setFont("Helvetica-Bold", 18)
-        pdf.drawCentredString(width / 2, height - 60, "🏥 Hospital Billing Report")
+def render_ledger_pdf(rows, output) -> int:
+    """Draw the per-patient billing ledger into `output`, one page at a time; returns the page count.
 
-        # Timestamp
-        pdf.setFont("Helvetica", 11)
-        pdf.drawCentredString(width / 2, height - 80, f"Generated At: {datetime.now().strftime('%B %d, %Y %I:%M %p')}")
+    Pages are finalized with showPage() as soon as they are full, but the
+    canvas keeps them all until save(), so callers bound the row count.
+    """
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib import colors
 
-        # Horizontal line
+    pagesize = landscape(letter)
+    width, height = pagesize
+    pdf = canvas.Canvas(output, pagesize=pagesize, pageCompression=1)
+    generated_at = datetime.now().strftime('%B %d, %Y %I:%M %p')
+
+    def start_page():
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(40, height - 40, "Hospital Patient Billing Ledger")
+        pdf.setFont("Helvetica", 9)
+        pdf.drawRightString(width - 40, height - 40, f"Generated At: {generated_at}")
+        pdf.setFont("Helvetica-Bold", 9)
+        for header, x, right, _ in LEDGER_COLUMNS:
+            draw = pdf.drawRightString if right else pdf.drawString
+            draw(x, height - 65, header)
         pdf.setStrokeColor(colors.grey)
-        pdf.setLineWidth(0.5)
-        pdf.line(50, height - 90, width - 50, height - 90)
-
-        # Stats section
-        stats_y = height - 130
-        line_height = 22
-
-        def draw_stat(label, value, y_pos):
-            pdf.setFont("Helvetica-Bold", 12)
-            pdf.drawString(60, y_pos, f"{label}:")
-            pdf.setFont("Helvetica", 12)
-            pdf.drawString(250, y_pos, value)
-
-        draw_stat("Total Patients", f"{stats['total_patients']}", stats_y)
-        draw_stat("Total Billed", f"₹{stats['total_billed']:,.2f}", stats_y - line_height)
-        draw_stat("Total Paid", f"₹{stats['total_paid']:,.2f}", stats_y - 2 * line_height)
-        draw_stat("Outstanding Amount", f"₹{stats['total_outstanding']:,.2f}", stats_y - 3 * line_height)
-        draw_stat("Collection Rate", f"{stats['collection_rate']:.2f}%", stats_y - 4 * line_height)
-
-        # Optional footer
-        pdf.setFont("Helvetica-Oblique", 9)
-        pdf.setFillColor(colors.grey)
-        pdf.drawRightString(width - 50, 30, "Generated by Hospital Management System")
+        pdf.line(40, height - 70, width - 40, height - 70)
+        # One text object per page keeps the content stream far smaller than a drawString per cell
+        body = pdf.beginText()
+        body.setFont("Helvetica", 9)
+        return body, height - 85
 
-        # Save the PDF
+    def finish_page(body):
+        pdf.drawText(body)
+        pdf.setFont("Helvetica-Oblique", 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawRightString(width - 40, 25, f"Page {page}")
+        pdf.setFillColor(colors.black)
         pdf.showPage()
-        pdf.save()
-        buffer.seek(0)
-
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name='billing_report.pdf',
-            mimetype='application/pdf'
-        )
+
+    totals = {'count': 0, 'billed': 0.0, 'paid': 0.0, 'outstanding': 0.0}
+    page = 1
+    body, y = start_page()
+    for _, patient in rows:
+        if y < 50:
+            finish_page(body)
+            page += 1
+            body, y = start_page()
+        for _, x, right, value in LEDGER_COLUMNS:
+            text = value(patient)
+            body.setTextOrigin(x - pdf.stringWidth(text, "Helvetica", 9) if right else x, y)
+            body.textOut(text)
+        y -= LEDGER_ROW_HEIGHT
+        totals['count'] += 1
+        totals['billed'] += patient.bill_amount
+        totals['paid'] += patient.amount_paid
+        totals['outstanding'] += patient.outstanding_amount
+
+    if y < 80:
+        finish_page(body)
+        page += 1
+        body, y = start_page()
+    pdf.line(40, y + 4, width - 40, y + 4)
+    pdf.setFont("Helvetica-Bold", 9)
+    pdf.drawString(40, y - 10, f"{totals['count']} patients")
+    for key, (_, x, _, _) in zip(('billed', 'paid', 'outstanding'), LEDGER_COLUMNS[3:6]):
+        pdf.drawRightString(x, y - 10, f"{totals[key]:,.2f}")
+    finish_page(body)
+    pdf.save()
+    return page
+
+@app.route('/download_ledger_pdf')
+def download_ledger_pdf():
+    """Full per-patient billing ledger as a multi-page PDF.
+
+    Accepts the same from/to/status/payment_status filters as the CSV
+    export, and answers 400 when more than MAX_LEDGER_ROWS (100k) rows
+    match; reportlab keeps every page in memory until save(), so a full
+    100k-row ledger peaks at about 65 MB RSS. The PDF is written to a
+    spooled temp file, which moves to disk past 8 MB, and streamed back
+    from there.
+    """
+    try:
+        admitted_from = request.args.get('from', '')
+        admitted_to = request.args.get('to', '')
+        for value in (admitted_from, admitted_to):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        
+        rows = list(itertools.islice(iter_filtered_patients(
+            {'status': request.args.get('status', ''), 'payment_status': request.args.get('payment_status', '')},
+            admitted_from, admitted_to
+        ), MAX_LEDGER_ROWS + 1))
+        if len(rows) > MAX_LEDGER_ROWS:
+            return render_template('error.html', error=f"The ledger PDF is limited to {MAX_LEDGER_ROWS:,} patients: "
+                                                       "narrow the filters or download the CSV export"), 400
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=LEDGER_SPOOL_SIZE)
+        pages = render_ledger_pdf(rows, spool)
+        size = spool.tell()
+        spool.seek(0)
+        
+        response = Response(wrap_file(request.environ, spool), mimetype='application/pdf', direct_passthrough=True)
+        response.content_length = size
+        response.headers['Content-Disposition'] = f'attachment; filename=billing_ledger_{datetime.now().strftime("%Y%m%d")}.pdf'
+        response.headers['X-Page-Count'] = str(pages)
+        return response
+    except ValueError:
+        return render_template('error.html', error="Invalid date range: use YYYY-MM-DD"), 400
     except Exception as e:
-        logging.error(f"Error generating PDF: {e}")
-        return render_template('error.html', error="Error generating billing PDF")
+        logging.error(f"Error generating ledger PDF: {e}")
+        return render_template('error.html', error="Error generating ledger PDF")
 
 @app.route('/update_payment/<patient_id>', methods=['POST'])
 def update_payment(patient_id):
     """Update patient payment information"""
     try:
-        patients = load_patients_from_csv()
-        patient = next((p for p in patients if p.patient_id == patient_id), None)
-        
-        if not patient:
-            flash('Patient not found.', 'error')
-            return redirect(url_for('billing_dashboard'))
-        
         # Get payment amount from form
         payment_amount = float(request.form.get('payment_amount', 0))
         
-        if payment_amount <= 0:
+        if not (payment_amount > 0 and math.isfinite(payment_amount)):
             flash('Please enter a valid payment amount.', 'error')
             return redirect(url_for('billing_dashboard'))
         
-        # Update payment information
-        patient.amount_paid += payment_amount
-        patient.outstanding_amount = patient.bill_amount - patient.amount_paid
-        
-        # Update payment status
-        if patient.outstanding_amount <= 0:
-            patient.payment_status = 'Fully Paid'
-            patient.outstanding_amount = 0
-        elif patient.amount_paid > 0:
-            patient.payment_status = 'Partially Paid'
-        else:
-            patient.payment_status = 'Unpaid'
-        
-        # Save updated data (recreate CSV for simplicity)
-        import os
-        with open('patient_records_with_timestamp.csv', 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'patient_id', 'name', 'age', 'gender', 'locality',
-                'condition_severity', 'priority_level', 'medical_history',
-                'bill_amount', 'amount_paid', 'outstanding_amount',
-                'payment_status', 'insurance_coverage', 'insurance_details',
-                'admission_date', 'discharge_date', 'timestamp'
-            ])
-            
-            for p in patients:
-                writer.writerow([
-                    p.patient_id, p.name, p.age, p.gender,
-                    p.locality, p.condition_severity, p.priority_level,
-                    p.medical_history, p.bill_amount, p.amount_paid,
-                    p.outstanding_amount, p.payment_status,
-                    p.insurance_coverage, p.insurance_details,
-                    p.admission_date, p.discharge_date or '',
-                    p.timestamp or datetime.now().isoformat()
-                ])
+        # Same locked read-update-rewrite as batch payments, so concurrent writes are not lost
+        results = post_payments([(patient_id, payment_amount, '')])
+        if results is None:
+            flash('Error updating payment. Please try again.', 'error')
+            return redirect(url_for('billing_dashboard'))
+        if results[0][0] == 'not_found':
+            flash('Patient not found.', 'error')
+            return redirect(url_for('billing_dashboard'))
         
         flash(f'Payment of ₹{payment_amount:.2f} recorded successfully.', 'success')
         return redirect(url_for('billing_dashboard'))
@@ -227,3 +359,182 @@ def update_payment(patient_id):
         logging.error(f"Error updating payment: {e}")
         flash('Error updating payment. Please try again.', 'error')
         return redirect(url_for('billing_dashboard'))
+
+MAX_BATCH_PAYMENTS = 5000
+
+def _read_payment_rows():
+    """Payment rows from a JSON array, an uploaded CSV file or a text/csv body"""
+    if request.is_json:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of payments')
+        return rows
+    upload = request.files.get('file')
+    text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+    if not text.strip():
+        raise ValueError('Expected a JSON array or a CSV with patient_id, amount and reference columns')
+    return list(csv.DictReader(io.StringIO(text)))
+
+@app.route('/api/payments/batch', methods=['POST'])
+def batch_payments():
+    """Post many payments (patient_id, amount, reference) with a single file rewrite.
+
+    References are remembered across batches: a row whose reference was
+    already applied is reported as an error instead of being paid again.
+    """
+    try:
+        rows = _read_payment_rows()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not rows:
+        return jsonify({'error': 'No payments supplied'}), 400
+    if len(rows) > MAX_BATCH_PAYMENTS:
+        return jsonify({'error': f'At most {MAX_BATCH_PAYMENTS} payments per request'}), 400
+    
+    try:
+        results, payments, accepted_rows, references = [], [], [], set()
+        for row_number, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results.append({'row': row_number, 'status': 'error', 'error': 'must be an object'})
+                continue
+            patient_id = str(row.get('patient_id') or '').strip()
+            reference = str(row.get('reference') or '').strip()
+            outcome = {'row': row_number, 'patient_id': patient_id, 'reference': reference}
+            try:
+                amount = float(row.get('amount'))
+            except (TypeError, ValueError):
+                amount = 0
+            
+            if not patient_id:
+                error = 'patient_id is required'
+            elif not (amount > 0 and math.isfinite(amount)):
+                error = 'amount must be a positive number'
+            elif reference and reference in references:
+                error = 'duplicate reference in this batch'
+            else:
+                error = None
+            if error:
+                results.append({**outcome, 'status': 'error', 'error': error})
+                continue
+            
+            references.add(reference)
+            payments.append((patient_id, amount, reference))
+            accepted_rows.append(len(results))
+            results.append({**outcome, 'amount': amount})
+        
+        updated = post_payments(payments) if payments else []
+        if updated is None:
+            return jsonify({'error': 'Error saving payments'}), 500
+        
+        for result_index, (status, patient) in zip(accepted_rows, updated):
+            if status == 'not_found':
+                results[result_index].update(status='error', error='patient not found')
+            elif status == 'duplicate_reference':
+                # A resubmitted remittance: the payment was already posted by an earlier batch
+                results[result_index].update(status='error', error='reference already applied')
+            else:
+                results[result_index].update(
+                    status='applied',
+                    amount_paid=patient.amount_paid,
+                    outstanding_amount=patient.outstanding_amount,
+                    payment_status=patient.payment_status
+                )
+        
+        applied = sum(1 for result in results if result['status'] == 'applied')
+        return jsonify({'applied': applied, 'failed': len(results) - applied, 'results': results})
+    except Exception as e:
+        logging.error(f"Error posting batch payments: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/billing/aging')
+def billing_aging():
+    """Receivables aging buckets, overall and per insurance coverage"""
+    try:
+        return jsonify(get_aging_summary())
+    except Exception as e:
+        logging.error(f"Error loading receivables aging: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/billing/rollup')
+@cached_response
+def billing_rollup():
+    """Billed/paid/outstanding per day or month, optionally split by payment status or coverage"""
+    grain = request.args.get('grain', 'month')
+    by = request.args.get('by') or None
+    if grain not in ('day', 'month'):
+        return jsonify({'error': "grain must be 'day' or 'month'"}), 400
+    if by is not None and by not in ROLLUP_DIMENSIONS:
+        return jsonify({'error': f"by must be one of {list(ROLLUP_DIMENSIONS)}"}), 400
+    try:
+        series = get_revenue_rollup().series(grain, by, request.args.get('from', ''), request.args.get('to', ''))
+        return jsonify({'grain': grain, 'by': by, 'series': series})
+    except Exception as e:
+        logging.error(f"Error loading revenue rollup: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/billing/anomalies')
+@cached_response
+def billing_anomalies():
+    """Outlier charges and overpayments, overpayments first and then by descending score"""
+    limit = request.args.get('limit', type=int)
+    try:
+        anomalies = get_billing_anomalies(get_patient_snapshot())
+        return jsonify({**anomalies.summary(), 'anomalies': anomalies.flagged(limit)})
+    except Exception as e:
+        logging.error(f"Error scoring billing anomalies: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/invoices/batch', methods=['POST'])
+def start_batch_invoices():
+    """Start rendering an invoice PDF for every patient with an outstanding balance.
+
+    Optional JSON body: {"period": "YYYY-MM", "workers": N}, with workers
+    capped at the number of cores. Returns 202 with the job status; poll its
+    URL for progress and download the ZIP when done. Only one batch runs at
+    a time: while one is running this returns 409.
+    """
+    payload = request.get_json(silent=True) or {}
+    period = str(payload.get('period') or datetime.now().strftime('%Y-%m'))
+    workers = payload.get('workers')
+    try:
+        datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'period must be YYYY-MM'}), 400
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        return jsonify({'error': 'workers must be a positive integer'}), 400
+    try:
+        patients = [p for p in get_patient_snapshot().patients if p.outstanding_amount > 0]
+        job = start_invoice_job(patients, period, workers)
+        if job is None:
+            return jsonify({'error': 'Another invoice batch is still running', 'job': running_invoice_job()}), 409
+        response = jsonify(job)
+        response.status_code = 202
+        response.headers['Location'] = url_for('batch_invoices_status', job_id=job['id'])
+        return response
+    except Exception as e:
+        logging.error(f"Error starting invoice batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/invoices/batch/<job_id>')
+def batch_invoices_status(job_id):
+    """Progress of a batch invoice job"""
+    job = invoice_job_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown invoice job'}), 404
+    if job['status'] == 'done':
+        job['download'] = url_for('download_batch_invoices', job_id=job_id)
+    response = jsonify(job)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/invoices/batch/<job_id>/download')
+def download_batch_invoices(job_id):
+    """ZIP of a finished batch invoice job"""
+    path = invoice_job_file(job_id)
+    if path is None:
+        job = invoice_job_status(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown invoice job'}), 404
+        return jsonify({'error': f"Invoice job is {job['status']}", **job}), 409
+    return send_file(path, mimetype='application/zip', as_attachment=True,
+                     download_name=f"invoices_{invoice_job_status(job_id)['period']}.zip")
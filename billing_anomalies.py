@@ -0,0 +1,113 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+# Modified z-score above which a bill counts as an outlier (Iglewicz & Hoaglin)
+ANOMALY_THRESHOLD = 3.5
+
+# (medical_history, severity) groups smaller than this are scored against the whole severity
+MIN_GROUP_SIZE = 5
+
+# Scores for the latest data generation, shared by the dashboard and the API
+_anomaly_cache = {}
+_anomaly_lock = threading.Lock()
+
+def _robust_stats(df, keys: List[str]):
+    """Per-row group size, median and scale of the bill amount for the given grouping"""
+    import numpy as np
+
+    grouped = df.groupby(keys, sort=False, observed=True)['bill']
+    size = grouped.transform('size').to_numpy()
+    median = grouped.transform('median').to_numpy()
+    deviation = np.abs(df['bill'].to_numpy() - median)
+    deviations = df[keys].assign(deviation=deviation).groupby(keys, sort=False, observed=True)['deviation']
+    # 0.6745 * (x - median) / MAD, or the mean absolute deviation when over half the group shares the median
+    mad = deviations.transform('median').to_numpy() / 0.6745
+    mean_ad = deviations.transform('mean').to_numpy() * 1.253314
+    return size, median, np.where(mad > 0, mad, mean_ad)
+
+class BillingAnomalies:
+    """Outlier charges and overpayments over one patient list, scored in a single vectorized pass.
+
+    A bill is scored against the median and MAD of bills with the same
+    medical history and severity, or of the whole severity when that group is
+    too small to say what normal looks like.
+    """
+
+    def __init__(self, patients: List):
+        # Imported here so app start-up does not pay for pandas
+        import numpy as np
+        import pandas as pd
+
+        self.patients = patients
+        df = pd.DataFrame({
+            'history': pd.Categorical([p.medical_history or 'Unknown' for p in patients]),
+            'severity': pd.Categorical([p.condition_severity or 'Unknown' for p in patients]),
+            'bill': np.fromiter((p.bill_amount for p in patients), dtype=float, count=len(patients)),
+            'paid': np.fromiter((p.amount_paid for p in patients), dtype=float, count=len(patients))
+        })
+
+        if len(df):
+            group_size, group_median, group_scale = _robust_stats(df, ['history', 'severity'])
+            _, severity_median, severity_scale = _robust_stats(df, ['severity'])
+        else:
+            group_size = group_median = group_scale = severity_median = severity_scale = np.zeros(0)
+        use_group = group_size >= MIN_GROUP_SIZE
+        self.median = np.where(use_group, group_median, severity_median)
+        scale = np.where(use_group, group_scale, severity_scale)
+
+        bill = df['bill'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.score = np.where(scale > 0, (bill - self.median) / scale, 0.0)
+        self.high_charge = self.score > ANOMALY_THRESHOLD
+        self.overpaid = df['paid'].to_numpy() > bill + 0.005
+        self.grouping = np.where(use_group, 'history+severity', 'severity')
+
+        flagged = np.flatnonzero(self.high_charge | self.overpaid)
+        # Overpayments first, then the most extreme charges
+        order = np.lexsort((-self.score[flagged], ~self.overpaid[flagged]))
+        self.flagged_positions = flagged[order]
+
+    def _describe(self, position: int) -> Dict[str, Any]:
+        patient = self.patients[position]
+        reasons = []
+        if self.overpaid[position]:
+            reasons.append('payment exceeds bill')
+        if self.high_charge[position]:
+            reasons.append(f"charge has modified z-score {self.score[position]:.1f} within its {self.grouping[position]} group")
+        return {
+            'patient_id': patient.patient_id,
+            'name': patient.name,
+            'medical_history': patient.medical_history,
+            'condition_severity': patient.condition_severity,
+            'bill_amount': patient.bill_amount,
+            'amount_paid': patient.amount_paid,
+            'typical_bill': round(float(self.median[position]), 2),
+            'score': round(float(self.score[position]), 2),
+            'reasons': reasons
+        }
+
+    def flagged(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Flagged patients, overpayments first, then by descending score"""
+        return [self._describe(int(position)) for position in self.flagged_positions[:limit]]
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'scored': len(self.patients),
+            'flagged': len(self.flagged_positions),
+            'high_charges': int(self.high_charge.sum()),
+            'overpayments': int(self.overpaid.sum())
+        }
+
+def get_billing_anomalies(snapshot) -> BillingAnomalies:
+    """Anomaly scores for a patient snapshot, computed once per data generation"""
+    with _anomaly_lock:
+        cached = _anomaly_cache.get('anomalies')
+        if cached is not None and snapshot.generation is not None and _anomaly_cache.get('generation') == snapshot.generation:
+            return cached
+
+        anomalies = BillingAnomalies(snapshot.patients)
+        logging.debug(f"Scored {len(snapshot.patients)} bills, {len(anomalies.flagged_positions)} flagged")
+        if snapshot.generation is not None:
+            _anomaly_cache.update(generation=snapshot.generation, anomalies=anomalies)
+        return anomalies
@@ -0,0 +1,165 @@
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from werkzeug.http import parse_accept_header
+
+# Content types worth compressing; images, PDFs and archives are already compressed
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml'
+)
+
+# zlib window bits per Content-Encoding (gzip container vs zlib-wrapped deflate)
+ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+_ETAG_SUFFIX = re.compile(r'-(gzip|deflate)"')
+
+class CompressionMiddleware:
+    """WSGI middleware that gzip/deflate-compresses responses chunk by chunk.
+
+    The body is never buffered beyond `min_size` bytes: that much is peeked to
+    skip tiny payloads, then every chunk from the app is compressed and yielded
+    as it arrives, so streamed exports keep streaming.
+    """
+
+    def __init__(self, app, min_size: int = 1024, level: int = 6, flush_size: int = 64 * 1024):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.flush_size = flush_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.responses_compressed = 0
+        self.responses_skipped = 0
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'responses_compressed': self.responses_compressed,
+            'responses_skipped': self.responses_skipped,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_saved': self.bytes_in - self.bytes_out
+        }
+
+    def _negotiate(self, environ) -> Optional[str]:
+        accept = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        return accept.best_match(list(ENCODINGS)) if accept else None
+
+    def _should_compress(self, status: str, headers: List[Tuple[str, str]], peeked: int, finished: bool) -> bool:
+        if not status.startswith('200'):
+            return False
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map or 'no-transform' in header_map.get('cache-control', ''):
+            return False
+        if not header_map.get('content-type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = header_map.get('content-length')
+        size = int(length) if length and length.isdigit() else (peeked if finished else None)
+        return size is None or size >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self._negotiate(environ)
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        # Our ETags carry an encoding suffix; the app only knows the bare tag
+        validated_encoded = False
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            environ['HTTP_IF_NONE_MATCH'], stripped = _ETAG_SUFFIX.subn('"', environ['HTTP_IF_NONE_MATCH'])
+            validated_encoded = stripped > 0
+
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'], captured['exc_info'] = status, headers, exc_info
+            return self._write_unsupported
+
+        app_iter = self.app(environ, capture_start_response)
+        return self._respond(app_iter, captured, encoding, start_response, validated_encoded)
+
+    @staticmethod
+    def _write_unsupported(data):
+        raise RuntimeError("CompressionMiddleware does not support the WSGI write() callable")
+
+    def _respond(self, app_iter: Iterable[bytes], captured: Dict, encoding: str, start_response,
+                 validated_encoded: bool = False):
+        iterator = iter(app_iter)
+        try:
+            # Peek just enough of the body to decide whether compressing is worthwhile
+            peeked, peeked_size, finished = [], 0, False
+            while peeked_size < self.min_size:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    finished = True
+                    break
+                peeked.append(chunk)
+                peeked_size += len(chunk)
+
+            status, headers = captured['status'], captured['headers']
+            if not self._should_compress(status, headers, peeked_size, finished):
+                with self._lock:
+                    self.responses_skipped += 1
+                # A 304 names the representation the client holds: encoded only if it sent an encoded tag
+                if status.startswith('304') and validated_encoded:
+                    headers = self._tag_headers(headers, encoding, strip_length=False)
+                start_response(status, headers, captured['exc_info'])
+                yield from peeked
+                if not finished:
+                    yield from iterator
+                return
+
+            start_response(status, self._tag_headers(headers, encoding), captured['exc_info'])
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, ENCODINGS[encoding])
+            bytes_in = bytes_out = pending = 0
+
+            for chunk in self._chain(peeked, iterator, finished):
+                bytes_in += len(chunk)
+                pending += len(chunk)
+                data = compressor.compress(chunk)
+                if pending >= self.flush_size:
+                    # Push data out for long streams instead of holding it in zlib
+                    data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                    pending = 0
+                if data:
+                    bytes_out += len(data)
+                    yield data
+
+            data = compressor.flush()
+            bytes_out += len(data)
+            yield data
+
+            with self._lock:
+                self.responses_compressed += 1
+                self.bytes_in += bytes_in
+                self.bytes_out += bytes_out
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _chain(peeked: List[bytes], iterator, finished: bool):
+        yield from peeked
+        if not finished:
+            yield from iterator
+
+    @staticmethod
+    def _tag_headers(headers: List[Tuple[str, str]], encoding: str, strip_length: bool = True) -> List[Tuple[str, str]]:
+        """Add Content-Encoding/Vary and give the encoded representation its own ETag"""
+        tagged = []
+        for name, value in headers:
+            lower = name.lower()
+            if strip_length and lower == 'content-length':
+                continue
+            if lower == 'etag' and value.endswith('"') and not value.startswith('W/'):
+                value = f'{value[:-1]}-{encoding}"'
+            if lower == 'vary':
+                continue
+            tagged.append((name, value))
+        vary = [value for name, value in headers if name.lower() == 'vary']
+        tagged.append(('Vary', ', '.join(vary + ['Accept-Encoding'])))
+        if strip_length:
+            tagged.append(('Content-Encoding', encoding))
+        return tagged
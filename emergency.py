@@ -1,6 +1,6 @@
 from flask import render_template, request, redirect, url_for, flash
 from app import app
-from utils import get_emergency_cases, load_patients_from_csv, save_patient_to_csv, generate_patient_id, save_emergency_case_to_csv, remove_emergency_case_from_csv, get_next_emergency_case
+from utils import get_emergency_cases, generate_patient_id, save_emergency_case, pop_next_emergency_case
 from models import Patient, EmergencyCase
 from datetime import datetime
 import logging
@@ -60,8 +60,8 @@ def add_emergency():
             formatted_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
         
-        # Save to emergency CSV
-        if save_emergency_case_to_csv(emergency_case):
+        # Add to the emergency queue
+        if save_emergency_case(emergency_case):
             flash(f'Emergency case for {name} added successfully to the queue.', 'success')
         else:
             flash('Error adding emergency case to the queue.', 'error')
@@ -77,20 +77,13 @@ def add_emergency():
 def process_next_emergency():
     """Process the next emergency case"""
     try:
-        cases = get_emergency_cases()
+        # Take the highest priority case off the queue in one step, so two staff cannot both process it
+        next_case = pop_next_emergency_case()
         
-        if not cases:
+        if next_case is None:
             flash('No emergency cases to process.', 'info')
-            return redirect(url_for('emergency'))
-        
-        # Get the highest priority case
-        next_case = cases[0]
-        
-        # Remove the case from emergency queue
-        if remove_emergency_case_from_csv(next_case.patient_id):
-            flash(f'Emergency case for {next_case.name} ({next_case.condition}) has been processed and removed from the queue.', 'success')
         else:
-            flash('Error processing emergency case.', 'error')
+            flash(f'Emergency case for {next_case.name} ({next_case.condition}) has been processed and removed from the queue.', 'success')
         
         return redirect(url_for('emergency'))
         
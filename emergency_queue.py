@@ -0,0 +1,176 @@
+import fcntl
+import heapq
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from models import EmergencyCase
+
+# Compact once the journal holds this many more events than live cases
+COMPACT_MIN_DEAD_EVENTS = 1000
+
+class EmergencyQueue:
+    """Emergency cases in a binary heap ordered by (priority_level, time_added, arrival).
+
+    Every change is appended to a JSON-lines journal of add/remove events.
+    Each process replays the journal on first use and then only reads the
+    events appended since its last operation, so all workers see the same
+    queue without re-reading or re-sorting the whole file. Removed cases are
+    dropped from the heap lazily, but never left on top, so push/pop are
+    O(log n). Once dead events dominate, the journal is rewritten
+    with just the live cases and swapped in atomically.
+    """
+
+    def __init__(self, path: str, seed: Optional[Callable[[], List[EmergencyCase]]] = None,
+                 after_seed: Optional[Callable[[], None]] = None):
+        self.path = path
+        # Cases imported into a new journal on first use (e.g. from the old CSV queue)
+        self.seed = seed
+        # Called, still under the lock, once the seeded journal is in place: retiring the seed's
+        # source there keeps a lost journal from bringing back cases already treated
+        self.after_seed = after_seed
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._heap: List[Tuple[int, str, int]] = []
+        self._cases: Dict[int, EmergencyCase] = {}
+        self._next_id = 0
+        self._events = 0
+        # Cases in treatment order, rebuilt on the first read after a change
+        self._sorted: Optional[List[EmergencyCase]] = None
+        # (device, inode) and read offset of the journal this state was replayed from
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._offset = 0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Thread and process lock, with the in-memory heap caught up with the journal"""
+        with self._lock, open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._file_id is not None:
+                self._reset()
+            seeded = self.seed() if self.seed else []
+            if seeded:
+                self._write_journal(seeded)
+                logging.info(f"Seeded emergency journal {self.path} with {len(seeded)} cases")
+                if self.after_seed:
+                    self.after_seed()
+            else:
+                return
+            stat = os.stat(self.path)
+
+        if self._file_id != (stat.st_dev, stat.st_ino) or stat.st_size < self._offset:
+            # First use, or another process compacted the journal: replay it from the start
+            self._reset()
+            self._file_id = (stat.st_dev, stat.st_ino)
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn final write: stop before it and retry from here next time
+                    break
+                self._offset += len(line)
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    logging.error(f"Skipping bad emergency journal entry at {self._offset}: {e}")
+
+    def _apply(self, event: dict) -> None:
+        self._events += 1
+        self._sorted = None
+        case_id = event['id']
+        if event['op'] == 'add':
+            case = EmergencyCase(**event['case'])
+            self._cases[case_id] = case
+            heapq.heappush(self._heap, (case.priority_level, case.time_added, case_id))
+            self._next_id = max(self._next_id, case_id + 1)
+        elif event['op'] == 'remove':
+            self._cases.pop(case_id, None)
+            self._drop_dead_top()
+
+    def _drop_dead_top(self) -> None:
+        while self._heap and self._heap[0][2] not in self._cases:
+            heapq.heappop(self._heap)
+
+    def _append(self, events: List[dict]) -> None:
+        data = ''.join(json.dumps(event) + '\n' for event in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if os.fstat(f.fileno()).st_size > self._offset:
+                # _sync stopped before a torn line: end it so it cannot swallow the first new event
+                data = '\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Apply the events by reading them back, so offsets follow the file and match other processes
+        self._sync()
+
+    def _write_journal(self, cases: List[EmergencyCase]) -> None:
+        """Atomically replace the journal with one add event per case, renumbered from 0"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for case_id, case in enumerate(cases):
+                f.write(json.dumps({'op': 'add', 'id': case_id, 'case': asdict(case)}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _maybe_compact(self) -> None:
+        if self._events - len(self._cases) < max(COMPACT_MIN_DEAD_EVENTS, len(self._cases)):
+            return
+        self._write_journal(self._ordered())
+        logging.info(f"Compacted emergency journal from {self._events} to {len(self._cases)} events")
+        # Replay our own compacted file so IDs and offsets match what other processes will read
+        self._reset()
+        self._sync()
+
+    def _ordered(self) -> List[EmergencyCase]:
+        if self._sorted is None:
+            self._sorted = [self._cases[case_id] for _, _, case_id in sorted(self._heap) if case_id in self._cases]
+        return self._sorted
+
+    def push(self, case: EmergencyCase) -> None:
+        """Add a case to the queue"""
+        with self._locked():
+            self._append([{'op': 'add', 'id': self._next_id, 'case': asdict(case)}])
+
+    def pop(self) -> Optional[EmergencyCase]:
+        """Remove and return the highest-priority case; one process gets each case"""
+        with self._locked():
+            if not self._heap:
+                return None
+            case_id = self._heap[0][2]
+            case = self._cases[case_id]
+            self._append([{'op': 'remove', 'id': case_id}])
+            self._maybe_compact()
+            return case
+
+    def cases(self) -> List[EmergencyCase]:
+        """All queued cases in treatment order, sorted once per change to the queue"""
+        with self._locked():
+            return list(self._ordered())
+
+    def exists(self) -> bool:
+        """Whether a journal (or a seed for one) exists yet"""
+        with self._locked():
+            return self._file_id is not None
+
+    def __len__(self) -> int:
+        with self._locked():
+            return len(self._cases)
@@ -0,0 +1,47 @@
+import logging
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from bounded_cache import BoundedCache
+
+# Rendered template fragments, bounded so stale generations age out
+fragment_store = BoundedCache(max_entries=256, max_bytes=16 * 1024 * 1024)
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag caching a rendered block until its key changes.
+
+        {% cache 'billing_stats', data_generation %} ... {% endcache %}
+
+    The key is scoped to the template and line, so the same name may be reused
+    across templates. Callable key parts (like `data_generation`) are called
+    when the block renders. A None anywhere in the key disables caching for
+    that render (e.g. a snapshot read while a write was landing).
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [nodes.Const(parser.name), nodes.Const(lineno), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key_parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        key_parts = [part() if callable(part) else part for part in key_parts]
+        if any(part is None for part in key_parts):
+            return caller()
+
+        key = tuple(key_parts)
+        cached = fragment_store.get(key)
+        if cached is not None:
+            return Markup(cached)
+
+        rendered = caller()
+        fragment_store.put(key, str(rendered), len(rendered))
+        logging.debug(f"Cached template fragment {key[:3]}")
+        return rendered
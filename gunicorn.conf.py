@@ -0,0 +1,17 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+wsgi_app = 'main:app'
+
+# "blocking" warms each worker before it accepts connections; "background"
+# accepts straight away and reports progress on /api/ready until warm
+WARMUP_MODE = os.environ.get('WARMUP_MODE', 'blocking')
+
+def post_fork(server, worker):
+    if WARMUP_MODE == 'off':
+        return
+    from main import app
+    from warmup import warm_up
+    server.log.info(f"Worker {worker.pid} warming up ({WARMUP_MODE})")
+    warm_up(app, background=WARMUP_MODE == 'background')
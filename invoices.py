@@ -0,0 +1,272 @@
+import fcntl
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Invoices per task sent to a worker: large enough to amortize pickling, small enough for steady progress
+INVOICE_CHUNK_SIZE = 25
+
+# Patient fields an invoice prints; only these are pickled to the workers
+INVOICE_FIELDS = ('patient_id', 'name', 'locality', 'admission_date', 'discharge_date',
+                  'medical_history', 'condition_severity', 'insurance_coverage', 'insurance_details',
+                  'bill_amount', 'amount_paid', 'outstanding_amount', 'payment_status')
+
+def invoice_fields(patient) -> Dict[str, Any]:
+    return {name: getattr(patient, name) for name in INVOICE_FIELDS}
+
+def render_invoice_pdf(invoice: Dict[str, Any], period: str, issued: str) -> bytes:
+    """Render one patient's invoice PDF"""
+    # reportlab is only needed here, so keep it out of worker boot
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    width, height = letter
+
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawString(50, height - 60, "Hospital Invoice")
+    pdf.setFont("Helvetica", 10)
+    pdf.drawRightString(width - 50, height - 50, f"Invoice INV-{period}-{invoice['patient_id']}")
+    pdf.drawRightString(width - 50, height - 64, f"Issued {issued}")
+    pdf.setStrokeColor(colors.grey)
+    pdf.setLineWidth(0.5)
+    pdf.line(50, height - 75, width - 50, height - 75)
+
+    def draw_field(label, value, y_pos, x=50):
+        pdf.setFont("Helvetica-Bold", 11)
+        pdf.drawString(x, y_pos, f"{label}:")
+        pdf.setFont("Helvetica", 11)
+        pdf.drawString(x + 130, y_pos, str(value or '-')[:60])
+
+    y = height - 105
+    for label, key in (("Patient", 'name'), ("Patient ID", 'patient_id'), ("Locality", 'locality'),
+                       ("Admitted", 'admission_date'), ("Discharged", 'discharge_date'),
+                       ("Treatment", 'medical_history'), ("Severity", 'condition_severity'),
+                       ("Insurance", 'insurance_coverage'), ("Insurance Details", 'insurance_details')):
+        draw_field(label, invoice[key], y)
+        y -= 20
+
+    y -= 10
+    pdf.line(50, y + 12, width - 50, y + 12)
+    for label, key in (("Amount Billed", 'bill_amount'), ("Amount Paid", 'amount_paid')):
+        draw_field(label, f"₹{invoice[key]:,.2f}", y)
+        y -= 20
+    pdf.setFont("Helvetica-Bold", 13)
+    pdf.drawString(50, y - 6, "Balance Due:")
+    pdf.drawString(180, y - 6, f"₹{invoice['outstanding_amount']:,.2f}")
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(50, y - 26, f"Status: {invoice['payment_status']}")
+
+    pdf.setFont("Helvetica-Oblique", 9)
+    pdf.setFillColor(colors.grey)
+    pdf.drawRightString(width - 50, 30, "Generated by Hospital Management System")
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def _render_chunk(invoices: List[Dict[str, Any]], period: str, issued: str) -> List[Tuple[str, bytes]]:
+    """Worker task: (archive name, PDF bytes) for each invoice in a chunk"""
+    return [(f"invoice_{period}_{invoice['patient_id']}.pdf", render_invoice_pdf(invoice, period, issued))
+            for invoice in invoices]
+
+def _chunks(invoices: Iterable[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    chunk = []
+    for invoice in invoices:
+        chunk.append(invoice)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def write_invoice_zip(invoices: Iterable[Dict[str, Any]], output, period: str,
+                      workers: Optional[int] = None,
+                      progress: Optional[Callable[[int], None]] = None) -> int:
+    """Render invoices across a process pool and add each PDF to a ZIP as its chunk completes.
+
+    At most two chunks per worker are in flight, so memory stays bounded no
+    matter how many invoices there are. `progress` is called with the number
+    of invoices written so far. Returns that number.
+    """
+    # More processes than cores only adds start-up and memory cost
+    cores = os.cpu_count() or 1
+    workers = min(workers or cores, cores)
+    issued = datetime.now().strftime('%B %d, %Y')
+    chunks = iter(_chunks(invoices, INVOICE_CHUNK_SIZE))
+    written = 0
+    # spawn: the parent is a threaded web worker, which fork does not copy safely
+    context = multiprocessing.get_context('spawn')
+
+    # PDF streams are already deflated, so storing them is as small and much faster
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = set()
+        while True:
+            while len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.add(pool.submit(_render_chunk, chunk, period, issued))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for name, pdf in future.result():
+                    archive.writestr(name, pdf)
+                    written += 1
+            if progress is not None:
+                progress(written)
+    return written
+
+# Batch invoice jobs keep their status and ZIP here, so any worker process can report on them
+INVOICE_JOB_DIR = os.path.join(tempfile.gettempdir(), 'hms-invoice-jobs')
+
+def _job_path(job_id: str, suffix: str) -> str:
+    return os.path.join(INVOICE_JOB_DIR, f"{job_id}{suffix}")
+
+def _save_job(job: Dict[str, Any]) -> None:
+    tmp_path = _job_path(job['id'], '.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _job_path(job['id'], '.json'))
+
+# Held by the running job, so only one renders at a time across all worker processes
+INVOICE_JOB_LOCK = os.path.join(INVOICE_JOB_DIR, 'running.lock')
+
+def _run_job(job: Dict[str, Any], invoices: List[Dict[str, Any]], workers: Optional[int], lock_file) -> None:
+    def report(written: int) -> None:
+        job['done'] = written
+        _save_job(job)
+
+    try:
+        with open(_job_path(job['id'], '.zip'), 'wb') as output:
+            write_invoice_zip(invoices, output, job['period'], workers, report)
+        job['status'] = 'done'
+    except Exception as e:
+        logging.error(f"Invoice job {job['id']} failed: {e}")
+        job.update(status='failed', error=str(e))
+    finally:
+        if job['status'] == 'running':
+            # Interrupted by something other than an Exception; still leave a terminal status
+            job.update(status='failed', error='Interrupted')
+        job['finished_at'] = datetime.now().isoformat()
+        try:
+            _save_job(job)
+        except OSError as e:
+            # Readers see a running job whose lock is free, and report it as failed
+            logging.error(f"Could not save the status of invoice job {job['id']}: {e}")
+        finally:
+            # Closing the file releases the lock for the next job
+            lock_file.close()
+    logging.info(f"Invoice job {job['id']} {job['status']}: {job['done']}/{job['total']} invoices")
+
+# Finished job files older than this are removed when the next job starts
+INVOICE_JOB_TTL_SECONDS = 24 * 3600
+
+def _prune_jobs() -> None:
+    cutoff = time.time() - INVOICE_JOB_TTL_SECONDS
+    for name in os.listdir(INVOICE_JOB_DIR):
+        path = os.path.join(INVOICE_JOB_DIR, name)
+        if path == INVOICE_JOB_LOCK:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+
+def start_invoice_job(patients: Iterable, period: str, workers: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Render invoices for the given patients into a ZIP on a background thread.
+
+    Returns None, without starting anything, while another job is running.
+    """
+    os.makedirs(INVOICE_JOB_DIR, exist_ok=True)
+    lock_file = open(INVOICE_JOB_LOCK, 'a+', encoding='utf-8')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+
+    try:
+        invoices = [invoice_fields(patient) for patient in patients]
+        _prune_jobs()
+        job = {
+            'id': uuid.uuid4().hex[:12], 'period': period, 'status': 'running', 'total': len(invoices), 'done': 0,
+            'error': None, 'started_at': datetime.now().isoformat(), 'finished_at': None
+        }
+        # Recorded before the status file exists, so a running job is always the one named here
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(job['id'])
+        lock_file.flush()
+        _save_job(job)
+        threading.Thread(target=_run_job, args=(job, invoices, workers, lock_file),
+                         name=f"invoices-{job['id']}", daemon=True).start()
+    except BaseException:
+        lock_file.close()
+        raise
+    return invoice_job_status(job['id'])
+
+def _running_job_id() -> Optional[str]:
+    """ID written in the job lock, if a job still holds it"""
+    try:
+        lock_file = open(INVOICE_JOB_LOCK, encoding='utf-8')
+    except OSError:
+        return None
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return lock_file.read().strip() or None
+        # Nobody holds it; closing the file drops the probe
+        return None
+
+def running_invoice_job() -> Optional[Dict[str, Any]]:
+    """Status of the job holding the lock, if one is running"""
+    job_id = _running_job_id()
+    status = invoice_job_status(job_id) if job_id else None
+    return status if status is not None and status['status'] == 'running' else None
+
+def _read_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_job_path(job_id, '.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def invoice_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progress of a batch invoice job, or None if there is no such job.
+
+    A job still marked running whose lock nobody holds was lost with the
+    process running it (e.g. a worker restart) and is reported as failed.
+    """
+    if not job_id.isalnum():
+        return None
+    status = _read_job(job_id)
+    if status is not None and status['status'] == 'running' and _running_job_id() != job_id:
+        # The job saves its final status before releasing the lock, so read it again first
+        status = _read_job(job_id)
+        if status is not None and status['status'] == 'running':
+            status.update(status='failed', error='The process running this job exited before it finished')
+    if status is None:
+        return None
+    status['percent'] = round(100 * status['done'] / status['total'], 1) if status['total'] else 100.0
+    return status
+
+def invoice_job_file(job_id: str) -> Optional[str]:
+    """Path of a finished job's ZIP archive"""
+    status = invoice_job_status(job_id)
+    return _job_path(job_id, '.zip') if status is not None and status['status'] == 'done' else None
@@ -1,38 +1,70 @@
 from flask import render_template, jsonify, request
 from app import app
-from utils import load_patients_from_csv
-from optimized_ml_engine import OptimizedMLEngine
+from utils import get_patient_snapshot, get_revenue_rollup
+from response_cache import cached_response
 from datetime import datetime, timedelta
 import logging
 from collections import Counter
 import random
-from flask import send_file
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import io
+
+# LazyInsights for the latest data generation, shared by the section endpoints
+_lazy_insights_cache = {}
 
 @app.route('/ml_insights')
+@cached_response(daily=True)
 def ml_insights():
-    """ML Insights and predictions page with real-time ML models"""
+    """ML Insights page shell; each section is fetched from its own endpoint"""
     try:
-        patients = load_patients_from_csv()
-        
-        # Initialize optimized ML engine
-        ml_engine = OptimizedMLEngine()
+        snapshot = get_patient_snapshot()
         
-        # Generate comprehensive ML insights using real patient data
-        insights = ml_engine.generate_insights(patients)    
-        
-        return render_template('ml_insights_optimized.html', insights=insights)
+        return render_template('ml_insights_optimized.html',
+                             total_patients=len(snapshot.patients))
     except Exception as e:
         logging.error(f"Error loading ML insights: {e}")
         return render_template('error.html', error="Error loading ML insights")
 
+@app.route('/api/ml/insights/<section>')
+@cached_response(daily=True)
+def api_ml_insight_section(section):
+    """API endpoint computing a single ML insight section on demand"""
+    from optimized_ml_engine import LazyInsights
+    
+    if section not in LazyInsights.SECTIONS:
+        return jsonify({'error': f'Unknown section: {section}', 'sections': list(LazyInsights.SECTIONS)}), 404
+    try:
+        insights, generation = get_lazy_insights()
+        
+        return jsonify({
+            'section': section,
+            'data': insights.section(section),
+            'generation': generation
+        })
+    except Exception as e:
+        logging.error(f"Error computing ML insight section {section}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def get_lazy_insights():
+    """Return the lazily computed insights for the current data, shared per generation"""
+    from optimized_ml_engine import LazyInsights
+    
+    snapshot = get_patient_snapshot()
+    cached = _lazy_insights_cache.get('insights')
+    if cached is not None and snapshot.generation is not None and _lazy_insights_cache.get('generation') == snapshot.generation:
+        return cached, snapshot.generation
+    
+    insights = LazyInsights(snapshot.patients)
+    if snapshot.generation is not None:
+        _lazy_insights_cache.update(generation=snapshot.generation, insights=insights)
+    return insights, snapshot.generation
+
 @app.route('/api/ml/visit_predictions')
+@cached_response(daily=True)
 def api_visit_predictions():
     """API endpoint for real-time visit predictions"""
     try:
-        patients = load_patients_from_csv()
+        patients = get_patient_snapshot().patients
+        # The ML engine pulls in numpy, so import it on first use
+        from optimized_ml_engine import OptimizedMLEngine
         ml_engine = OptimizedMLEngine()
         
         days_ahead = request.args.get('days', 7, type=int)
@@ -56,10 +88,12 @@ def api_visit_predictions():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ml/disease_patterns')
+@cached_response(daily=True)
 def api_disease_patterns():
     """API endpoint for real-time disease pattern analysis"""
     try:
-        patients = load_patients_from_csv()
+        patients = get_patient_snapshot().patients
+        from optimized_ml_engine import OptimizedMLEngine
         ml_engine = OptimizedMLEngine()
         
         insights = ml_engine.generate_insights(patients)
@@ -79,7 +113,8 @@ def api_disease_patterns():
 def api_retrain_models():
     """API endpoint to manually trigger comprehensive analysis update"""
     try:
-        patients = load_patients_from_csv()
+        patients = get_patient_snapshot().patients
+        from optimized_ml_engine import OptimizedMLEngine
         ml_engine = OptimizedMLEngine()
         
         # Generate fresh optimized insights
@@ -212,17 +247,19 @@ def generate_disease_predictions(patients):
     }
 
 @app.route('/reports_dashboard')
+@cached_response(daily=True)
 def reports_dashboard():
     """Comprehensive reports dashboard"""
     try:
-        patients = load_patients_from_csv()
+        patients = get_patient_snapshot().patients
         print(f"[DEBUG] Loaded {len(patients)} patients")  # 👈 Debug line
 
         report = generate_comprehensive_report(patients)
         print("[DEBUG] Generated report keys:", report.keys())  # 👈 Debug line
         print("[DEBUG] Sample data from report:", report.get('total_patients'))  # Optional
 
-        return render_template('reports_dashboard.html', report=report)
+        # The forecast and trends leave out the current month, so their fragments are keyed on the day too
+        return render_template('reports_dashboard.html', report=report, as_of=datetime.now().date().isoformat())
     except Exception as e:
         logging.error(f"Error loading reports dashboard: {e}")
         return render_template('error.html', error="Error loading reports dashboard")
@@ -265,7 +302,9 @@ def generate_comprehensive_report(patients):
     # Resource utilization (mock data based on patient load)
     icu_usage = generate_icu_usage(total_patients)
     staff_utilization = generate_staff_utilization(total_patients)
-    financial_forecast = generate_financial_forecast(total_revenue, total_billed)
+    rollup = get_revenue_rollup()
+    financial_forecast = generate_financial_forecast(rollup)
+    admission_trend = generate_admission_trend(rollup)
     
     return {
         'total_patients': total_patients,
@@ -278,6 +317,7 @@ def generate_comprehensive_report(patients):
         'icu_usage': icu_usage,
         'staff_utilization': staff_utilization,
         'financial_forecast': financial_forecast,
+        'admission_trend': admission_trend,
         'generated_at': datetime.now().strftime("%B %d, %Y at %I:%M %p")
     }
 def generate_ml_predictions(patients):
@@ -325,16 +365,69 @@ def generate_staff_utilization(total_patients):
         'utilization_percentage': utilization_percentage
     }
 
-def generate_financial_forecast(total_revenue, total_billed):
-    """Generate financial forecast"""
-    revenue_forecast = total_revenue * 1.1  # 10% growth
-    expense_forecast = total_revenue * 0.7   # 70% of revenue as expenses
+# Months of rollup history the forecast trend is fitted on
+FORECAST_MONTHS = 12
+
+def _linear_next(values):
+    """Least-squares line through the values, evaluated one step past the last"""
+    n = len(values)
+    if n < 2:
+        return values[0] if values else 0.0
+    mean_x, mean_y = (n - 1) / 2, sum(values) / n
+    slope = (sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+             / sum((x - mean_x) ** 2 for x in range(n)))
+    return max(mean_y + slope * (n - mean_x), 0.0)
+
+def _monthly_history(rollup, months=FORECAST_MONTHS):
+    """Rollup rows for the last `months` complete months on record, with months lacking admissions as zeros.
+
+    The current month is left out: it is still partial and would drag the trend down.
+    """
+    today = datetime.now()
+    current = today.year * 12 + today.month - 1
+    by_month = {}
+    for row in rollup.series('month'):
+        try:
+            month = int(row['period'][:4]) * 12 + int(row['period'][5:7]) - 1
+        except ValueError:
+            continue
+        if month < current:
+            by_month[month] = row
+    if not by_month:
+        return []
+    last = max(by_month)
+    first = max(min(by_month), last - months + 1)
+    return [by_month.get(month, {'period': f"{month // 12:04d}-{month % 12 + 1:02d}", 'billed': 0.0, 'paid': 0.0})
+            for month in range(first, last + 1)]
+
+def generate_financial_forecast(rollup):
+    """Revenue for the month after the last complete one, from the trend of the monthly rollup"""
+    history = _monthly_history(rollup)
+    revenue_forecast = _linear_next([row['paid'] for row in history])
+    expense_forecast = revenue_forecast * 0.7   # 70% of revenue as expenses
     profit_forecast = revenue_forecast - expense_forecast
     
     return {
         'revenue_forecast': revenue_forecast,
+        'billed_forecast': _linear_next([row['billed'] for row in history]),
         'expense_forecast': expense_forecast,
-        'profit_forecast': profit_forecast
+        'profit_forecast': profit_forecast,
+        'months': len(history)
+    }
+
+def generate_admission_trend(rollup, days=30):
+    """Admissions and billing per day over the last `days` days on record"""
+    series = rollup.series('day')
+    if not series:
+        return {'dates': [], 'admissions': [], 'billed': []}
+    end = datetime.strptime(series[-1]['period'], '%Y-%m-%d')
+    start = (end - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    by_day = {row['period']: row for row in series if row['period'] >= start}
+    dates = [(end - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+    return {
+        'dates': dates,
+        'admissions': [by_day[d]['patients'] if d in by_day else 0 for d in dates],
+        'billed': [by_day[d]['billed'] if d in by_day else 0 for d in dates]
     }
 
 def create_empty_report():
@@ -349,6 +442,7 @@ def create_empty_report():
         'ml_predictions': {'next_day_visits': 0, 'trending_diseases': []},
         'icu_usage': {'total_beds': 50, 'beds_used': 0, 'usage_percentage': 0},
         'staff_utilization': {'total_staff': 200, 'utilization_percentage': 0},
-        'financial_forecast': {'revenue_forecast': 0, 'expense_forecast': 0, 'profit_forecast': 0},
+        'financial_forecast': {'revenue_forecast': 0, 'billed_forecast': 0, 'expense_forecast': 0, 'profit_forecast': 0, 'months': 0},
+        'admission_trend': {'dates': [], 'admissions': [], 'billed': []},
         'generated_at': datetime.now().strftime("%B %d, %Y at %I:%M %p")
     }
@@ -1,6 +1,6 @@
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+from typing import Dict, Optional, List
 
 @dataclass
 class Patient:
@@ -53,3 +53,241 @@ class ReportData:
 class MLInsights:
     visit_predictions: dict
     disease_predictions: dict
+
+@dataclass
+class PatientSnapshot:
+    generation: Optional[int]
+    patients: List[Patient]
+    index: Optional['PatientIndex'] = None
+
+@dataclass
+class DashboardAggregates:
+    total_patients: int = 0
+    emergency_cases: int = 0
+    total_billed: float = 0.0
+    total_paid: float = 0.0
+    # Billing dashboard breakdown by payment status
+    fully_paid_count: int = 0
+    partially_paid_count: int = 0
+    unpaid_count: int = 0
+    unpaid_amount: float = 0.0
+
+    @classmethod
+    def from_patients(cls, patients) -> 'DashboardAggregates':
+        """Full recompute from a patient list (cold start / integrity check)"""
+        aggregates = cls()
+        for patient in patients:
+            aggregates.add_patient(patient)
+        return aggregates
+
+    def add_patient(self, patient: Patient) -> None:
+        """Fold a newly registered patient into the totals"""
+        self.total_patients += 1
+        if patient.is_emergency:
+            self.emergency_cases += 1
+        self.total_billed += patient.bill_amount
+        self.total_paid += patient.amount_paid
+        self._count_status(patient, 1)
+
+    def copy(self) -> 'DashboardAggregates':
+        return replace(self)
+
+    def _count_status(self, patient: Patient, sign: int) -> None:
+        if patient.payment_status == 'Fully Paid':
+            self.fully_paid_count += sign
+        elif patient.payment_status == 'Partially Paid':
+            self.partially_paid_count += sign
+        elif patient.payment_status == 'Unpaid':
+            self.unpaid_count += sign
+            self.unpaid_amount += sign * patient.outstanding_amount
+
+    def apply_payment(self, patient: Patient, previous: Patient) -> None:
+        """Fold a recorded payment into the totals, given the record before and after it"""
+        self.total_paid += patient.amount_paid - previous.amount_paid
+        self._count_status(previous, -1)
+        self._count_status(patient, 1)
+
+    def to_stats(self) -> dict:
+        """Derive the dashboard statistics dictionary"""
+        total_patients = self.total_patients
+        avg_bill = self.total_billed / total_patients if total_patients > 0 else 0.0
+        collection_rate = (self.total_paid / self.total_billed * 100) if self.total_billed > 0 else 0.0
+        return {
+            'total_patients': total_patients,
+            'emergency_cases': self.emergency_cases,
+            'total_revenue': self.total_paid,
+            'avg_bill': avg_bill,
+            'collection_rate': collection_rate,
+            'total_billed': self.total_billed,
+            'total_paid': self.total_paid,
+            'total_outstanding': self.total_billed - self.total_paid,
+            'fully_paid_count': self.fully_paid_count,
+            'partially_paid_count': self.partially_paid_count,
+            'unpaid_count': self.unpaid_count,
+            'unpaid_amount': self.unpaid_amount
+        }
+
+# Receivables aging buckets by days since admission: (label, first day, last day or None)
+AGING_BUCKETS = (('0-30', 0, 30), ('31-60', 31, 60), ('61-90', 61, 90), ('90+', 91, None))
+
+@dataclass
+class AgingSummary:
+    """Outstanding balances by insurance coverage and days since admission, as of one day.
+
+    Registrations and payments adjust single cells; only a change of day
+    (which can move every balance to an older bucket) needs a full rebuild.
+    """
+    as_of: str
+    # "coverage|bucket" -> [outstanding amount, number of patients owing]
+    cells: Dict[str, list] = field(default_factory=dict)
+
+    @classmethod
+    def from_patients(cls, patients, as_of: str) -> 'AgingSummary':
+        """Full recompute from a patient list (cold start / day rollover)"""
+        summary = cls(as_of=as_of)
+        for patient in patients:
+            summary.add_patient(patient)
+        return summary
+
+    def copy(self) -> 'AgingSummary':
+        return AgingSummary(as_of=self.as_of, cells={key: list(cell) for key, cell in self.cells.items()})
+
+    def bucket_for(self, admission_date: Optional[str]) -> str:
+        """Aging bucket label for an admission date; unparseable dates count as oldest"""
+        try:
+            days = (date.fromisoformat(self.as_of) - date.fromisoformat((admission_date or '')[:10])).days
+        except ValueError:
+            return AGING_BUCKETS[-1][0]
+        for label, _, last_day in AGING_BUCKETS:
+            if last_day is None or days <= last_day:
+                return label
+
+    def _adjust(self, patient: Patient, outstanding: float, sign: int) -> None:
+        if outstanding <= 0:
+            return
+        key = f"{patient.insurance_coverage or 'Unknown'}|{self.bucket_for(patient.admission_date)}"
+        cell = self.cells.setdefault(key, [0.0, 0])
+        cell[0] += sign * outstanding
+        cell[1] += sign
+        if cell[1] <= 0:
+            del self.cells[key]
+
+    def add_patient(self, patient: Patient) -> None:
+        """Fold a newly registered patient's balance into its bucket"""
+        self._adjust(patient, patient.outstanding_amount, 1)
+
+    def apply_payment(self, patient: Patient, previous_outstanding: float) -> None:
+        """Move a patient's balance from its previous to its current outstanding amount"""
+        self._adjust(patient, previous_outstanding, -1)
+        self._adjust(patient, patient.outstanding_amount, 1)
+
+    def to_summary(self) -> dict:
+        """Bucket totals overall and per insurance coverage, in bucket order"""
+        labels = [label for label, _, _ in AGING_BUCKETS]
+        by_insurance: Dict[str, Dict[str, list]] = {}
+        for key, (amount, count) in self.cells.items():
+            coverage, label = key.split('|', 1)
+            by_insurance.setdefault(coverage, {})[label] = [amount, count]
+
+        def rows(cells: Dict[str, list]) -> List[dict]:
+            return [{'bucket': label, 'amount': round(cells.get(label, [0.0, 0])[0], 2),
+                     'count': cells.get(label, [0.0, 0])[1]} for label in labels]
+
+        totals = {label: [sum(c.get(label, [0.0, 0])[0] for c in by_insurance.values()),
+                          sum(c.get(label, [0.0, 0])[1] for c in by_insurance.values())] for label in labels}
+        return {
+            'as_of': self.as_of,
+            'buckets': rows(totals),
+            'by_insurance': {coverage: rows(cells) for coverage, cells in sorted(by_insurance.items())},
+            'total_outstanding': round(sum(amount for amount, _ in totals.values()), 2),
+            'total_count': sum(count for _, count in totals.values())
+        }
+
+# Breakdown dimensions of the revenue rollup, after the period
+ROLLUP_DIMENSIONS = ('payment_status', 'insurance_coverage')
+
+@dataclass
+class RevenueRollup:
+    """Billed/paid/outstanding per admission day and month, by payment status and coverage.
+
+    Keys are "period|payment_status|insurance_coverage"; values are
+    [billed, paid, outstanding, patients]. Amounts are attributed to the
+    admission date, the only date the records carry.
+    """
+    daily: Dict[str, list] = field(default_factory=dict)
+    monthly: Dict[str, list] = field(default_factory=dict)
+
+    @classmethod
+    def from_patients(cls, patients) -> 'RevenueRollup':
+        """Full recompute with one group-by over the patient columns"""
+        # Imported here so app start-up does not pay for pandas
+        import pandas as pd
+
+        rollup = cls()
+        if not patients:
+            return rollup
+        df = pd.DataFrame({
+            'day': [(p.admission_date or '')[:10] for p in patients],
+            'payment_status': [p.payment_status or 'Unknown' for p in patients],
+            'insurance_coverage': [p.insurance_coverage or 'Unknown' for p in patients],
+            'billed': [p.bill_amount for p in patients],
+            'paid': [p.amount_paid for p in patients],
+            'outstanding': [p.outstanding_amount for p in patients]
+        })
+        grouped = df.groupby(['day', *ROLLUP_DIMENSIONS], sort=False).agg(
+            billed=('billed', 'sum'), paid=('paid', 'sum'),
+            outstanding=('outstanding', 'sum'), patients=('billed', 'size')
+        )
+        for (day, status, coverage), billed, paid, outstanding, count in zip(
+                grouped.index, grouped['billed'], grouped['paid'], grouped['outstanding'], grouped['patients']):
+            row = [float(billed), float(paid), float(outstanding), int(count)]
+            rollup.daily[f"{day}|{status}|{coverage}"] = row
+            month = rollup.monthly.setdefault(f"{day[:7]}|{status}|{coverage}", [0.0, 0.0, 0.0, 0])
+            for i, value in enumerate(row):
+                month[i] += value
+        return rollup
+
+    def copy(self) -> 'RevenueRollup':
+        return RevenueRollup(daily={key: list(cell) for key, cell in self.daily.items()},
+                             monthly={key: list(cell) for key, cell in self.monthly.items()})
+
+    def _adjust(self, patient: Patient, sign: int) -> None:
+        day = (patient.admission_date or '')[:10]
+        suffix = f"{patient.payment_status or 'Unknown'}|{patient.insurance_coverage or 'Unknown'}"
+        for cells, key in ((self.daily, f"{day}|{suffix}"), (self.monthly, f"{day[:7]}|{suffix}")):
+            cell = cells.setdefault(key, [0.0, 0.0, 0.0, 0])
+            cell[0] += sign * patient.bill_amount
+            cell[1] += sign * patient.amount_paid
+            cell[2] += sign * patient.outstanding_amount
+            cell[3] += sign
+            if cell[3] <= 0:
+                del cells[key]
+
+    def add_patient(self, patient: Patient) -> None:
+        """Fold a newly registered patient into its day and month"""
+        self._adjust(patient, 1)
+
+    def replace_patient(self, previous: Patient, patient: Patient) -> None:
+        """Move a record's amounts, e.g. after a payment changes its paid amount and status"""
+        self._adjust(previous, -1)
+        self._adjust(patient, 1)
+
+    def series(self, grain: str = 'month', by: Optional[str] = None,
+               start: str = '', end: str = '') -> List[dict]:
+        """Totals per period in date order, optionally split by one breakdown dimension"""
+        cells = self.daily if grain == 'day' else self.monthly
+        rows: Dict[tuple, list] = {}
+        for key, values in cells.items():
+            period, status, coverage = key.split('|', 2)
+            if not period or (start and period < start[:len(period)]) or (end and period > end[:len(period)]):
+                continue
+            group = {'payment_status': status, 'insurance_coverage': coverage}.get(by)
+            row = rows.setdefault((period, group), [0.0, 0.0, 0.0, 0])
+            for i, value in enumerate(values):
+                row[i] += value
+        return [
+            {'period': period, **({by: group} if by else {}),
+             'billed': round(billed, 2), 'paid': round(paid, 2),
+             'outstanding': round(outstanding, 2), 'patients': count}
+            for (period, group), (billed, paid, outstanding, count) in sorted(rows.items(), key=lambda r: (r[0][0], r[0][1] or ''))
+        ]
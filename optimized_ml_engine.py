@@ -1,9 +1,9 @@
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
 from typing import List, Dict, Any, Tuple
 import logging
+import threading
 
 class AdvancedVisitAnalyzer:
     """Advanced patient visit pattern analyzer with peak time detection"""
@@ -15,9 +15,37 @@ class AdvancedVisitAnalyzer:
         
     def analyze_comprehensive_patterns(self, patients: List) -> Dict[str, Any]:
         """Comprehensive analysis of all patient visit patterns"""
-        if not patients:
+        visit_data, locality_data, severity_timeline = self.prepare_visit_data(patients)
+        
+        if not visit_data:
             return self._empty_analysis()
         
+        # Peak time analysis
+        peak_analysis = self._analyze_peak_times(visit_data)
+        
+        # Visit predictions with seasonality
+        predictions = self._generate_advanced_predictions(visit_data)
+        
+        # Locality trends
+        locality_trends = self._analyze_locality_trends(locality_data)
+        
+        # Severity patterns over time
+        severity_trends = self._analyze_severity_trends(severity_timeline)
+        
+        # Capacity planning
+        capacity_insights = self._generate_capacity_insights(visit_data, predictions)
+        
+        return {
+            'peak_times': peak_analysis,
+            'visit_predictions': predictions,
+            'locality_trends': locality_trends,
+            'severity_trends': severity_trends,
+            'capacity_insights': capacity_insights,
+            'data_summary': self._data_summary(visit_data, locality_data)
+        }
+    
+    def prepare_visit_data(self, patients: List) -> Tuple[List[Dict], Dict[str, List[datetime]], Dict[str, List[datetime]]]:
+        """Parse patients into visit records plus per-locality and per-severity timelines"""
         visit_data = []
         locality_data = defaultdict(list)
         severity_timeline = defaultdict(list)
@@ -51,36 +79,15 @@ class AdvancedVisitAnalyzer:
                     logging.warning(f"Could not parse date: {patient.admission_date}")
                     continue
         
-        if not visit_data:
-            return self._empty_analysis()
-        
-        # Peak time analysis
-        peak_analysis = self._analyze_peak_times(visit_data)
-        
-        # Visit predictions with seasonality
-        predictions = self._generate_advanced_predictions(visit_data)
-        
-        # Locality trends
-        locality_trends = self._analyze_locality_trends(locality_data)
-        
-        # Severity patterns over time
-        severity_trends = self._analyze_severity_trends(severity_timeline)
-        
-        # Capacity planning
-        capacity_insights = self._generate_capacity_insights(visit_data, predictions)
-        
+        return visit_data, locality_data, severity_timeline
+    
+    def _data_summary(self, visit_data: List[Dict], locality_data: Dict[str, List[datetime]]) -> Dict[str, Any]:
+        """Summary of the visit records analysed"""
         return {
-            'peak_times': peak_analysis,
-            'visit_predictions': predictions,
-            'locality_trends': locality_trends,
-            'severity_trends': severity_trends,
-            'capacity_insights': capacity_insights,
-            'data_summary': {
-                'total_visits': len(visit_data),
-                'date_range': f"{min(v['datetime'] for v in visit_data).strftime('%Y-%m-%d')} to {max(v['datetime'] for v in visit_data).strftime('%Y-%m-%d')}",
-                'localities_covered': len(locality_data),
-                'analysis_timestamp': datetime.now().isoformat()
-            }
+            'total_visits': len(visit_data),
+            'date_range': f"{min(v['datetime'] for v in visit_data).strftime('%Y-%m-%d')} to {max(v['datetime'] for v in visit_data).strftime('%Y-%m-%d')}",
+            'localities_covered': len(locality_data),
+            'analysis_timestamp': datetime.now().isoformat()
         }
     
     def _analyze_peak_times(self, visit_data: List[Dict]) -> Dict[str, Any]:
@@ -407,24 +414,7 @@ class EnhancedDiseaseAnalyzer:
     
     def analyze_disease_patterns(self, patients: List) -> Dict[str, Any]:
         """Enhanced disease pattern analysis with visual data"""
-        if not patients:
-            return self._empty_disease_analysis()
-        
-        disease_data = []
-        for patient in patients:
-            if hasattr(patient, 'medical_history') and patient.medical_history:
-                condition = str(patient.medical_history).lower().strip()
-                if condition and condition not in ['nan', '', 'unknown']:
-                    disease_data.append({
-                        'disease': condition,
-                        'patient_id': getattr(patient, 'patient_id', ''),
-                        'age': getattr(patient, 'age', 0),
-                        'gender': getattr(patient, 'gender', 'Unknown'),
-                        'locality': getattr(patient, 'locality', 'Unknown'),
-                        'severity': getattr(patient, 'condition_severity', 'Unknown'),
-                        'admission_date': getattr(patient, 'admission_date', ''),
-                        'bill_amount': getattr(patient, 'bill_amount', 0)
-                    })
+        disease_data = self.prepare_disease_data(patients)
         
         if not disease_data:
             return self._empty_disease_analysis()
@@ -450,6 +440,26 @@ class EnhancedDiseaseAnalyzer:
             'analysis_timestamp': datetime.now().isoformat()
         }
     
+    def prepare_disease_data(self, patients: List) -> List[Dict]:
+        """Extract one record per patient with a known condition"""
+        disease_data = []
+        for patient in patients:
+            if hasattr(patient, 'medical_history') and patient.medical_history:
+                condition = str(patient.medical_history).lower().strip()
+                if condition and condition not in ['nan', '', 'unknown']:
+                    disease_data.append({
+                        'disease': condition,
+                        'patient_id': getattr(patient, 'patient_id', ''),
+                        'age': getattr(patient, 'age', 0),
+                        'gender': getattr(patient, 'gender', 'Unknown'),
+                        'locality': getattr(patient, 'locality', 'Unknown'),
+                        'severity': getattr(patient, 'condition_severity', 'Unknown'),
+                        'admission_date': getattr(patient, 'admission_date', ''),
+                        'bill_amount': getattr(patient, 'bill_amount', 0)
+                    })
+        
+        return disease_data
+    
     def _analyze_disease_distribution(self, disease_data: List[Dict]) -> List[Dict[str, Any]]:
         """Analyze overall disease distribution"""
         disease_counts = Counter(d['disease'] for d in disease_data)
@@ -839,4 +849,111 @@ class OptimizedMLEngine:
                 'analysis_timestamp': datetime.now().isoformat(),
                 'data_quality_score': 0.0
             }
-        }
\ No newline at end of file
+        }
+
+class LazyInsights:
+    """Insight sections over one patient list, each computed on first request.
+
+    The row parsing shared by the visit and disease sections is done once
+    and reused, so fetching every section costs the same as one full
+    generate_insights() call, but the first section does not wait on the rest.
+    """
+    
+    VISIT_SECTIONS = ('peak_times', 'visit_predictions', 'locality_trends', 'severity_trends', 'capacity_insights')
+    DISEASE_SECTIONS = ('disease_distribution', 'category_analysis', 'geographic_patterns', 'demographic_patterns',
+                        'severity_correlation', 'temporal_trends', 'visual_data')
+    SECTIONS = ('summary',) + VISIT_SECTIONS + DISEASE_SECTIONS
+    
+    def __init__(self, patients: List, engine: 'OptimizedMLEngine' = None):
+        self.patients = patients
+        self.engine = engine or OptimizedMLEngine()
+        self._sections: Dict[str, Any] = {}
+        self._visit_data = None
+        self._disease_data = None
+        self._prepare_lock = threading.Lock()
+    
+    def section(self, name: str) -> Any:
+        """Return one insight section, computing and memoizing it on first use"""
+        if name not in self.SECTIONS:
+            raise KeyError(name)
+        if name not in self._sections:
+            self._sections[name] = getattr(self, f'_compute_{name}')()
+        return self._sections[name]
+    
+    def computed_sections(self) -> List[str]:
+        return [name for name in self.SECTIONS if name in self._sections]
+    
+    def _visit_records(self):
+        with self._prepare_lock:
+            if self._visit_data is None:
+                self._visit_data = self.engine.visit_analyzer.prepare_visit_data(self.patients)
+            return self._visit_data
+    
+    def _disease_records(self) -> List[Dict]:
+        with self._prepare_lock:
+            if self._disease_data is None:
+                self._disease_data = self.engine.disease_analyzer.prepare_disease_data(self.patients)
+            return self._disease_data
+    
+    def _visit_section(self, compute, empty):
+        visit_data, locality_data, severity_timeline = self._visit_records()
+        return compute(visit_data, locality_data, severity_timeline) if visit_data else empty
+    
+    def _disease_section(self, compute, empty):
+        disease_data = self._disease_records()
+        return compute(disease_data) if disease_data else empty
+    
+    def _compute_summary(self) -> Dict[str, Any]:
+        visit_data, locality_data, _ = self._visit_records()
+        disease_data = self._disease_records()
+        data_summary = self.engine.visit_analyzer._data_summary(visit_data, locality_data) if visit_data else \
+            self.engine.visit_analyzer._empty_analysis()['data_summary']
+        return {
+            'total_patients_analyzed': len(self.patients),
+            'analysis_timestamp': datetime.now().isoformat(),
+            'data_quality_score': self.engine._calculate_data_quality(self.patients),
+            'unique_diseases': len(set(d['disease'] for d in disease_data)),
+            'data_summary': data_summary
+        }
+    
+    def _compute_peak_times(self):
+        analyzer = self.engine.visit_analyzer
+        return self._visit_section(lambda visits, _, __: analyzer._analyze_peak_times(visits), {})
+    
+    def _compute_visit_predictions(self):
+        analyzer = self.engine.visit_analyzer
+        return self._visit_section(lambda visits, _, __: analyzer._generate_advanced_predictions(visits), {})
+    
+    def _compute_locality_trends(self):
+        analyzer = self.engine.visit_analyzer
+        return self._visit_section(lambda _, localities, __: analyzer._analyze_locality_trends(localities), [])
+    
+    def _compute_severity_trends(self):
+        analyzer = self.engine.visit_analyzer
+        return self._visit_section(lambda _, __, severities: analyzer._analyze_severity_trends(severities), [])
+    
+    def _compute_capacity_insights(self):
+        analyzer = self.engine.visit_analyzer
+        return self._visit_section(
+            lambda visits, _, __: analyzer._generate_capacity_insights(visits, self.section('visit_predictions')), {})
+    
+    def _compute_disease_distribution(self):
+        return self._disease_section(self.engine.disease_analyzer._analyze_disease_distribution, [])
+    
+    def _compute_category_analysis(self):
+        return self._disease_section(self.engine.disease_analyzer._categorize_diseases, {})
+    
+    def _compute_geographic_patterns(self):
+        return self._disease_section(self.engine.disease_analyzer._analyze_geographic_patterns, [])
+    
+    def _compute_demographic_patterns(self):
+        return self._disease_section(self.engine.disease_analyzer._analyze_demographic_patterns, {})
+    
+    def _compute_severity_correlation(self):
+        return self._disease_section(self.engine.disease_analyzer._analyze_severity_correlation, [])
+    
+    def _compute_temporal_trends(self):
+        return self._disease_section(self.engine.disease_analyzer._analyze_temporal_trends, {})
+    
+    def _compute_visual_data(self):
+        return self._disease_section(self.engine.disease_analyzer._prepare_visual_data, {})
@@ -0,0 +1,397 @@
+import bisect
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from models import Patient
+
+# Filterable fields exposed as facets on the patients page
+FACET_FIELDS = ('condition_severity', 'status', 'payment_status', 'locality')
+
+def facet_value(patient: Patient, field: str) -> str:
+    """Facet value of a patient ('status' is derived from the discharge date)"""
+    if field == 'status':
+        return 'Discharged' if patient.discharge_date else 'Active'
+    return getattr(patient, field) or ''
+
+# Longest indexed key; longer names are matched on their first characters only
+MAX_KEY_LENGTH = 40
+
+def normalize_key(text: str) -> str:
+    """Case- and accent-insensitive form used for prefix matching"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())[:MAX_KEY_LENGTH]
+
+def prefix_keys(patient: Patient) -> List[Tuple[str, str]]:
+    """(normalized key, field) pairs a patient can be found by: ID, full name and each name part"""
+    name = normalize_key(patient.name)
+    keys = {(normalize_key(patient.patient_id), 'patient_id'), (name, 'name')}
+    keys.update((part, 'name') for part in name.split()[1:])
+    return sorted(key for key in keys if key[0])
+
+class PrefixIndex:
+    """Sorted array of (key, position, field) for prefix lookups by binary search.
+
+    Entries are only inserted, never moved past one another, so successive
+    index versions share one array and each ignores positions past its own
+    row count; a concurrent insert can make a reader see an entry twice,
+    which `search` already de-duplicates, but never skip one.
+    """
+
+    def __init__(self, patients: List[Patient]):
+        self.entries: List[Tuple[str, int, str]] = sorted(
+            (key, position, field)
+            for position, patient in enumerate(patients)
+            for key, field in prefix_keys(patient)
+        )
+
+    def copy(self) -> 'PrefixIndex':
+        copy = PrefixIndex([])
+        copy.entries = list(self.entries)
+        return copy
+
+    def add(self, position: int, patient: Patient) -> None:
+        for key, field in prefix_keys(patient):
+            bisect.insort(self.entries, (key, position, field))
+
+    def replace(self, position: int, previous: Patient, patient: Patient) -> None:
+        old_keys, new_keys = prefix_keys(previous), prefix_keys(patient)
+        if old_keys == new_keys:
+            return
+        for key, field in old_keys:
+            i = bisect.bisect_left(self.entries, (key, position, field))
+            if i < len(self.entries) and self.entries[i] == (key, position, field):
+                del self.entries[i]
+        self.add(position, patient)
+
+    def search(self, prefix: str, limit: int, rows: Optional[int] = None) -> List[Tuple[int, str]]:
+        """First `limit` distinct (position, matched field) in key order for a prefix, among the first `rows` rows"""
+        prefix = normalize_key(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        i = bisect.bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and len(results) < limit:
+            key, position, field = self.entries[i]
+            if not key.startswith(prefix):
+                break
+            if position not in seen and (rows is None or position < rows):
+                seen.add(position)
+                results.append((position, field))
+            i += 1
+        return results
+
+def distance_to(pattern: str) -> Callable[[str], int]:
+    """Levenshtein distance from `pattern`, as a function of the other string.
+
+    Uses Hyyro's bit-parallel form of Myers' algorithm: the pattern's
+    character masks are built once, then each comparison is a handful of
+    integer operations per character instead of a full DP table.
+    """
+    m = len(pattern)
+    if not m:
+        return len
+    peq: Dict[str, int] = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask, last = (1 << m) - 1, 1 << (m - 1)
+
+    def distance(text: str) -> int:
+        pv, mv, score = mask, 0, m
+        for c in text:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+        return score
+    return distance
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings"""
+    return distance_to(a)(b)
+
+class NameBKTree:
+    """BK-tree over the distinct normalized name parts, each mapping to row positions.
+
+    Name parts repeat heavily, so the tree grows with the vocabulary rather
+    than the registry; the triangle inequality prunes every subtree whose
+    edge distance is outside [d - max_distance, d + max_distance].
+
+    A node's positions and children are replaced rather than changed in
+    place, so a search running while a row is added sees either the old or
+    the new value, never one being modified under it.
+    """
+
+    def __init__(self, patients: List[Patient]):
+        # node: [key, frozenset of row positions, {edge distance: child node}]
+        self.root: Optional[list] = None
+        self.nodes: Dict[str, list] = {}
+        for position, patient in enumerate(patients):
+            self.add(position, patient)
+
+    def copy(self) -> 'NameBKTree':
+        """Tree with the same shape whose nodes can be changed without touching this one"""
+        copy = NameBKTree([])
+        copy.nodes = {key: [key, positions, {}] for key, positions, _ in self.nodes.values()}
+        for key, _, children in self.nodes.values():
+            copy.nodes[key][2].update((edge, copy.nodes[child[0]]) for edge, child in children.items())
+        copy.root = copy.nodes[self.root[0]] if self.root is not None else None
+        return copy
+
+    @staticmethod
+    def _keys(patient: Patient) -> set:
+        return set(normalize_key(patient.name).split())
+
+    def add(self, position: int, patient: Patient) -> None:
+        for key in self._keys(patient):
+            node = self.nodes.get(key)
+            if node is None:
+                node = self.nodes[key] = [key, frozenset(), {}]
+                self._insert(node)
+            node[1] = node[1] | {position}
+
+    def _insert(self, node: list) -> None:
+        if self.root is None:
+            self.root = node
+            return
+        current, distance_from_key = self.root, distance_to(node[0])
+        while True:
+            distance = distance_from_key(current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2] = {**current[2], distance: node}
+                return
+            current = child
+
+    def remove(self, position: int, patient: Patient) -> None:
+        """Drop a row from its keys; emptied nodes stay in the tree as routing nodes"""
+        for key in self._keys(patient):
+            node = self.nodes.get(key)
+            if node is not None:
+                node[1] = node[1] - {position}
+
+    def _within(self, token: str, max_distance: int, rows: Optional[int]) -> Dict[int, int]:
+        """Best distance per row position over the name parts within `max_distance` of a token"""
+        matches: Dict[int, int] = {}
+        distance_from_token = distance_to(token)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            key, positions, children = stack.pop()
+            distance = distance_from_token(key)
+            if distance <= max_distance:
+                for position in positions:
+                    if rows is not None and position >= rows:
+                        continue
+                    if distance < matches.get(position, max_distance + 1):
+                        matches[position] = distance
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return matches
+
+    def search(self, query: str, max_distance: int, rows: Optional[int] = None) -> Dict[int, int]:
+        """Rows (among the first `rows`) matching every query word, with the summed edit distance kept within `max_distance`"""
+        per_token = [self._within(token, max_distance, rows) for token in normalize_key(query).split()]
+        if not per_token:
+            return {}
+        per_token.sort(key=len)
+        matches = {}
+        for position, distance in per_token[0].items():
+            for other in per_token[1:]:
+                if position not in other:
+                    break
+                distance += other[position]
+            else:
+                if distance <= max_distance:
+                    matches[position] = distance
+        return matches
+
+class PatientIndex:
+    """Bitmap index over a patient list: one Python int per facet value, bit i = row i.
+
+    Requests keep reading the index of the snapshot they started with, so
+    writes are applied to a `copy` that the next snapshot is built on,
+    never to an index that may be in use. The copy shares the ID map, the
+    prefix array and the name tree, which rows are only ever added to: each
+    index looks only at positions below its own row count.
+    """
+
+    def __init__(self, patients: List[Patient]):
+        # The snapshot's own list, not a copy
+        self.patients = patients
+        self.id_positions: Dict[str, int] = {}
+        self.bitmaps: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS}
+        # Typeahead keys and the typo-tolerant name tree, built on first use
+        self._prefix: Optional[PrefixIndex] = None
+        self._names: Optional[NameBKTree] = None
+        # Every row's (sort key, position) in order, per sorted field, built on first use
+        self._sort_orders: Dict[str, List[Tuple[Any, int]]] = {}
+
+        for position, patient in enumerate(patients):
+            self._index_row(position, patient)
+
+    def _index_row(self, position: int, patient: Patient) -> None:
+        """Set the row's bit in every facet bitmap and register its ID"""
+        # Keep the first row for duplicate IDs, like the original linear lookups
+        self.id_positions.setdefault(patient.patient_id, position)
+        bit = 1 << position
+        for field in FACET_FIELDS:
+            values = self.bitmaps[field]
+            value = facet_value(patient, field)
+            values[value] = values.get(value, 0) | bit
+
+    def copy(self) -> 'PatientIndex':
+        """Index that can be updated while this one is still being read.
+
+        Only the row list and the per-field value maps are copied (one
+        pointer per row or facet value); the append-only structures are shared.
+        """
+        copy = PatientIndex([])
+        copy.patients = list(self.patients)
+        copy.id_positions = self.id_positions
+        copy.bitmaps = {field: dict(values) for field, values in self.bitmaps.items()}
+        copy._prefix = self._prefix
+        copy._names = self._names
+        return copy
+
+    def add(self, patient: Patient) -> None:
+        """Append a newly registered patient"""
+        self.patients.append(patient)
+        self._index_row(len(self.patients) - 1, patient)
+        if self._prefix is not None:
+            self._prefix.add(len(self.patients) - 1, patient)
+        if self._names is not None:
+            self._names.add(len(self.patients) - 1, patient)
+
+    def replace(self, position: int, patient: Patient) -> None:
+        """Swap in an updated record for an existing row, moving its facet bits.
+
+        The row keeps its ID. A new name changes keys that older indexes
+        sharing the prefix array and name tree still read, so those are
+        copied first; payments, the usual replacement, keep the name.
+        """
+        previous = self.patients[position]
+        bit = 1 << position
+        for field in FACET_FIELDS:
+            old_value, new_value = facet_value(previous, field), facet_value(patient, field)
+            if old_value == new_value:
+                continue
+            values = self.bitmaps[field]
+            values[old_value] &= ~bit
+            if not values[old_value]:
+                del values[old_value]
+            values[new_value] = values.get(new_value, 0) | bit
+        if self._prefix is not None and prefix_keys(previous) != prefix_keys(patient):
+            self._prefix = self._prefix.copy()
+            self._prefix.replace(position, previous, patient)
+        if self._names is not None and previous.name != patient.name:
+            self._names = self._names.copy()
+            self._names.remove(position, previous)
+            self._names.add(position, patient)
+        self.patients[position] = patient
+
+    def position_of(self, patient_id: str) -> Optional[int]:
+        """Row position for a patient ID, or None"""
+        position = self.id_positions.get(patient_id)
+        # The map is shared with later indexes, which may have registered the ID after this one's rows
+        return position if position is not None and position < len(self.patients) else None
+
+    def get(self, patient_id: str) -> Optional[Patient]:
+        """Patient for an ID in O(1), or None"""
+        position = self.position_of(patient_id)
+        return self.patients[position] if position is not None else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[Patient, str]]:
+        """Up to `limit` patients whose ID, name or a name part starts with `prefix`"""
+        if self._prefix is None:
+            self._prefix = PrefixIndex(self.patients)
+        return [(self.patients[position], field) for position, field in self._prefix.search(prefix, limit, len(self.patients))]
+
+    def fuzzy_match(self, query: str, max_distance: int = 2, limit: int = 20,
+                    mask: Optional[int] = None) -> List[Tuple[Patient, int]]:
+        """Patients whose name parts match the query words within `max_distance` edits in total, closest first"""
+        if self._names is None:
+            self._names = NameBKTree(self.patients)
+        matches = self._names.search(query, max_distance, len(self.patients))
+        if mask is not None:
+            matches = {position: distance for position, distance in matches.items() if mask >> position & 1}
+        ranked = sorted(matches.items(), key=lambda m: (m[1], self.patients[m[0]].name.lower(), m[0]))
+        return [(self.patients[position], distance) for position, distance in ranked[:limit]]
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self.patients)) - 1
+
+    def filter_mask(self, filters: Dict[str, str], base_mask: Optional[int] = None) -> int:
+        """AND together the bitmaps for every non-empty filter value"""
+        mask = self.all_mask if base_mask is None else base_mask
+        for field, value in filters.items():
+            if value:
+                mask &= self.bitmaps[field].get(value, 0)
+        return mask
+
+    def mask_from_positions(self, positions: Iterable[int]) -> int:
+        """Build a bitmap from row positions"""
+        bits = bytearray(len(self.patients) // 8 + 1)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def positions(self, mask: int, reverse: bool = False) -> Iterator[int]:
+        """Row positions set in a bitmap, in ascending (or descending) order"""
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+        if reverse:
+            for byte_index in range(len(data) - 1, -1, -1):
+                byte = data[byte_index]
+                while byte:
+                    high_bit = byte.bit_length() - 1
+                    yield (byte_index << 3) + high_bit
+                    byte ^= 1 << high_bit
+            return
+        for byte_index, byte in enumerate(data):
+            while byte:
+                low_bit = byte & -byte
+                yield (byte_index << 3) + low_bit.bit_length() - 1
+                byte ^= low_bit
+
+    def sort_order(self, field: str, key: Callable[[Patient], Any]) -> List[Tuple[Any, int]]:
+        """(key(patient), position) for every row in ascending order, sorted once per field for this index"""
+        order = self._sort_orders.get(field)
+        if order is None:
+            order = self._sort_orders[field] = sorted((key(patient), position)
+                                                      for position, patient in enumerate(self.patients))
+        return order
+
+    def select(self, mask: int) -> List[Patient]:
+        """Patients whose bits are set in the mask, in file order"""
+        if mask == self.all_mask:
+            return list(self.patients)
+        return [self.patients[position] for position in self.positions(mask)]
+
+    def facet_counts(self, filters: Dict[str, str], base_mask: Optional[int] = None) -> Dict[str, List[Tuple[str, int]]]:
+        """Distinct values and counts per facet field for the current query.
+
+        Each field is counted with every *other* filter applied, so the
+        dropdown still shows the alternatives to the value selected.
+        """
+        facets = {}
+        for field in FACET_FIELDS:
+            other_filters = {f: v for f, v in filters.items() if f != field}
+            mask = self.filter_mask(other_filters, base_mask)
+            counts = []
+            for value, bitmap in self.bitmaps[field].items():
+                if not value:
+                    continue
+                count = (bitmap & mask).bit_count()
+                if count or value == filters.get(field):
+                    counts.append((value, count))
+            facets[field] = sorted(counts)
+        return facets
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+from typing import Iterable, List, Optional, Set, Tuple
+
+class PaymentReferenceJournal:
+    """Remittance references of the payments already applied, one JSON string per line.
+
+    Callers hold the patient CSV lock, which serializes every reader and
+    writer across processes. Each process keeps the references in memory and
+    only reads the lines appended since its last call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reset()
+
+    def _reset(self) -> None:
+        self._references: Set[str] = set()
+        # (device, inode) and read offset of the journal the set was read from
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._offset = 0
+
+    def _sync(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return
+        if self._file_id != (stat.st_dev, stat.st_ino) or stat.st_size < self._offset:
+            self._reset()
+            self._file_id = (stat.st_dev, stat.st_ino)
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn final write: the next record() terminates it
+                    break
+                self._offset += len(line)
+                try:
+                    self._references.add(json.loads(line))
+                except (ValueError, TypeError) as e:
+                    logging.error(f"Skipping bad payment reference entry at {self._offset}: {e}")
+
+    def applied(self, references: Iterable[str]) -> Set[str]:
+        """The given references that have already been applied"""
+        self._sync()
+        return {reference for reference in references if reference in self._references}
+
+    def record(self, references: List[str]) -> None:
+        """Durably add references whose payments have just been written"""
+        if not references:
+            return
+        self._sync()
+        data = ''.join(json.dumps(reference) + '\n' for reference in references)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if os.fstat(f.fileno()).st_size > self._offset:
+                # A crash left a torn line: end it so it cannot swallow the first new entry
+                data = '\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Read back what is on disk, so this process sees exactly what the others will
+        self._sync()
@@ -0,0 +1,136 @@
+import csv
+import logging
+import os
+import stat
+import tempfile
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+from utils import locked_patient_csv
+
+# Checks run over every row, in report order
+CHECKS = ('invalid_amount', 'negative_amount', 'outstanding_mismatch', 'status_mismatch', 'duplicate_id')
+
+# Columns the checks need; the rest are only read when writing a corrected file
+RECONCILE_COLUMNS = ['patient_id', 'bill_amount', 'amount_paid', 'outstanding_amount', 'payment_status']
+
+def _read_frame(path: str, all_columns: bool):
+    # Imported here so app start-up does not pay for pandas
+    import pandas as pd
+
+    # Read everything as text so a corrected file keeps the other columns byte-for-byte
+    return pd.read_csv(path, dtype=str, keep_default_na=False,
+                       usecols=None if all_columns else RECONCILE_COLUMNS)
+
+def check_frame(df) -> Dict[str, Any]:
+    """Vectorized integrity checks; returns a boolean mask per check plus the derived columns.
+
+    The derivation mirrors `utils.derive_payment_fields`: fully paid rows owe
+    nothing, otherwise the outstanding amount is bill - paid to the cent and
+    the status is Partially Paid or Unpaid depending on whether anything was paid.
+    """
+    import numpy as np
+    import pandas as pd
+
+    bill = pd.to_numeric(df['bill_amount'], errors='coerce').to_numpy(dtype=float)
+    paid = pd.to_numeric(df['amount_paid'], errors='coerce').to_numpy(dtype=float)
+    outstanding = pd.to_numeric(df['outstanding_amount'], errors='coerce').to_numpy(dtype=float)
+
+    invalid = np.isnan(bill) | np.isnan(paid) | np.isnan(outstanding)
+    fully_paid = paid >= bill
+    expected_outstanding = np.where(fully_paid, 0.0, np.round(bill - paid, 2))
+    expected_status = np.where(fully_paid, 'Fully Paid', np.where(paid > 0, 'Partially Paid', 'Unpaid'))
+
+    # Comparisons against NaN are False, so unparseable rows only count as invalid
+    with np.errstate(invalid='ignore'):
+        masks = {
+            'invalid_amount': invalid,
+            'negative_amount': (bill < 0) | (paid < 0) | (outstanding < 0),
+            'outstanding_mismatch': ~invalid & (np.abs(outstanding - expected_outstanding) > 0.005),
+            'status_mismatch': ~np.isnan(bill) & ~np.isnan(paid) & (df['payment_status'].to_numpy() != expected_status),
+            'duplicate_id': df['patient_id'].duplicated(keep=False).to_numpy()
+        }
+    return {
+        'masks': masks,
+        'negative_inputs': (bill < 0) | (paid < 0),
+        'expected_outstanding': expected_outstanding,
+        'expected_status': expected_status
+    }
+
+def _samples(df, mask, checked: Dict[str, Any], check: str, limit: int) -> list:
+    import numpy as np
+
+    samples = []
+    for i in np.flatnonzero(mask)[:limit]:
+        sample = {'line': int(i) + 2, 'patient_id': df['patient_id'].iat[i]}
+        if check == 'outstanding_mismatch':
+            sample.update(stored=df['outstanding_amount'].iat[i], expected=float(checked['expected_outstanding'][i]))
+        elif check == 'status_mismatch':
+            sample.update(stored=df['payment_status'].iat[i], expected=str(checked['expected_status'][i]))
+        elif check in ('invalid_amount', 'negative_amount'):
+            sample.update({column: df[column].iat[i] for column in ('bill_amount', 'amount_paid', 'outstanding_amount')})
+        samples.append(sample)
+    return samples
+
+def correct_frame(df, checked: Dict[str, Any]) -> int:
+    """Rewrite the derived outstanding/status columns in place; returns the number of rows changed.
+
+    Invalid or negative bills and payments and duplicate IDs need a person to
+    decide, so they are reported but left as they are.
+    """
+    import numpy as np
+
+    masks = checked['masks']
+    fix = ((masks['outstanding_mismatch'] | masks['status_mismatch'])
+           & ~masks['invalid_amount'] & ~checked['negative_inputs'])
+    rows = np.flatnonzero(fix)
+    if len(rows):
+        outstanding = df.columns.get_loc('outstanding_amount')
+        status = df.columns.get_loc('payment_status')
+        df.iloc[rows, outstanding] = checked['expected_outstanding'][rows].round(2).astype(str)
+        df.iloc[rows, status] = checked['expected_status'][rows]
+    return len(rows)
+
+def write_csv_atomically(df, path: str) -> None:
+    """Write to a temporary file next to `path`, fsync it and rename it into place"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.reconcile-', suffix='.csv', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            if os.path.exists(path):
+                # mkstemp creates the file owner-only; keep the replaced file's permissions
+                os.fchmod(f.fileno(), stat.S_IMODE(os.stat(path).st_mode))
+            # csv.writer over plain lists is faster than DataFrame.to_csv for all-text frames
+            writer = csv.writer(f)
+            writer.writerow(df.columns)
+            writer.writerows(zip(*(df[column].tolist() for column in df.columns)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def reconcile(path: str, output: Optional[str] = None, sample_limit: int = 10) -> Dict[str, Any]:
+    """Check every row of a patient CSV and optionally write a corrected copy to `output`.
+
+    When `output` is the file being checked, the read, check and replace all
+    happen under the same exclusive lock the appenders take, so no
+    registration can land in between and be lost.
+    """
+    in_place = output is not None and os.path.abspath(output) == os.path.abspath(path)
+    with locked_patient_csv(path) if in_place else nullcontext():
+        df = _read_frame(path, all_columns=output is not None)
+        checked = check_frame(df)
+        report = {
+            'rows': len(df),
+            'counts': {check: int(checked['masks'][check].sum()) for check in CHECKS},
+            'samples': {check: _samples(df, checked['masks'][check], checked, check, sample_limit)
+                        for check in CHECKS if checked['masks'][check].any()},
+            'corrected': 0,
+            'output': output
+        }
+        if output is not None:
+            report['corrected'] = correct_frame(df, checked)
+            write_csv_atomically(df, output)
+            logging.info(f"Reconciled {path}: {report['corrected']} rows corrected, written to {output}")
+        return report
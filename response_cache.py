@@ -0,0 +1,102 @@
+import hashlib
+import logging
+from datetime import date
+from functools import wraps
+from typing import Dict
+from flask import g, request, session, template_rendered
+from app import app
+from bounded_cache import BoundedCache
+from utils import get_data_generation, get_data_last_modified
+
+class ResponseCache(BoundedCache):
+    """Rendered responses keyed by endpoint, request args and data generation"""
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        super().__init__(max_entries, max_bytes)
+        self.not_modified = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), 'not_modified': self.not_modified}
+
+response_cache = ResponseCache()
+
+# Representation headers replayed on cache hits (e.g. attachment downloads)
+CACHED_HEADERS = ('Content-Disposition',)
+
+@template_rendered.connect_via(app)
+def _flag_error_page(sender, template, context, **extra):
+    """Error pages are rendered with status 200, so flag them as uncacheable"""
+    if template.name == 'error.html':
+        g.response_uncacheable = True
+
+def _request_etag(generation: int, daily: bool = False) -> str:
+    """Strong ETag for this endpoint, its URL arguments and query string at a data generation"""
+    args = sorted(request.args.items(multi=True))
+    view_args = sorted((request.view_args or {}).items())
+    day = date.today().isoformat() if daily else ''
+    digest = hashlib.sha1(f"{request.endpoint}|{view_args}|{args}|{day}".encode('utf-8')).hexdigest()[:16]
+    return f"g{generation}-{digest}"
+
+def _not_modified(etag: str, last_modified) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return int(last_modified.timestamp()) <= int(request.if_modified_since.timestamp())
+    return False
+
+def _finish(response, etag: str, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Clients may keep the payload but must revalidate, since any write changes it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cached_response(view=None, daily: bool = False):
+    """Serve a view from the response cache and answer conditional GETs with 304.
+
+    Everything the view renders must depend only on the patient data and the
+    query string (and the date, with `daily=True`); pages carrying flashed
+    messages bypass the cache.
+    """
+    if view is None:
+        return lambda view: cached_response(view, daily=daily)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+            return view(*args, **kwargs)
+
+        generation = get_data_generation()
+        last_modified = get_data_last_modified()
+        etag = _request_etag(generation, daily)
+
+        # Last-Modified does not move at midnight, so daily pages revalidate by ETag only
+        if _not_modified(etag, None if daily else last_modified):
+            response_cache.not_modified += 1
+            return _finish(app.response_class(status=304), etag, last_modified)
+
+        key = (request.endpoint, etag)
+        entry = response_cache.get(key)
+        if entry is not None:
+            response = app.response_class(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+            response.headers.extend(entry['headers'])
+            return _finish(response, etag, last_modified)
+
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed or g.get('response_uncacheable'):
+            return response
+
+        # Generation moved while rendering: serve the page but do not cache or tag it
+        if get_data_generation() != generation:
+            logging.debug(f"Data changed while rendering {request.endpoint}; not caching")
+            return response
+
+        body = response.get_data()
+        response_cache.put(key, {
+            'body': body,
+            'status': response.status_code,
+            'mimetype': response.mimetype,
+            'headers': [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers]
+        }, len(body))
+        return _finish(response, etag, last_modified)
+    return wrapper
@@ -1,19 +1,31 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, Response
 from app import app
 from utils import (
-    load_patients_from_csv, save_patient_to_csv, generate_patient_id,
-    calculate_dashboard_stats, search_patients
+    save_patient_to_csv, get_patient_snapshot,
+    calculate_dashboard_stats, search_patients_with_facets, verify_dashboard_aggregates,
+    get_patient_index, fuzzy_search_patients, current_data_generation, query_patients,
+    derive_payment_fields, append_patients_to_csv, refresh_aging_summary,
+    CSV_FILE
 )
 from models import Patient
+from response_cache import cached_response
+from warmup import warmup_status
+from dataclasses import fields
+from typing import List, Optional, Tuple
 from datetime import datetime
+import json
 import logging
+import math
+import click
 
 @app.route('/')
+@cached_response
 def index():
     """Dashboard page"""
     try:
-        stats = calculate_dashboard_stats()
-        patients = load_patients_from_csv()
+        snapshot = get_patient_snapshot()
+        stats = calculate_dashboard_stats(snapshot)
+        patients = snapshot.patients
         
         # Get recent patients (last 10)
         recent_patients = patients[-10:] if patients else []
@@ -40,6 +52,8 @@ def register():
             medical_history = request.form.get('medical_history', '').strip()
             bill_amount = float(request.form.get('bill_amount', 0))
             amount_paid = float(request.form.get('amount_paid', 0))
+            if not (math.isfinite(bill_amount) and math.isfinite(amount_paid)):
+                raise ValueError("amounts must be finite")
             payment_status = request.form.get('payment_status', 'Unpaid')
             insurance_coverage = request.form.get('insurance_coverage', 'No')
             insurance_details = request.form.get('insurance_details', '').strip()
@@ -49,22 +63,12 @@ def register():
                 flash('Please fill in all required fields.', 'error')
                 return render_template('register.html', form_data=request.form)
             
-            # Generate patient ID and calculate outstanding amount
-            patient_id = generate_patient_id()
-            outstanding_amount = bill_amount - amount_paid
-            
-            # Update payment status based on amounts
-            if amount_paid >= bill_amount:
-                payment_status = 'Fully Paid'
-                outstanding_amount = 0
-            elif amount_paid > 0:
-                payment_status = 'Partially Paid'
-            else:
-                payment_status = 'Unpaid'
+            # Derive the payment status from the amounts; the ID is assigned when the row is saved
+            payment_status, outstanding_amount = derive_payment_fields(bill_amount, amount_paid)
             
             # Create patient object
             patient = Patient(
-                patient_id=patient_id,
+                patient_id='',
                 name=name,
                 age=age,
                 gender=gender,
@@ -87,7 +91,7 @@ def register():
             if save_patient_to_csv(patient):
                 return render_template('success.html', 
                                      patient_name=name, 
-                                     patient_id=patient_id)
+                                     patient_id=patient.patient_id)
             else:
                 flash('Error saving patient data. Please try again.', 'error')
                 return render_template('register.html', form_data=request.form)
@@ -109,10 +113,16 @@ def patients():
         query = request.args.get('search', '')
         severity_filter = request.args.get('severity', '')
         status_filter = request.args.get('status', '')
+        payment_status_filter = request.args.get('payment_status', '')
+        locality_filter = request.args.get('locality', '')
         sort_by = request.args.get('sort', 'name')
         sort_order = request.args.get('order', 'asc')
         
-        patients = search_patients(query, severity_filter, status_filter)
+        patients, facets = search_patients_with_facets(
+            query, severity_filter, status_filter,
+            payment_status_filter=payment_status_filter,
+            locality_filter=locality_filter
+        )
         
         # Sort patients based on sort_by parameter
         if patients:
@@ -135,16 +145,27 @@ def patients():
             elif sort_by == 'locality':
                 patients.sort(key=lambda p: p.locality.lower() if p.locality else '', reverse=reverse_order)
         
-        # Get unique severity levels for filter dropdown
-        all_patients = load_patients_from_csv()
-        severity_levels = list(set(p.condition_severity for p in all_patients if p.condition_severity))
+        # Nothing matched exactly: offer the closest names, allowing for typos
+        suggestions = []
+        if query and not patients:
+            suggestions = fuzzy_search_patients(
+                query, limit=10, severity_filter=severity_filter, status_filter=status_filter,
+                payment_status_filter=payment_status_filter, locality_filter=locality_filter
+            )
+        
+        # Facet values and counts for the filter dropdowns come from the bitmap index
+        severity_levels = [value for value, _ in facets['condition_severity']]
         
         return render_template('patients.html', 
                              patients=patients, 
+                             suggestions=suggestions,
                              severity_levels=severity_levels,
+                             facets=facets,
                              current_search=query,
                              current_severity=severity_filter,
                              current_status=status_filter,
+                             current_payment_status=payment_status_filter,
+                             current_locality=locality_filter,
                              current_sort=sort_by,
                              current_order=sort_order)
     except Exception as e:
@@ -155,8 +176,7 @@ def patients():
 def patient_detail(patient_id):
     """Patient detail view"""
     try:
-        patients = load_patients_from_csv()
-        patient = next((p for p in patients if p.patient_id == patient_id), None)
+        patient = get_patient_index().get(patient_id)
         
         if not patient:
             return render_template('error.html', error="Patient not found")
@@ -166,6 +186,248 @@ def patient_detail(patient_id):
         logging.error(f"Error loading patient detail: {e}")
         return render_template('error.html', error="Error loading patient data")
 
+# Fields a batch lookup may project, in record order
+PATIENT_FIELDS = [field.name for field in fields(Patient)]
+MAX_BATCH_IDS = 5000
+
+@app.route('/api/patients/batch', methods=['POST'])
+def batch_patients():
+    """Resolve many patient IDs in one request from the ID index"""
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids')
+    requested_fields = payload.get('fields') or PATIENT_FIELDS
+    
+    if not isinstance(ids, list) or not all(isinstance(patient_id, str) for patient_id in ids):
+        return jsonify({'error': "'ids' must be a list of patient ID strings"}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} IDs per request'}), 400
+    if not isinstance(requested_fields, list):
+        return jsonify({'error': "'fields' must be a list of field names", 'fields': PATIENT_FIELDS}), 400
+    unknown_fields = [field for field in requested_fields if field not in PATIENT_FIELDS]
+    if unknown_fields:
+        return jsonify({'error': f'Unknown fields: {unknown_fields}', 'fields': PATIENT_FIELDS}), 400
+    
+    try:
+        index = get_patient_index()
+        results, not_found = [], []
+        for patient_id in dict.fromkeys(ids):
+            patient = index.get(patient_id)
+            if patient is None:
+                not_found.append(patient_id)
+                continue
+            results.append({field: getattr(patient, field) for field in requested_fields})
+        
+        return jsonify({
+            'patients': results,
+            'not_found': not_found,
+            'generation': current_data_generation()
+        })
+    except Exception as e:
+        logging.error(f"Error in batch patient lookup: {e}")
+        return jsonify({'error': str(e)}), 500
+
+MAX_BULK_PATIENTS = 1000
+
+def _bulk_patient_fields(payload) -> Tuple[Optional[dict], List[str]]:
+    """Validate one bulk registration payload like the register form does"""
+    if not isinstance(payload, dict):
+        return None, ['must be an object']
+    errors = []
+    values = {
+        'name': str(payload.get('name') or '').strip(),
+        'gender': str(payload.get('gender') or ''),
+        'locality': str(payload.get('locality') or '').strip(),
+        'condition_severity': str(payload.get('condition_severity') or ''),
+        'priority_level': str(payload.get('priority_level') or ''),
+        'medical_history': str(payload.get('medical_history') or '').strip(),
+        'insurance_coverage': str(payload.get('insurance_coverage') or 'No'),
+        'insurance_details': str(payload.get('insurance_details') or '').strip()
+    }
+    for field, convert in (('age', int), ('bill_amount', float), ('amount_paid', float)):
+        try:
+            values[field] = convert(payload.get(field) or 0)
+        except (TypeError, ValueError):
+            values[field] = None
+            errors.append(f'{field} must be a number')
+            continue
+        # float() accepts 'nan' and 'inf', which would poison every total they reach
+        if not math.isfinite(values[field]):
+            values[field] = None
+            errors.append(f'{field} must be a finite number')
+    # Same required fields as the register form (zero counts as missing there too)
+    for field in ('name', 'age', 'gender', 'condition_severity', 'bill_amount'):
+        if values[field] is not None and not values[field]:
+            errors.append(f'{field} is required')
+    return (None if errors else values), errors
+
+@app.route('/api/patients/bulk', methods=['POST'])
+def bulk_register_patients():
+    """Register many patients with a single locked append to the CSV"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, list) or not payload:
+        return jsonify({'error': 'Expected a non-empty JSON array of patients'}), 400
+    if len(payload) > MAX_BULK_PATIENTS:
+        return jsonify({'error': f'At most {MAX_BULK_PATIENTS} patients per request'}), 400
+    
+    try:
+        validated = [_bulk_patient_fields(row) for row in payload]
+        now = datetime.now()
+        
+        results, patients, created = [], [], []
+        for row_number, (values, errors) in enumerate(validated):
+            if values is None:
+                results.append({'row': row_number, 'status': 'error', 'errors': errors})
+                continue
+            payment_status, outstanding_amount = derive_payment_fields(values['bill_amount'], values['amount_paid'])
+            # IDs are assigned under the append lock
+            patient = Patient(
+                patient_id='',
+                outstanding_amount=outstanding_amount,
+                payment_status=payment_status,
+                admission_date=now.strftime('%Y-%m-%d'),
+                discharge_date=None,
+                timestamp=now.isoformat(),
+                **values
+            )
+            patients.append(patient)
+            results.append({'row': row_number, 'status': 'created'})
+            created.append((results[-1], patient))
+        
+        if patients and not append_patients_to_csv(patients):
+            return jsonify({'error': 'Error saving patient data'}), 500
+        for result, patient in created:
+            result['patient_id'] = patient.patient_id
+        
+        return jsonify({
+            'created': len(patients),
+            'failed': len(payload) - len(patients),
+            'results': results
+        })
+    except Exception as e:
+        logging.error(f"Error in bulk patient registration: {e}")
+        return jsonify({'error': str(e)}), 500
+
+MAX_QUERY_LIMIT = 100000
+
+@app.route('/api/patients/query')
+def query_patients_api():
+    """Filtered, sorted, paged patients streamed as NDJSON with only the requested fields.
+
+    Query args: severity, status, payment_status, locality, admitted_from,
+    admitted_to (YYYY-MM-DD), sort (field, '-field' for descending), limit,
+    cursor and fields (comma-separated). The next page's cursor is returned
+    in the X-Next-Cursor header.
+    """
+    requested_fields = [f for f in request.args.get('fields', '').split(',') if f] or PATIENT_FIELDS
+    sort = request.args.get('sort', '')
+    sort_field = sort.lstrip('-') or None
+    limit = request.args.get('limit', 1000, type=int)
+    admitted_from = request.args.get('admitted_from', '')
+    admitted_to = request.args.get('admitted_to', '')
+    
+    unknown_fields = [f for f in requested_fields + ([sort_field] if sort_field else []) if f not in PATIENT_FIELDS]
+    if unknown_fields:
+        return jsonify({'error': f'Unknown fields: {unknown_fields}', 'fields': PATIENT_FIELDS}), 400
+    if not 1 <= limit <= MAX_QUERY_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_QUERY_LIMIT}'}), 400
+    for value in (admitted_from, admitted_to):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': f'Invalid date {value!r}, expected YYYY-MM-DD'}), 400
+    
+    try:
+        page, next_cursor = query_patients(
+            {
+                'condition_severity': request.args.get('severity', ''),
+                'status': request.args.get('status', ''),
+                'payment_status': request.args.get('payment_status', ''),
+                'locality': request.args.get('locality', '')
+            },
+            admitted_from, admitted_to, sort_field, sort.startswith('-'), limit,
+            request.args.get('cursor', '')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error querying patients: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        for patient in page:
+            yield json.dumps({field: getattr(patient, field) for field in requested_fields}) + '\n'
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['X-Data-Generation'] = str(current_data_generation())
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/patients/suggest')
+def suggest_patients():
+    """Typeahead: patients whose name, a name part or ID starts with `q`"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    try:
+        matches = get_patient_index().suggest(query, limit) if query else []
+        return jsonify({
+            'query': query,
+            'results': [{
+                'patient_id': patient.patient_id,
+                'name': patient.name,
+                'age': patient.age,
+                'locality': patient.locality,
+                'matched': field
+            } for patient, field in matches]
+        })
+    except Exception as e:
+        logging.error(f"Error suggesting patients: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/patients/fuzzy')
+def fuzzy_patients():
+    """Approximate name search returning ranked candidates with their edit distances"""
+    query = request.args.get('q', '').strip()
+    max_distance = min(max(request.args.get('max_distance', 2, type=int), 0), 3)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    try:
+        matches = fuzzy_search_patients(
+            query, max_distance, limit,
+            severity_filter=request.args.get('severity', ''),
+            status_filter=request.args.get('status', ''),
+            payment_status_filter=request.args.get('payment_status', ''),
+            locality_filter=request.args.get('locality', '')
+        ) if query else []
+        return jsonify({
+            'query': query,
+            'max_distance': max_distance,
+            'results': [{
+                'patient_id': patient.patient_id,
+                'name': patient.name,
+                'age': patient.age,
+                'locality': patient.locality,
+                'distance': distance
+            } for patient, distance in matches]
+        })
+    except Exception as e:
+        logging.error(f"Error in fuzzy patient search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats/compression')
+def compression_stats():
+    """Byte counters from the response compression middleware"""
+    return jsonify(app.extensions['compression'].stats())
+
+@app.route('/api/ready')
+def readiness():
+    """Readiness probe: 503 while the worker is warming up"""
+    status = warmup_status()
+    response = jsonify(status)
+    response.status_code = 200 if status['ready'] else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('error.html', error="Page not found"), 404
@@ -173,3 +435,57 @@ def not_found_error(error):
 @app.errorhandler(500)
 def internal_error(error):
     return render_template('error.html', error="Internal server error"), 500
+
+@app.cli.command('verify-stats')
+def verify_stats_command():
+    """Recompute the dashboard aggregates from the CSV and repair any drift"""
+    result = verify_dashboard_aggregates()
+    if result['consistent']:
+        click.echo(f"Dashboard aggregates consistent at generation {result['generation']}")
+    else:
+        for field, values in result['mismatches'].items():
+            click.echo(f"{field}: cached {values['cached']} != actual {values['actual']}")
+        click.echo(f"Aggregates repaired, now at generation {result['generation']}")
+
+@app.cli.command('refresh-aging')
+def refresh_aging_command():
+    """Rebuild the receivables aging buckets as of today (run nightly after midnight)"""
+    aging = refresh_aging_summary().to_summary()
+    for row in aging['buckets']:
+        click.echo(f"{row['bucket']:>6}: {row['count']} patients, {row['amount']:,.2f} outstanding")
+    click.echo(f"Aging as of {aging['as_of']}: {aging['total_outstanding']:,.2f} outstanding")
+
+@app.cli.command('reconcile')
+@click.option('--csv', 'path', default=CSV_FILE, show_default=True, help='Patient CSV to check')
+@click.option('--output', help='Write a corrected copy here (atomically)')
+@click.option('--fix', is_flag=True, help='Correct the checked file itself, atomically and under its lock')
+@click.option('--samples', default=10, show_default=True, help='Example rows to show per check')
+def reconcile_command(path, output, fix, samples):
+    """Check every patient row for billing drift and duplicate IDs; exits 1 if any row fails"""
+    from reconcile import CHECKS, reconcile
+    
+    report = reconcile(path, output=path if fix else output, sample_limit=samples)
+    click.echo(f"Checked {report['rows']} rows in {path}")
+    for check in CHECKS:
+        click.echo(f"  {check}: {report['counts'][check]}")
+        for sample in report['samples'].get(check, []):
+            details = ', '.join(f"{k}={v}" for k, v in sample.items() if k not in ('line', 'patient_id'))
+            click.echo(f"    line {sample['line']} {sample['patient_id']}{': ' + details if details else ''}")
+    if report['output']:
+        click.echo(f"Corrected {report['corrected']} rows, written to {report['output']}")
+    if any(report['counts'].values()):
+        raise SystemExit(1)
+
+@app.cli.command('generate-invoices')
+@click.option('--output', default=None, help='ZIP to write (default: invoices_<period>.zip)')
+@click.option('--period', default=lambda: datetime.now().strftime('%Y-%m'), help='Billing period, YYYY-MM')
+@click.option('--workers', type=int, default=None, help='Worker processes (default and maximum: one per core)')
+def generate_invoices_command(output, period, workers):
+    """Render an invoice PDF for every patient with an outstanding balance into a ZIP"""
+    from invoices import invoice_fields, write_invoice_zip
+    
+    invoices = [invoice_fields(p) for p in get_patient_snapshot().patients if p.outstanding_amount > 0]
+    output = output or f"invoices_{period}.zip"
+    with click.progressbar(length=len(invoices), label='Rendering invoices') as bar:
+        written = write_invoice_zip(invoices, output, period, workers, lambda done: bar.update(done - bar.pos))
+    click.echo(f"Wrote {written} invoices to {output}")
@@ -0,0 +1,86 @@
+"""Measure the cold-start import cost of the app.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+reports the slowest modules, the cost per top-level package and whether any
+heavy dependency was pulled in at import time.
+
+    python startup_profile.py                   # profile `import app`
+    python startup_profile.py --top 30
+    python startup_profile.py --budget-ms 150   # exit 1 when over budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Dependencies that should only load inside the code paths that need them
+HEAVY_MODULES = ('pandas', 'numpy', 'reportlab', 'sklearn', 'matplotlib', 'seaborn')
+
+def measure_imports(module: str) -> List[Tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every module imported by `module`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+def summarize(timings: List[Tuple[str, int, int]], module: str) -> Dict:
+    by_package = defaultdict(int)
+    for name, self_us, _ in timings:
+        by_package[name.split('.')[0]] += self_us
+
+    total_us = next((cumulative for name, _, cumulative in timings if name == module), 0)
+    return {
+        'total_ms': total_us / 1000,
+        'slowest': sorted(timings, key=lambda t: t[1], reverse=True),
+        'packages': sorted(by_package.items(), key=lambda p: p[1], reverse=True),
+        'heavy_loaded': [name for name in HEAVY_MODULES if name in by_package]
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='module to import (default: app)')
+    parser.add_argument('--baseline', default='flask', help='module measured as the floor (default: flask)')
+    parser.add_argument('--top', type=int, default=15, help='number of modules/packages to list')
+    parser.add_argument('--budget-ms', type=float, help='fail when import time exceeds this many ms over the baseline')
+    args = parser.parse_args()
+
+    report = summarize(measure_imports(args.module), args.module)
+    baseline = summarize(measure_imports(args.baseline), args.baseline)
+    overhead_ms = report['total_ms'] - baseline['total_ms']
+
+    print(f"import {args.module}: {report['total_ms']:.1f} ms "
+          f"({args.baseline} baseline {baseline['total_ms']:.1f} ms, overhead {overhead_ms:.1f} ms)")
+
+    print(f"\nSlowest modules (self time):")
+    for name, self_us, cumulative_us in report['slowest'][:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    print(f"\nBy top-level package:")
+    for package, self_us in report['packages'][:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    if report['heavy_loaded']:
+        print(f"\nHeavy dependencies imported at start-up: {', '.join(report['heavy_loaded'])}")
+    else:
+        print(f"\nNo heavy dependencies imported at start-up")
+
+    if args.budget_ms is not None and overhead_ms > args.budget_ms:
+        print(f"\nOver budget: {overhead_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from flask import request
+from werkzeug.http import parse_accept_header
+from werkzeug.security import safe_join
+from compression import COMPRESSIBLE_TYPES
+
+# Fingerprinted URLs change whenever the content does, so they never need revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class StaticAssets:
+    """Content-hashed static URLs served with year-long immutable caching.
+
+    `url_for('static', filename=...)` gains a `v=<hash>` argument. Requests
+    carrying the current hash are served immutable, gzip-encoded from memory
+    when the client accepts it; anything else falls back to Flask's own
+    revalidating static view. Hashes are recomputed when a file's size or
+    mtime changes, so there is no build step.
+    """
+
+    def __init__(self, app, min_gzip_size: int = 512):
+        self.app = app
+        self.min_gzip_size = min_gzip_size
+        # filename -> ((size, mtime_ns), fingerprint, mimetype, gzipped body or None)
+        self._assets: Dict[str, Tuple[tuple, str, str, Optional[bytes]]] = {}
+        self._lock = threading.Lock()
+        self._send_static = app.view_functions['static']
+        app.view_functions['static'] = self.serve
+        app.url_defaults(self._add_fingerprint)
+
+    def _asset(self, filename: str) -> Optional[Tuple[tuple, str, str, Optional[bytes]]]:
+        path = safe_join(self.app.static_folder, filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None:
+            return None
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._assets.get(filename)
+        if cached is not None and cached[0] == signature:
+            return cached
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        gzipped = None
+        if mimetype.startswith(COMPRESSIBLE_TYPES) and len(data) >= self.min_gzip_size:
+            gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+
+        entry = (signature, hashlib.sha1(data).hexdigest()[:12], mimetype, gzipped)
+        with self._lock:
+            self._assets[filename] = entry
+        return entry
+
+    def fingerprint(self, filename: str) -> Optional[str]:
+        """Content hash of a static file, or None if it does not exist"""
+        asset = self._asset(filename)
+        return asset[1] if asset else None
+
+    def _add_fingerprint(self, endpoint: str, values: Dict) -> None:
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = self.fingerprint(values['filename'])
+            if fingerprint:
+                values['v'] = fingerprint
+
+    def serve(self, filename: str):
+        asset = self._asset(filename)
+        if asset is None or request.args.get('v') != asset[1]:
+            # Unversioned or stale URL: keep Flask's short, revalidating cache
+            return self._send_static(filename=filename)
+
+        _, fingerprint, mimetype, gzipped = asset
+        accept = parse_accept_header(request.headers.get('Accept-Encoding', ''))
+        if gzipped is not None and accept.quality('gzip') > 0:
+            response = self.app.response_class(gzipped, mimetype=mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+            # Not "-gzip": CompressionMiddleware strips that suffix from If-None-Match
+            response.set_etag(f"{fingerprint}.gz")
+            response = response.make_conditional(request)
+        else:
+            response = self._send_static(filename=filename)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,65 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from emergency_queue import EmergencyQueue
+from models import Patient
+from payment_references import PaymentReferenceJournal
+
+def make_patient(patient_id: str, name: str, **overrides) -> Patient:
+    values = dict(
+        patient_id=patient_id, name=name, age=40, gender='Female', locality='Andheri',
+        condition_severity='Medium', priority_level='Medium', medical_history='Fever',
+        bill_amount=1000.0, amount_paid=0.0, outstanding_amount=1000.0, payment_status='Unpaid',
+        insurance_coverage='No', insurance_details='', admission_date='2025-03-01',
+        discharge_date=None, timestamp='2025-03-01T09:00:00'
+    )
+    values.update(overrides)
+    return Patient(**values)
+
+SAMPLE_PATIENTS = [
+    make_patient('P001', 'Asha Rao', condition_severity='Critical', admission_date='2025-01-05'),
+    make_patient('P002', 'Ravi Kumar', locality='Bandra', bill_amount=500.0, amount_paid=200.0,
+                 outstanding_amount=300.0, payment_status='Partially Paid', admission_date='2025-02-11'),
+    make_patient('P003', 'Meera Nair', condition_severity='High', bill_amount=800.0, amount_paid=800.0,
+                 outstanding_amount=0, payment_status='Fully Paid', admission_date='2025-02-20',
+                 discharge_date='2025-02-25'),
+    make_patient('P004', 'Asha Menon', locality='Bandra', admission_date='2025-03-15'),
+    make_patient('P005', 'Kiran Rao', condition_severity='Low', bill_amount=1200.0, outstanding_amount=1200.0,
+                 admission_date='2025-04-02'),
+]
+
+def write_patients(path, patients) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(utils.PATIENT_CSV_HEADER)
+        writer.writerows(utils.patient_to_row(patient) for patient in patients)
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Run against a fresh patient CSV and fresh journals in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    write_patients(utils.CSV_FILE, SAMPLE_PATIENTS)
+    monkeypatch.setattr(utils, '_data_state', {'generation': 0, 'signature': None, 'aggregates': None,
+                                               'aging': None, 'rollup': None})
+    monkeypatch.setattr(utils, '_snapshot_cache', {'snapshot': None})
+    monkeypatch.setattr(utils, 'payment_references', PaymentReferenceJournal(utils.PAYMENT_REFERENCES_FILE))
+    monkeypatch.setattr(utils, 'emergency_queue', EmergencyQueue(utils.EMERGENCY_JOURNAL_FILE))
+    return tmp_path
+
+@pytest.fixture
+def client(data_dir):
+    from app import app
+    from response_cache import response_cache
+
+    # Generations restart in every test, so responses cached by generation would be stale
+    response_cache.clear()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    response_cache.clear()
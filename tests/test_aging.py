@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import utils
+from conftest import make_patient
+from models import AgingSummary
+
+def test_bucket_boundaries():
+    aging = AgingSummary(as_of='2025-06-30')
+    assert [aging.bucket_for(day) for day in ('2025-06-30', '2025-05-31', '2025-05-30', '2025-05-01',
+                                              '2025-04-30', '2025-04-01', '2025-03-31')] == \
+        ['0-30', '0-30', '31-60', '31-60', '61-90', '61-90', '90+']
+    # Timestamps are cut to the date; anything unparseable counts as oldest
+    assert aging.bucket_for('2025-06-20T10:30:00') == '0-30'
+    assert aging.bucket_for('') == aging.bucket_for(None) == aging.bucket_for('soon') == '90+'
+
+def test_summary_buckets_by_coverage_and_follows_payments():
+    patients = [
+        make_patient('P1', 'A', admission_date='2025-06-25', outstanding_amount=100.0),
+        make_patient('P2', 'B', admission_date='2025-05-15', outstanding_amount=200.0, insurance_coverage='Yes'),
+        make_patient('P3', 'C', admission_date='2025-01-01', outstanding_amount=300.0),
+        make_patient('P4', 'D', admission_date='2025-06-01', outstanding_amount=0, payment_status='Fully Paid'),
+    ]
+    aging = AgingSummary.from_patients(patients, '2025-06-30')
+    summary = aging.to_summary()
+    assert summary['buckets'] == [{'bucket': '0-30', 'amount': 100.0, 'count': 1},
+                                  {'bucket': '31-60', 'amount': 200.0, 'count': 1},
+                                  {'bucket': '61-90', 'amount': 0.0, 'count': 0},
+                                  {'bucket': '90+', 'amount': 300.0, 'count': 1}]
+    assert list(summary['by_insurance']) == ['No', 'Yes']
+    assert summary['by_insurance']['Yes'][1] == {'bucket': '31-60', 'amount': 200.0, 'count': 1}
+    assert (summary['total_outstanding'], summary['total_count']) == (600.0, 3)
+
+    copy = aging.copy()
+    copy.apply_payment(make_patient('P3', 'C', admission_date='2025-01-01', outstanding_amount=50.0), 300.0)
+    copy.apply_payment(make_patient('P1', 'A', admission_date='2025-06-25', outstanding_amount=0), 100.0)
+    assert [row['amount'] for row in copy.to_summary()['buckets']] == [0.0, 200.0, 0.0, 50.0]
+    assert 'No|0-30' not in copy.cells
+    assert aging.to_summary() == summary
+
+def test_aging_api_is_maintained_by_writes_and_rebuilt_on_a_new_day(client):
+    summary = client.get('/api/billing/aging').get_json()
+    assert summary['as_of'] == date.today().isoformat()
+    assert summary['buckets'][-1] == {'bucket': '90+', 'amount': 3500.0, 'count': 4}
+
+    utils.save_patient_to_csv(make_patient('', 'Walk In', admission_date=date.today().isoformat()))
+    assert utils.post_payments([('P005', 1200.0, '')])[0][0] == 'applied'
+    summary = client.get('/api/billing/aging').get_json()
+    assert summary['buckets'][0] == {'bucket': '0-30', 'amount': 1000.0, 'count': 1}
+    assert summary['buckets'][-1] == {'bucket': '90+', 'amount': 2300.0, 'count': 3}
+
+    # A summary left over from yesterday is rebuilt rather than served
+    utils._data_state['aging'].as_of = (date.today() - timedelta(days=1)).isoformat()
+    assert utils.get_aging_summary()['as_of'] == date.today().isoformat()
+    assert utils._data_state['aging'].as_of == date.today().isoformat()
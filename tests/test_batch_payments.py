@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import stat
+
+import utils
+from conftest import make_patient
+from payment_references import PaymentReferenceJournal
+
+def new_patient(name: str, **overrides):
+    return make_patient('', name, **overrides)
+
+def _register_in_child(worker: int) -> None:
+    for i in range(10):
+        utils.append_patients_to_csv([new_patient(f'Process {worker} Patient {i}')])
+
+def _pay_in_child(_: int) -> None:
+    for _ in range(10):
+        utils.post_payments([('P005', 10.0, '')])
+
+def test_concurrent_processes_neither_lose_rows_nor_payments(data_dir):
+    os.chmod(utils.CSV_FILE, 0o664)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_register_in_child, args=(worker,)) for worker in range(3)]
+    processes.append(context.Process(target=_pay_in_child, args=(0,)))
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    patients = utils.load_patients_from_csv()
+    assert len(patients) == 35 and len({p.patient_id for p in patients}) == 35
+    paid = next(p for p in patients if p.patient_id == 'P005')
+    assert paid.amount_paid == 100.0 and paid.payment_status == 'Partially Paid'
+    # Rewrites go through a temp file, but keep the CSV's permissions
+    assert stat.S_IMODE(os.stat(utils.CSV_FILE).st_mode) == 0o664
+    # This process's cached totals are stale; the next read rebuilds them from the file
+    assert utils.calculate_dashboard_stats()['total_patients'] == 35
+    assert utils.verify_dashboard_aggregates()['consistent']
+
+def test_post_payments_statuses_and_accumulation(data_dir):
+    results = utils.post_payments([
+        ('P002', 100.0, 'R1'),
+        ('missing', 50.0, 'R2'),
+        ('P002', 200.0, 'R3'),
+        ('P001', 10.0, 'R1'),
+    ])
+    assert [status for status, _ in results] == ['applied', 'not_found', 'applied', 'duplicate_reference']
+    patient = results[2][1]
+    assert (patient.amount_paid, patient.outstanding_amount, patient.payment_status) == (500.0, 0, 'Fully Paid')
+
+    stored = {p.patient_id: p for p in utils.load_patients_from_csv()}
+    assert stored['P002'].amount_paid == 500.0 and stored['P001'].amount_paid == 0.0
+    stats = utils.calculate_dashboard_stats()
+    assert stats['total_paid'] == 1300.0
+    assert (stats['fully_paid_count'], stats['partially_paid_count'], stats['unpaid_count']) == (2, 0, 3)
+    assert utils.verify_dashboard_aggregates()['consistent']
+
+    # A resubmitted batch is rejected, by any process reading the journal afresh
+    assert [status for status, _ in utils.post_payments([('P002', 100.0, 'R1')])] == ['duplicate_reference']
+    assert PaymentReferenceJournal(utils.PAYMENT_REFERENCES_FILE).applied(['R1', 'R2', 'R3']) == {'R1', 'R3'}
+
+def test_post_payments_without_matches_leaves_the_file_alone(data_dir):
+    inode = os.stat(utils.CSV_FILE).st_ino
+    generation = utils.get_data_generation()
+    assert utils.post_payments([('missing', 10.0, 'R9')]) == [('not_found', None)]
+    assert os.stat(utils.CSV_FILE).st_ino == inode
+    assert utils.get_data_generation() == generation
+    assert not os.path.exists(utils.PAYMENT_REFERENCES_FILE)
+
+def test_payment_reference_journal_recovers_from_a_torn_line(data_dir):
+    journal = PaymentReferenceJournal('refs.journal')
+    journal.record(['A', 'B'])
+    with open('refs.journal', 'a', encoding='utf-8') as f:
+        f.write('"tor')
+
+    reader = PaymentReferenceJournal('refs.journal')
+    assert reader.applied(['A', 'B', 'tor']) == {'A', 'B'}
+    journal.record(['C'])
+    assert reader.applied(['A', 'B', 'C']) == {'A', 'B', 'C'}
+    assert PaymentReferenceJournal('refs.journal').applied(['A', 'B', 'C']) == {'A', 'B', 'C'}
+
+def test_payment_reference_journal_rereads_a_replaced_file(data_dir):
+    journal = PaymentReferenceJournal('refs.journal')
+    journal.record(['A'])
+    with open('refs.tmp', 'w', encoding='utf-8') as f:
+        f.write('"B"\n')
+    os.replace('refs.tmp', 'refs.journal')
+    assert journal.applied(['A', 'B']) == {'B'}
+
+def test_batch_payments_reject_references_already_applied(client):
+    first = client.post('/api/payments/batch', json=[
+        {'patient_id': 'P002', 'amount': 100, 'reference': 'REM-1'},
+        {'patient_id': 'P004', 'amount': 'inf', 'reference': 'REM-2'},
+        {'patient_id': 'P005', 'amount': 50, 'reference': 'REM-1'},
+        {'patient_id': 'missing', 'amount': 50, 'reference': 'REM-3'},
+    ]).get_json()
+    assert [result['status'] for result in first['results']] == ['applied', 'error', 'error', 'error']
+    assert first['results'][0]['amount_paid'] == 300.0
+    assert first['results'][2]['error'] == 'duplicate reference in this batch'
+    assert first['results'][3]['error'] == 'patient not found'
+
+    csv_batch = 'patient_id,amount,reference\nP002,100,REM-1\nP005,50,REM-3\n'
+    second = client.post('/api/payments/batch', data=csv_batch, content_type='text/csv').get_json()
+    assert [result['status'] for result in second['results']] == ['error', 'applied']
+    assert second['results'][0]['error'] == 'reference already applied'
+    assert {p.patient_id: p.amount_paid for p in utils.load_patients_from_csv()}['P002'] == 300.0
+
+def test_update_payment_form_posts_a_payment(client):
+    response = client.post('/update_payment/P001', data={'payment_amount': '250'})
+    assert response.status_code == 302
+    assert {p.patient_id: p.amount_paid for p in utils.load_patients_from_csv()}['P001'] == 250.0
@@ -0,0 +1,56 @@
+import pytest
+
+import billing_anomalies
+import utils
+from billing_anomalies import MIN_GROUP_SIZE, BillingAnomalies, get_billing_anomalies
+from conftest import make_patient
+
+FEVER_BILLS = (1000.0, 1010.0, 990.0, 1005.0, 995.0, 1000.0, 1002.0, 998.0)
+
+def bills(history: str, amounts, start: int = 0):
+    return [make_patient(f'{history[0]}{start + i}', f'{history} {i}', medical_history=history, bill_amount=amount)
+            for i, amount in enumerate(amounts)]
+
+def test_modified_z_score_flags_outliers_within_their_group():
+    patients = bills('Fever', FEVER_BILLS + (5000.0,))
+    anomalies = BillingAnomalies(patients)
+    flagged = anomalies.flagged()
+    assert [row['patient_id'] for row in flagged] == ['F8']
+    # Median 1000, MAD 5: (5000 - 1000) / (5 / 0.6745)
+    assert flagged[0]['typical_bill'] == 1000.0
+    assert flagged[0]['score'] == pytest.approx(4000 / (5 / 0.6745), abs=0.01)
+    assert flagged[0]['reasons'] == [f"charge has modified z-score {flagged[0]['score']:.1f} "
+                                     "within its history+severity group"]
+    assert all(abs(score) < billing_anomalies.ANOMALY_THRESHOLD for score in anomalies.score[:-1])
+
+def test_small_groups_are_scored_against_their_severity():
+    small = BillingAnomalies(bills('Fever', FEVER_BILLS) + bills('Asthma', [6000.0] * (MIN_GROUP_SIZE - 1)))
+    assert {row['patient_id'] for row in small.flagged()} == {f'A{i}' for i in range(MIN_GROUP_SIZE - 1)}
+    assert set(small.grouping[len(FEVER_BILLS):]) == {'severity'}
+
+    # At the cutoff the group is its own baseline, and identical bills are not outliers
+    full = BillingAnomalies(bills('Fever', FEVER_BILLS) + bills('Asthma', [6000.0] * MIN_GROUP_SIZE))
+    assert full.flagged() == []
+    assert set(full.grouping) == {'history+severity'}
+
+def test_overpayments_come_first():
+    patients = bills('Fever', FEVER_BILLS + (5000.0, 9000.0))
+    patients.append(make_patient('X1', 'Over Paid', bill_amount=100.0, amount_paid=150.0, outstanding_amount=0,
+                                 payment_status='Fully Paid'))
+    anomalies = BillingAnomalies(patients)
+    assert [row['patient_id'] for row in anomalies.flagged()] == ['X1', 'F9', 'F8']
+    assert anomalies.flagged(1)[0]['reasons'][0] == 'payment exceeds bill'
+    assert anomalies.summary() == {'scored': 11, 'flagged': 3, 'high_charges': 2, 'overpayments': 1}
+    assert BillingAnomalies([]).summary() == {'scored': 0, 'flagged': 0, 'high_charges': 0, 'overpayments': 0}
+
+def test_scores_are_cached_per_generation_and_served_by_the_api(client, monkeypatch):
+    monkeypatch.setattr(billing_anomalies, '_anomaly_cache', {})
+    snapshot = utils.get_patient_snapshot()
+    assert get_billing_anomalies(snapshot) is get_billing_anomalies(snapshot)
+
+    utils.post_payments([('P003', 50.0, '')])
+    latest = utils.get_patient_snapshot()
+    assert get_billing_anomalies(latest) is not get_billing_anomalies(snapshot)
+    body = client.get('/api/billing/anomalies?limit=5').get_json()
+    assert body['overpayments'] == 1
+    assert body['anomalies'][0]['patient_id'] == 'P003'
@@ -0,0 +1,33 @@
+import base64
+import re
+import zlib
+
+import utils
+from conftest import make_patient
+
+def pdf_text(data: bytes) -> str:
+    """Text drawn in a reportlab PDF: its page streams are ASCII85-encoded and deflated"""
+    text = ''
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', data, re.S):
+        stream = stream.strip()
+        if stream.endswith(b'~>'):
+            stream = base64.a85decode(stream[:-2])
+        try:
+            text += zlib.decompress(stream).decode('latin-1')
+        except zlib.error:
+            pass
+    return text
+
+def test_billing_pdf_is_cached_per_generation_and_stamped_with_its_write_time(client):
+    first = client.get('/download_report_pdf')
+    assert first.status_code == 200 and first.mimetype == 'application/pdf'
+    as_of = utils.get_data_last_modified().astimezone().strftime('%B %d, %Y %I:%M %p')
+    assert f'Data As Of: {as_of}' in pdf_text(first.get_data())
+    assert 'Generated At' not in pdf_text(first.get_data())
+    assert client.get('/download_report_pdf').get_data() == first.get_data()
+
+    utils.save_patient_to_csv(make_patient('', 'Walk In'))
+    second = client.get('/download_report_pdf')
+    assert second.headers['ETag'] != first.headers['ETag']
+    as_of = utils.get_data_last_modified().astimezone().strftime('%B %d, %Y %I:%M %p')
+    assert f'Data As Of: {as_of}' in pdf_text(second.get_data())
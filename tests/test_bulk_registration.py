@@ -0,0 +1,91 @@
+import multiprocessing
+import threading
+
+import utils
+from conftest import make_patient
+
+def registration(name: str, **overrides):
+    payload = {'name': name, 'age': 30, 'gender': 'Male', 'condition_severity': 'Low', 'bill_amount': 400}
+    payload.update(overrides)
+    return payload
+
+def test_append_assigns_unique_ids_and_updates_aggregates(data_dir):
+    before = utils.calculate_dashboard_stats()
+    patients = [make_patient('', 'New One'), make_patient('', 'New Two', bill_amount=250.0, outstanding_amount=250.0)]
+    assert utils.append_patients_to_csv(patients)
+
+    ids = [patient.patient_id for patient in patients]
+    assert all(ids) and len(set(ids)) == 2
+    stats = utils.calculate_dashboard_stats()
+    assert stats['total_patients'] == before['total_patients'] + 2
+    assert stats['total_billed'] == before['total_billed'] + 1250.0
+    assert [p.patient_id for p in utils.load_patients_from_csv()][-2:] == ids
+    assert utils.get_data_generation() == 2
+    assert utils.verify_dashboard_aggregates()['consistent']
+
+def test_append_writes_the_header_to_an_empty_file(data_dir):
+    open(utils.CSV_FILE, 'w').close()
+    assert utils.append_patients_to_csv([make_patient('', 'First Ever')])
+    with open(utils.CSV_FILE, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0] == ','.join(utils.PATIENT_CSV_HEADER) and len(lines) == 2
+
+def test_concurrent_thread_appends_get_distinct_ids(data_dir):
+    def register(worker):
+        for i in range(10):
+            assert utils.append_patients_to_csv([make_patient('', f'Worker {worker} Patient {i}')])
+
+    threads = [threading.Thread(target=register, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [p.patient_id for p in utils.load_patients_from_csv()]
+    assert len(ids) == 45 and len(set(ids)) == 45
+    assert utils.calculate_dashboard_stats()['total_patients'] == 45
+    assert utils.verify_dashboard_aggregates()['consistent']
+
+def _register_in_child(worker: int) -> None:
+    for i in range(10):
+        utils.append_patients_to_csv([make_patient('', f'Process {worker} Patient {i}')])
+
+def test_concurrent_process_appends_get_distinct_ids(data_dir):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_register_in_child, args=(worker,)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    patients = utils.load_patients_from_csv()
+    assert len(patients) == 45 and len({p.patient_id for p in patients}) == 45
+    assert utils.calculate_dashboard_stats()['total_patients'] == 45
+
+def test_bulk_api_assigns_ids_and_rejects_non_finite_amounts(client):
+    response = client.post('/api/patients/bulk', json=[
+        registration('First Bulk'),
+        registration('Not A Number', bill_amount='nan'),
+        registration('Infinite Payment', amount_paid='inf'),
+        registration('Second Bulk', amount_paid=100),
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['created'], body['failed']) == (2, 2)
+    assert body['results'][1]['errors'] == ['bill_amount must be a finite number']
+    assert body['results'][2]['errors'] == ['amount_paid must be a finite number']
+    ids = [body['results'][0]['patient_id'], body['results'][3]['patient_id']]
+    assert len(set(ids)) == 2
+    stored = {p.patient_id: p for p in utils.load_patients_from_csv()}
+    assert stored[ids[1]].payment_status == 'Partially Paid' and stored[ids[1]].outstanding_amount == 300.0
+    assert utils.calculate_dashboard_stats()['total_patients'] == 7
+
+def test_bulk_api_rejects_bad_payloads(client):
+    assert client.post('/api/patients/bulk', json={'name': 'x'}).status_code == 400
+    assert client.post('/api/patients/bulk', json=[]).status_code == 400
+    body = client.post('/api/patients/bulk', json=[registration(''), 'oops']).get_json()
+    assert body['created'] == 0
+    assert body['results'][0]['errors'] == ['name is required']
+    assert body['results'][1]['errors'] == ['must be an object']
+    assert len(utils.load_patients_from_csv()) == 5
@@ -0,0 +1,79 @@
+import gzip
+import zlib
+
+from compression import CompressionMiddleware
+
+BODY = b'{"rows": [' + b','.join(b'{"id": %d}' % i for i in range(500)) + b']}'
+
+def json_app(body=BODY, chunks=1, etag='"abc"'):
+    """Answers 304 to a matching If-None-Match, like the response cache"""
+    def app(environ, start_response):
+        headers = [('Content-Type', 'application/json'), ('ETag', etag)]
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 NOT MODIFIED', headers)
+            return [b'']
+        start_response('200 OK', headers + [('Content-Length', str(len(body)))])
+        size = len(body) // chunks + 1
+        return [body[i:i + size] for i in range(0, len(body), size)]
+    return app
+
+def call(app, **environ):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'], captured['headers'] = status, dict(headers)
+
+    body = b''.join(app({'REQUEST_METHOD': 'GET', **environ}, start_response))
+    return captured['status'], captured['headers'], body
+
+def test_large_bodies_are_gzipped_chunk_by_chunk():
+    middleware = CompressionMiddleware(json_app(chunks=7))
+    status, headers, body = call(middleware, HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert status.startswith('200')
+    assert headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in headers
+    assert headers['Vary'] == 'Accept-Encoding' and headers['ETag'] == '"abc-gzip"'
+    assert gzip.decompress(body) == BODY
+    stats = middleware.stats()
+    assert stats['responses_compressed'] == 1 and stats['bytes_in'] == len(BODY) > stats['bytes_out']
+
+def test_deflate_is_used_when_preferred():
+    status, headers, body = call(CompressionMiddleware(json_app()), HTTP_ACCEPT_ENCODING='deflate, gzip;q=0.5')
+    assert headers['Content-Encoding'] == 'deflate' and zlib.decompress(body) == BODY
+
+def test_small_bodies_and_clients_without_gzip_are_left_alone():
+    middleware = CompressionMiddleware(json_app(body=b'{"ok": true}'))
+    status, headers, body = call(middleware, HTTP_ACCEPT_ENCODING='gzip')
+    assert 'Content-Encoding' not in headers and body == b'{"ok": true}'
+    assert middleware.stats()['responses_skipped'] == 1
+
+    status, headers, body = call(CompressionMiddleware(json_app()))
+    assert 'Content-Encoding' not in headers and body == BODY
+
+def test_min_size_is_the_threshold():
+    body = b'x' * 1024
+    compressed = call(CompressionMiddleware(json_app(body=body), min_size=1024), HTTP_ACCEPT_ENCODING='gzip')
+    skipped = call(CompressionMiddleware(json_app(body=body), min_size=1025), HTTP_ACCEPT_ENCODING='gzip')
+    assert compressed[1].get('Content-Encoding') == 'gzip'
+    assert 'Content-Encoding' not in skipped[1]
+
+def test_gzip_etag_revalidates_against_the_bare_tag():
+    middleware = CompressionMiddleware(json_app())
+    status, headers, _ = call(middleware, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='"abc-gzip"')
+    assert status.startswith('304')
+    # The 304 names the same representation the client holds
+    assert headers['ETag'] == '"abc-gzip"' and 'Content-Encoding' not in headers
+
+    status, _, _ = call(middleware, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='"other-gzip"')
+    assert status.startswith('200')
+
+def test_304_keeps_the_bare_tag_of_an_uncompressed_response():
+    status, headers, _ = call(CompressionMiddleware(json_app()), HTTP_ACCEPT_ENCODING='gzip',
+                              HTTP_IF_NONE_MATCH='"abc"')
+    assert status.startswith('304') and headers['ETag'] == '"abc"'
+
+def test_app_responses_revalidate_through_the_middleware(client):
+    first = client.get('/api/billing/rollup?grain=day', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    revalidated = client.get('/api/billing/rollup?grain=day',
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.headers['ETag'] == etag
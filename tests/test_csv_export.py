@@ -0,0 +1,38 @@
+import csv
+import io
+
+import billing
+import utils
+from conftest import make_patient, write_patients
+
+def export(client, query=''):
+    response = client.get(f'/download_report_data_csv{query}')
+    return response, list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+def test_export_filters_by_admission_date(client):
+    response, rows = export(client, '?from=2025-02-01&to=2025-02-28')
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=billing_report_')
+    assert rows[0][0] == 'Patient ID'
+    assert [row[0] for row in rows[1:]] == ['P002', 'P003']
+    assert rows[1][3:7] == ['500.00', '200.00', '300.00', 'Partially Paid']
+
+def test_export_filters_by_status(client):
+    _, rows = export(client, '?status=Discharged')
+    assert [row[0] for row in rows[1:]] == ['P003']
+    _, rows = export(client, '?payment_status=Unpaid')
+    assert [row[0] for row in rows[1:]] == ['P001', 'P004', 'P005']
+
+def test_export_rejects_bad_dates(client):
+    assert client.get('/download_report_data_csv?from=2025-13-01').status_code == 400
+    assert client.get('/download_report_data_csv?to=yesterday').status_code == 400
+
+def test_export_streams_in_chunks(client, monkeypatch):
+    write_patients(utils.CSV_FILE, [make_patient(f'P{i:04d}', f'Patient {i}') for i in range(25)])
+    monkeypatch.setattr(billing, 'CSV_EXPORT_CHUNK_ROWS', 10)
+    response = client.get('/download_report_data_csv')
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert len(chunks) == 3
+    rows = list(csv.reader(io.StringIO(''.join(c.decode() if isinstance(c, bytes) else c for c in chunks))))
+    assert len(rows) == 26
@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+from dataclasses import replace
+
+import utils
+from conftest import SAMPLE_PATIENTS, make_patient, write_patients
+
+def reset_process_state(monkeypatch):
+    """Forget the in-memory state, as a freshly started worker would"""
+    monkeypatch.setattr(utils, '_data_state', {'generation': 0, 'signature': None, 'aggregates': None,
+                                               'aging': None, 'rollup': None})
+    monkeypatch.setattr(utils, '_snapshot_cache', {'snapshot': None})
+
+def test_cold_start_computes_the_totals(data_dir):
+    stats = utils.calculate_dashboard_stats()
+    assert stats['total_patients'] == 5
+    assert stats['emergency_cases'] == 1
+    assert stats['total_billed'] == 4500.0
+    assert stats['total_paid'] == 1000.0
+    assert stats['total_outstanding'] == 3500.0
+    assert utils.get_data_generation() == 1
+
+def test_registration_updates_the_totals_without_a_rebuild(data_dir):
+    utils.calculate_dashboard_stats()
+    assert utils.save_patient_to_csv(make_patient('', 'Walk In', condition_severity='High', bill_amount=300.0,
+                                                  amount_paid=100.0, outstanding_amount=200.0,
+                                                  payment_status='Partially Paid'))
+    stats = utils.calculate_dashboard_stats()
+    assert (stats['total_patients'], stats['emergency_cases']) == (6, 2)
+    assert (stats['total_billed'], stats['total_paid']) == (4800.0, 1100.0)
+    assert utils.get_data_generation() == 2
+    assert utils.verify_dashboard_aggregates()['consistent']
+
+def test_persisted_state_is_resumed_by_another_worker(data_dir, monkeypatch):
+    utils.calculate_dashboard_stats()
+    utils.save_patient_to_csv(make_patient('', 'Walk In'))
+    generation = utils.get_data_generation()
+
+    reset_process_state(monkeypatch)
+    def no_rebuild():
+        raise AssertionError('rebuilt instead of resumed')
+    monkeypatch.setattr(utils, 'load_patients_from_csv', no_rebuild)
+    assert utils.get_data_generation() == generation
+    assert utils._current_data_state()['aggregates'].total_patients == 6
+
+def test_external_edit_starts_a_new_generation(data_dir):
+    utils.calculate_dashboard_stats()
+    write_patients(utils.CSV_FILE, SAMPLE_PATIENTS[:2])
+    assert utils.calculate_dashboard_stats()['total_patients'] == 2
+    assert utils.get_data_generation() == 2
+
+def test_same_size_rewrite_in_the_same_mtime_tick_is_detected(data_dir):
+    utils.calculate_dashboard_stats()
+    before = os.stat(utils.CSV_FILE)
+    # Same byte length, different amount, same mtime: only the inode tells the files apart
+    changed = [replace(p, amount_paid=700.0) if p.patient_id == 'P003' else p for p in SAMPLE_PATIENTS]
+    write_patients('replacement.csv', changed)
+    assert os.path.getsize('replacement.csv') == before.st_size
+    os.utime('replacement.csv', ns=(before.st_atime_ns, before.st_mtime_ns))
+    os.replace('replacement.csv', utils.CSV_FILE)
+
+    assert utils.calculate_dashboard_stats()['total_paid'] == sum(p.amount_paid for p in changed)
+
+def test_concurrent_state_writes_use_their_own_temp_files(data_dir, caplog):
+    utils.calculate_dashboard_stats()
+
+    def write():
+        for _ in range(50):
+            utils._write_state_file()
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+    assert utils._read_state_file()['generation'] == utils.get_data_generation()
+    assert set(os.listdir(data_dir)) == {utils.CSV_FILE, utils.STATE_FILE}
@@ -0,0 +1,101 @@
+import heapq
+import json
+import random
+
+import emergency_queue
+import utils
+from emergency_queue import EmergencyQueue
+from models import EmergencyCase
+
+def make_case(number: int, priority_level: int) -> EmergencyCase:
+    time_added = f"2025-03-01T{number // 3600 % 24:02d}:{number // 60 % 60:02d}:{number % 60:02d}"
+    return EmergencyCase(patient_id=f'E{number}', name=f'Case {number}', condition='Trauma', priority='High',
+                         priority_level=priority_level, priority_name='High', time_added=time_added,
+                         formatted_time=time_added)
+
+def test_pop_order_matches_a_reference_heap(tmp_path):
+    queue = EmergencyQueue(str(tmp_path / 'queue.journal'))
+    rng = random.Random(3)
+    reference = []
+    for number in range(200):
+        case = make_case(number, rng.randint(1, 4))
+        queue.push(case)
+        heapq.heappush(reference, (case.priority_level, case.time_added, case.patient_id))
+        if rng.random() < 0.3:
+            assert queue.pop().patient_id == heapq.heappop(reference)[2]
+
+    assert [case.patient_id for case in queue.cases()] == [entry[2] for entry in sorted(reference)]
+    assert len(queue) == len(reference)
+
+def test_instances_share_the_journal(tmp_path):
+    path = str(tmp_path / 'queue.journal')
+    first, second = EmergencyQueue(path), EmergencyQueue(path)
+    first.push(make_case(1, 2))
+    second.push(make_case(2, 1))
+    assert first.pop().patient_id == 'E2'
+    assert second.pop().patient_id == 'E1'
+    assert first.pop() is None and len(second) == 0
+
+def test_torn_tail_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / 'queue.journal'
+    queue = EmergencyQueue(str(path))
+    queue.push(make_case(1, 2))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "id": 9, "ca')
+
+    reader = EmergencyQueue(str(path))
+    assert [case.patient_id for case in reader.cases()] == ['E1']
+    reader.push(make_case(2, 1))
+    assert [case.patient_id for case in queue.cases()] == ['E2', 'E1']
+    assert [case.patient_id for case in EmergencyQueue(str(path)).cases()] == ['E2', 'E1']
+    # The writer's offset is the end of the file, so its next read starts cleanly
+    assert reader._offset == path.stat().st_size
+
+def test_compaction_keeps_live_cases_for_every_instance(tmp_path, monkeypatch):
+    monkeypatch.setattr(emergency_queue, 'COMPACT_MIN_DEAD_EVENTS', 10)
+    path = tmp_path / 'queue.journal'
+    queue, other = EmergencyQueue(str(path)), EmergencyQueue(str(path))
+    for number in range(30):
+        queue.push(make_case(number, number % 3 + 1))
+    other.cases()
+    expected = [case.patient_id for case in queue.cases()]
+    for _ in range(20):
+        queue.pop()
+
+    with open(path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    assert len(events) < 50 and all(event['op'] == 'add' for event in events[:10])
+    assert [case.patient_id for case in queue.cases()] == expected[20:]
+    assert [case.patient_id for case in other.cases()] == expected[20:]
+    other.push(make_case(99, 1))
+    assert queue.cases()[0].patient_id == 'E99'
+
+def test_seed_is_imported_once(tmp_path):
+    calls = []
+    def seed():
+        calls.append(1)
+        return [make_case(1, 3), make_case(2, 1)]
+
+    path = str(tmp_path / 'queue.journal')
+    queue = EmergencyQueue(path, seed=seed)
+    assert [case.patient_id for case in queue.cases()] == ['E2', 'E1']
+    assert [case.patient_id for case in EmergencyQueue(path, seed=seed).cases()] == ['E2', 'E1']
+    assert len(calls) == 1
+
+def test_imported_csv_is_retired_so_a_lost_journal_stays_empty(data_dir):
+    with open(utils.EMERGENCY_CSV_FILE, 'w', encoding='utf-8') as f:
+        f.write('patient_id,name,condition,priority,priority_level,time_added\n'
+                'E1,Case 1,Trauma,High,2,2025-03-01T09:00:00\n'
+                'E2,Case 2,Stroke,Emergency,1,2025-03-01T09:05:00\n')
+
+    def queue():
+        return EmergencyQueue(utils.EMERGENCY_JOURNAL_FILE, seed=utils._emergency_cases_from_csv,
+                              after_seed=utils._retire_emergency_csv)
+
+    assert queue().pop().patient_id == 'E2'
+    assert not (data_dir / utils.EMERGENCY_CSV_FILE).exists()
+    assert (data_dir / f'{utils.EMERGENCY_CSV_FILE}.imported').exists()
+
+    (data_dir / utils.EMERGENCY_JOURNAL_FILE).unlink()
+    lost = queue()
+    assert lost.cases() == [] and not lost.exists()
@@ -0,0 +1,94 @@
+import utils
+from conftest import SAMPLE_PATIENTS, make_patient
+from patient_index import PatientIndex
+
+def test_filter_mask_ands_facet_bitmaps():
+    index = PatientIndex(list(SAMPLE_PATIENTS))
+    mask = index.filter_mask({'locality': 'Bandra', 'payment_status': 'Unpaid'})
+    assert [p.patient_id for p in index.select(mask)] == ['P004']
+    assert index.select(index.filter_mask({'status': 'Discharged'}))[0].patient_id == 'P003'
+    assert index.filter_mask({'locality': 'Nowhere'}) == 0
+    assert index.select(index.filter_mask({})) == SAMPLE_PATIENTS
+
+def test_positions_and_mask_round_trip():
+    index = PatientIndex([make_patient(f'P{i}', f'Name {i}') for i in range(70)])
+    positions = [0, 7, 8, 15, 63, 64, 69]
+    mask = index.mask_from_positions(positions)
+    assert list(index.positions(mask)) == positions
+    assert list(index.positions(0)) == []
+
+def test_facet_counts_ignore_own_filter():
+    index = PatientIndex(list(SAMPLE_PATIENTS))
+    facets = index.facet_counts({'locality': 'Bandra', 'payment_status': '', 'condition_severity': '',
+                                 'status': ''})
+    # The locality facet still offers every locality; the others are narrowed to Bandra
+    assert facets['locality'] == [('Andheri', 3), ('Bandra', 2)]
+    assert facets['payment_status'] == [('Partially Paid', 1), ('Unpaid', 1)]
+
+def test_replace_moves_facet_bits_and_id_lookup_is_stable():
+    index = PatientIndex(list(SAMPLE_PATIENTS))
+    paid = make_patient('P004', 'Asha Menon', locality='Bandra', amount_paid=1000.0, outstanding_amount=0,
+                        payment_status='Fully Paid')
+    index.replace(3, paid)
+    assert 'P004' not in [p.patient_id for p in index.select(index.filter_mask({'payment_status': 'Unpaid'}))]
+    assert index.select(index.filter_mask({'payment_status': 'Fully Paid'}))[-1] is paid
+    assert index.get('P004') is paid
+    assert index.position_of('missing') is None
+
+def test_copy_is_isolated_from_the_original():
+    patients = list(SAMPLE_PATIENTS)
+    index = PatientIndex(patients)
+    index.suggest('as')
+    index.fuzzy_match('asha')
+    copy = index.copy()
+    copy.add(make_patient('P006', 'Asha Verma', locality='Bandra'))
+    copy.replace(0, make_patient('P001', 'Zoya Rao', payment_status='Fully Paid'))
+
+    assert len(index.patients) == 5 and patients is index.patients
+    assert index.get('P006') is None
+    assert index.patients[0].name == 'Asha Rao'
+    assert [p.patient_id for p, _ in index.suggest('asha')] == ['P004', 'P001']
+    assert {p.patient_id for p, _ in index.fuzzy_match('asha', 0)} == {'P001', 'P004'}
+    assert bin(index.filter_mask({'locality': 'Bandra'})).count('1') == 2
+
+    assert copy.get('P006').name == 'Asha Verma'
+    assert {p.patient_id for p, _ in copy.fuzzy_match('asha', 0)} == {'P004', 'P006'}
+    assert [p.patient_id for p, _ in copy.suggest('zoya')] == ['P001']
+    assert bin(copy.filter_mask({'locality': 'Bandra'})).count('1') == 3
+
+def test_copy_shares_the_append_only_structures():
+    index = PatientIndex(list(SAMPLE_PATIENTS))
+    index.suggest('as')
+    index.fuzzy_match('asha')
+    copy = index.copy()
+    copy.add(make_patient('P006', 'Asha Verma'))
+    copy.replace(1, make_patient('P002', 'Ravi Kumar', amount_paid=500.0, payment_status='Fully Paid'))
+    assert copy.id_positions is index.id_positions
+    assert copy._prefix is index._prefix and copy._names is index._names
+
+    # Only a rename copies the structures older indexes still read
+    copy.replace(1, make_patient('P002', 'Ravi Shankar'))
+    assert copy._prefix is not index._prefix and copy._names is not index._names
+    assert [p.name for p, _ in index.suggest('ravi')] == ['Ravi Kumar']
+    assert [p.name for p, _ in copy.suggest('ravi')] == ['Ravi Shankar']
+
+def test_writes_leave_snapshots_already_taken_unchanged(data_dir):
+    snapshot = utils.get_patient_snapshot()
+    index = utils.get_patient_index(snapshot)
+    index.suggest('asha')
+    aggregates = utils._data_state['aggregates']
+    totals = (aggregates.total_patients, aggregates.total_paid)
+
+    utils.append_patients_to_csv([make_patient('', 'Asha Late')])
+    assert utils.post_payments([('P001', 100.0, '')])[0][0] == 'applied'
+
+    assert len(snapshot.patients) == 5 and snapshot.patients[0].amount_paid == 0.0
+    assert index.get('P001').amount_paid == 0.0
+    assert len(index.suggest('asha')) == 2
+    assert (aggregates.total_patients, aggregates.total_paid) == totals
+
+    latest = utils.get_patient_snapshot()
+    assert latest.generation == snapshot.generation + 2
+    assert latest.index.get('P001').amount_paid == 100.0
+    assert len(latest.index.suggest('asha')) == 3
+    assert index.get(latest.patients[-1].patient_id) is None
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+import fragment_cache
+from bounded_cache import BoundedCache
+from fragment_cache import FragmentCacheExtension
+
+TEMPLATE = "{% cache 'rows', data_generation, as_of %}{{ render() }}{% endcache %}"
+
+@pytest.fixture
+def render(monkeypatch):
+    monkeypatch.setattr(fragment_cache, 'fragment_store', BoundedCache())
+    env = Environment(loader=DictLoader({'rows.html': TEMPLATE}), extensions=[FragmentCacheExtension])
+    template = env.get_template('rows.html')
+    calls = []
+
+    def render_with(generation, as_of='2025-03-01'):
+        def body():
+            calls.append(generation)
+            return f"rows at {generation}"
+        return template.render(render=body, data_generation=generation, as_of=as_of)
+
+    render_with.calls = calls
+    return render_with
+
+def test_fragment_is_reused_until_the_generation_changes(render):
+    assert render(1) == 'rows at 1'
+    assert render(1) == 'rows at 1'
+    assert render.calls == [1]
+    assert render(2) == 'rows at 2'
+    assert render.calls == [1, 2]
+
+def test_every_key_part_invalidates(render):
+    render(1, as_of='2025-03-01')
+    assert render(1, as_of='2025-03-02') == 'rows at 1'
+    assert len(render.calls) == 2
+
+def test_callable_parts_are_resolved_at_render_time(render):
+    generations = iter([5, 5, 6])
+    assert render(lambda: next(generations)) == render(lambda: next(generations))
+    render(lambda: next(generations))
+    assert len(render.calls) == 2
+
+def test_none_in_the_key_disables_caching(render):
+    render(None)
+    render(None)
+    assert render.calls == [None, None]
+
+def test_same_key_in_another_template_is_a_different_fragment(monkeypatch):
+    monkeypatch.setattr(fragment_cache, 'fragment_store', BoundedCache())
+    env = Environment(loader=DictLoader({'a.html': TEMPLATE, 'b.html': TEMPLATE}), extensions=[FragmentCacheExtension])
+    assert env.get_template('a.html').render(render=lambda: 'a', data_generation=1, as_of='') == 'a'
+    assert env.get_template('b.html').render(render=lambda: 'b', data_generation=1, as_of='') == 'b'
+
+def test_report_fragments_are_keyed_on_the_day():
+    env = Environment(extensions=[FragmentCacheExtension])
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates',
+                        'reports_dashboard.html')
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    for name in ('report_sections', 'report_charts'):
+        assert f"{{% cache '{name}', data_generation, as_of %}}" in source
+    env.parse(source)
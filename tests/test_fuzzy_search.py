@@ -0,0 +1,63 @@
+import random
+import string
+
+from conftest import SAMPLE_PATIENTS, make_patient
+from patient_index import NameBKTree, PatientIndex, distance_to, normalize_key
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def test_distance_to_matches_dynamic_programming():
+    rng = random.Random(7)
+    for _ in range(500):
+        a = ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 12)))
+        b = ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 12)))
+        assert distance_to(a)(b) == levenshtein(a, b), (a, b)
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(11)
+    words = [''.join(rng.choice(string.ascii_lowercase[:6]) for _ in range(rng.randint(2, 7))) for _ in range(60)]
+    patients = [make_patient(f'P{i}', f'{rng.choice(words)} {rng.choice(words)}') for i in range(300)]
+    tree = NameBKTree(patients)
+    for query in rng.sample(words, 20):
+        for max_distance in (0, 1, 2):
+            expected = {}
+            for position, patient in enumerate(patients):
+                distances = [levenshtein(query, part) for part in normalize_key(patient.name).split()]
+                if min(distances) <= max_distance:
+                    expected[position] = min(distances)
+            assert tree.search(query, max_distance) == expected
+
+def test_bk_tree_remove_keeps_routing_nodes():
+    patients = [make_patient('A', 'anna'), make_patient('B', 'anne'), make_patient('C', 'hanna')]
+    tree = NameBKTree(patients)
+    tree.remove(0, patients[0])
+    assert tree.search('anna', 1) == {1: 1, 2: 1}
+
+def test_bk_tree_search_limits_results_to_the_readers_rows():
+    patients = [make_patient('A', 'anna'), make_patient('B', 'anne')]
+    tree = NameBKTree(patients)
+    tree.add(2, make_patient('C', 'hanna'))
+    assert tree.search('anna', 1) == {0: 0, 1: 1, 2: 1}
+    assert tree.search('anna', 1, rows=2) == {0: 0, 1: 1}
+
+def test_fuzzy_match_ranks_by_distance_and_respects_mask():
+    index = PatientIndex(list(SAMPLE_PATIENTS))
+    assert [(p.patient_id, d) for p, d in index.fuzzy_match('asha', 1)] == [('P004', 0), ('P001', 0)]
+    assert [(p.patient_id, d) for p, d in index.fuzzy_match('asa rau', 2)] == [('P001', 2)]
+    bandra = index.filter_mask({'locality': 'Bandra'})
+    assert [p.patient_id for p, _ in index.fuzzy_match('asha', 1, mask=bandra)] == ['P004']
+
+def test_fuzzy_api_tolerates_typos_and_filters(client):
+    body = client.get('/api/patients/fuzzy?q=asah&max_distance=2').get_json()
+    assert [(r['patient_id'], r['distance']) for r in body['results']] == [('P004', 2), ('P001', 2)]
+    body = client.get('/api/patients/fuzzy?q=asha&locality=Bandra').get_json()
+    assert [r['patient_id'] for r in body['results']] == ['P004']
+    # max_distance is clamped to 3
+    assert client.get('/api/patients/fuzzy?q=x&max_distance=9').get_json()['max_distance'] == 3
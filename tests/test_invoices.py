@@ -0,0 +1,97 @@
+import fcntl
+import io
+import json
+import os
+import time
+import zipfile
+
+import pytest
+
+import invoices
+from conftest import SAMPLE_PATIENTS
+from invoices import invoice_fields, invoice_job_status, running_invoice_job, start_invoice_job, write_invoice_zip
+
+OWING = [p for p in SAMPLE_PATIENTS if p.outstanding_amount > 0]
+
+@pytest.fixture
+def job_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'jobs'
+    monkeypatch.setattr(invoices, 'INVOICE_JOB_DIR', str(directory))
+    monkeypatch.setattr(invoices, 'INVOICE_JOB_LOCK', str(directory / 'running.lock'))
+    return directory
+
+def wait_for(job_id: str) -> dict:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status = invoice_job_status(job_id)
+        if status['status'] != 'running':
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'invoice job {job_id} is still running')
+
+def write_running_job(job_dir, job_id: str) -> None:
+    os.makedirs(job_dir, exist_ok=True)
+    with open(job_dir / f'{job_id}.json', 'w', encoding='utf-8') as f:
+        json.dump({'id': job_id, 'period': '2025-04', 'status': 'running', 'total': 4, 'done': 1,
+                   'error': None, 'started_at': '2025-04-30T10:00:00', 'finished_at': None}, f)
+
+def test_zip_holds_one_pdf_per_invoice():
+    progress = []
+    output = io.BytesIO()
+    written = write_invoice_zip([invoice_fields(p) for p in OWING], output, '2025-04', 1, progress.append)
+    assert written == 4 and progress[-1] == 4
+    with zipfile.ZipFile(output) as archive:
+        assert sorted(archive.namelist()) == [f'invoice_2025-04_{p.patient_id}.pdf' for p in OWING]
+        assert all(archive.read(name).startswith(b'%PDF') for name in archive.namelist())
+
+def test_job_runs_to_done_and_releases_the_lock(job_dir):
+    job = start_invoice_job(OWING, '2025-04', workers=1)
+    assert job['status'] == 'running' and job['total'] == 4
+    status = wait_for(job['id'])
+    assert (status['status'], status['done'], status['percent']) == ('done', 4, 100.0)
+    assert status['finished_at'] is not None
+    with zipfile.ZipFile(invoices.invoice_job_file(job['id'])) as archive:
+        assert len(archive.namelist()) == 4
+    assert running_invoice_job() is None
+    assert invoice_job_status('../etc') is None and invoice_job_status('missing') is None
+
+# SystemExit still ends the thread once the status is saved, which pytest reports
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+@pytest.mark.parametrize('error', [RuntimeError('disk full'), SystemExit(1)])
+def test_a_failing_job_leaves_a_terminal_status(job_dir, monkeypatch, error):
+    def fail(*args):
+        raise error
+    monkeypatch.setattr(invoices, 'write_invoice_zip', fail)
+    job = start_invoice_job(OWING, '2025-04')
+    status = wait_for(job['id'])
+    assert status['status'] == 'failed' and status['error'] in ('disk full', 'Interrupted')
+    assert invoices.invoice_job_file(job['id']) is None
+    # The lock was released, so the next job can start
+    assert start_invoice_job([], '2025-04') is not None
+
+def test_a_running_job_without_a_lock_holder_is_reported_failed(job_dir):
+    write_running_job(job_dir, 'lost1')
+    status = invoice_job_status('lost1')
+    assert status['status'] == 'failed' and 'exited' in status['error']
+
+    # While the lock is held under its ID the job is still running
+    with open(job_dir / 'running.lock', 'w', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        lock_file.write('lost1')
+        lock_file.flush()
+        assert invoice_job_status('lost1')['status'] == 'running'
+        assert running_invoice_job()['id'] == 'lost1'
+        assert start_invoice_job(OWING, '2025-04') is None
+    assert running_invoice_job() is None
+
+def test_batch_api_answers_409_while_a_job_runs(client, job_dir):
+    write_running_job(job_dir, 'busy1')
+    with open(job_dir / 'running.lock', 'w', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        lock_file.write('busy1')
+        lock_file.flush()
+        response = client.post('/api/invoices/batch', json={'period': '2025-04'})
+        assert response.status_code == 409 and response.get_json()['job']['id'] == 'busy1'
+        assert client.get('/api/invoices/batch/busy1/download').status_code == 409
+    assert client.post('/api/invoices/batch', json={'period': 'April'}).status_code == 400
+    assert client.get('/api/invoices/batch/nope').status_code == 404
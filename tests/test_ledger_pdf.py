@@ -0,0 +1,21 @@
+import billing
+from test_billing_pdf import pdf_text
+
+def test_ledger_pdf_lists_the_filtered_patients(client):
+    response = client.get('/download_ledger_pdf?from=2025-02-01&to=2025-03-31')
+    assert response.status_code == 200 and response.mimetype == 'application/pdf'
+    assert response.headers['X-Page-Count'] == '1'
+    data = response.get_data()
+    assert int(response.headers['Content-Length']) == len(data)
+    text = pdf_text(data)
+    assert 'P002' in text and 'P003' in text and 'P004' in text
+    assert 'P001' not in text and 'P005' not in text
+    assert '3 patients' in text
+
+def test_ledger_pdf_rejects_bad_dates(client):
+    assert client.get('/download_ledger_pdf?to=yesterday').status_code == 400
+
+def test_ledger_pdf_refuses_more_rows_than_the_cap(client, monkeypatch):
+    monkeypatch.setattr(billing, 'MAX_LEDGER_ROWS', 4)
+    assert client.get('/download_ledger_pdf').status_code == 400
+    assert client.get('/download_ledger_pdf?status=Active').status_code == 200
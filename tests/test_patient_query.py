@@ -0,0 +1,104 @@
+import json
+import random
+
+import pytest
+
+import utils
+from conftest import SAMPLE_PATIENTS, make_patient, write_patients
+from patient_index import PatientIndex
+
+def all_pages(limit, filters=None, **kwargs):
+    pages, cursor = [], ''
+    while True:
+        page, cursor = utils.query_patients(filters or {}, limit=limit, cursor=cursor, **kwargs)
+        pages.append([p.patient_id for p in page])
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_cursor_pages_cover_every_row_once(data_dir, descending):
+    pages = all_pages(2, sort_field='bill_amount', descending=descending)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    ordered = sorted(SAMPLE_PATIENTS, key=lambda p: (p.bill_amount, SAMPLE_PATIENTS.index(p)),
+                     reverse=descending)
+    assert sum(pages, []) == [p.patient_id for p in ordered]
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_unsorted_pages_follow_file_order(data_dir, descending):
+    pages = all_pages(2, descending=descending)
+    ids = [p.patient_id for p in SAMPLE_PATIENTS]
+    assert sum(pages, []) == (ids[::-1] if descending else ids)
+    assert all_pages(5, descending=descending) == [ids[::-1] if descending else ids]
+
+def test_pages_match_a_full_sort_for_random_filters(data_dir):
+    rng = random.Random(5)
+    patients = [make_patient(f'R{i:03d}', f'Name {i}', bill_amount=float(rng.choice([100, 200, 300])),
+                             locality=rng.choice(['Andheri', 'Bandra']),
+                             admission_date=f'2025-0{rng.randint(1, 6)}-1{rng.randint(0, 9)}')
+                for i in range(120)]
+    write_patients(utils.CSV_FILE, patients)
+    for sort_field in (None, 'bill_amount', 'admission_date', 'name'):
+        for descending in (False, True):
+            for filters, admitted_from in (({}, ''), ({'locality': 'Bandra'}, '2025-03-01')):
+                expected = [(utils._sort_key(p, sort_field), i) for i, p in enumerate(patients)
+                            if (not filters or p.locality == 'Bandra') and p.admission_date >= admitted_from]
+                expected = [patients[i].patient_id for _, i in sorted(expected, reverse=descending)]
+                pages = all_pages(7, filters, admitted_from=admitted_from, sort_field=sort_field,
+                                  descending=descending)
+                assert sum(pages, []) == expected, (sort_field, descending, filters)
+
+def test_sort_order_is_built_once_per_generation(data_dir):
+    utils.query_patients({}, sort_field='bill_amount', limit=2)
+    index = utils.get_patient_index()
+    order = index._sort_orders['bill_amount']
+    _, cursor = utils.query_patients({}, sort_field='bill_amount', limit=2)
+    utils.query_patients({}, sort_field='bill_amount', limit=2, cursor=cursor)
+    assert index._sort_orders['bill_amount'] is order
+
+    utils.save_patient_to_csv(make_patient('', 'New Row'))
+    assert 'bill_amount' not in utils.get_patient_index()._sort_orders
+
+def test_reverse_positions():
+    index = PatientIndex([make_patient(f'P{i}', 'x') for i in range(20)])
+    mask = index.mask_from_positions([0, 3, 8, 9, 17])
+    assert list(index.positions(mask, reverse=True)) == [17, 9, 8, 3, 0]
+
+def test_cursor_pages_survive_registrations_between_requests(data_dir):
+    first, cursor = utils.query_patients({}, sort_field='bill_amount', limit=2)
+    utils.append_patients_to_csv([make_patient('', 'Cheap Bill', bill_amount=100.0, outstanding_amount=100.0),
+                                  make_patient('', 'Big Bill', bill_amount=5000.0, outstanding_amount=5000.0)])
+    rest = []
+    while cursor:
+        page, cursor = utils.query_patients({}, sort_field='bill_amount', limit=2, cursor=cursor)
+        rest.extend(p.name for p in page)
+    seen = [p.name for p in first] + rest
+    # Rows sorting before the cursor are not revisited; none is repeated or skipped
+    assert seen == ['Ravi Kumar', 'Meera Nair', 'Asha Rao', 'Asha Menon', 'Kiran Rao', 'Big Bill']
+
+def test_query_filters_dates_and_rejects_foreign_cursors(data_dir):
+    page, cursor = utils.query_patients({'locality': 'Bandra'}, admitted_from='2025-03-01', limit=10)
+    assert [p.patient_id for p in page] == ['P004'] and cursor is None
+    _, cursor = utils.query_patients({}, sort_field='name', limit=1)
+    with pytest.raises(ValueError):
+        utils.query_patients({}, sort_field='bill_amount', limit=1, cursor=cursor)
+    with pytest.raises(ValueError):
+        utils.query_patients({}, limit=1, cursor=cursor)
+    with pytest.raises(ValueError):
+        utils.decode_query_cursor('not-a-cursor')
+
+def test_query_api_pages_with_the_cursor_header(client):
+    ids, cursor = [], ''
+    while True:
+        response = client.get('/api/patients/query', query_string={
+            'sort': '-bill_amount', 'limit': 2, 'fields': 'patient_id,bill_amount', 'cursor': cursor})
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert all(set(row) == {'patient_id', 'bill_amount'} for row in rows)
+        ids.extend(row['patient_id'] for row in rows)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    # Descending is the exact reverse of ascending, ties included
+    assert ids == ['P005', 'P004', 'P001', 'P003', 'P002']
+    assert client.get('/api/patients/query', query_string={'cursor': 'garbage'}).status_code == 400
+    assert client.get('/api/patients/query', query_string={'fields': 'nope'}).status_code == 400
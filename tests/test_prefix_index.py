@@ -0,0 +1,38 @@
+from conftest import SAMPLE_PATIENTS, make_patient
+from patient_index import PrefixIndex, normalize_key
+
+def test_prefix_index_matches_ids_names_and_name_parts():
+    prefix = PrefixIndex(list(SAMPLE_PATIENTS))
+    assert prefix.search('p00', 10) == [(0, 'patient_id'), (1, 'patient_id'), (2, 'patient_id'),
+                                        (3, 'patient_id'), (4, 'patient_id')]
+    assert prefix.search('RAO', 10) == [(0, 'name'), (4, 'name')]
+    assert prefix.search('asha', 1) == [(3, 'name')]
+    assert prefix.search('  ', 10) == []
+
+def test_prefix_index_limits_results_to_the_readers_rows():
+    patients = list(SAMPLE_PATIENTS)
+    prefix = PrefixIndex(patients)
+    prefix.add(5, make_patient('P006', 'Asha Verma'))
+    assert prefix.search('asha', 10) == [(3, 'name'), (0, 'name'), (5, 'name')]
+    assert prefix.search('asha', 10, rows=5) == [(3, 'name'), (0, 'name')]
+
+def test_prefix_index_replace_drops_old_keys():
+    patients = list(SAMPLE_PATIENTS)
+    prefix = PrefixIndex(patients)
+    prefix.replace(1, patients[1], make_patient('P002', 'Ravi Shankar'))
+    assert prefix.search('kumar', 10) == []
+    assert prefix.search('shan', 10) == [(1, 'name')]
+
+def test_normalize_key_folds_case_and_accents():
+    assert normalize_key('  José   ÁLVAREZ ') == 'jose alvarez'
+
+def test_suggest_api_sees_new_registrations(client):
+    import utils
+
+    body = client.get('/api/patients/suggest?q=asha').get_json()
+    assert [(r['patient_id'], r['matched']) for r in body['results']] == [('P004', 'name'), ('P001', 'name')]
+    utils.save_patient_to_csv(make_patient('', 'Ashani Das'))
+    names = [r['name'] for r in client.get('/api/patients/suggest?q=asha&limit=2').get_json()['results']]
+    assert names == ['Asha Menon', 'Asha Rao']
+    assert client.get('/api/patients/suggest?q=ashan').get_json()['results'][0]['name'] == 'Ashani Das'
+    assert client.get('/api/patients/suggest?q=').get_json()['results'] == []
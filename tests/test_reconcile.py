@@ -0,0 +1,76 @@
+import csv
+import os
+import threading
+
+import utils
+from conftest import SAMPLE_PATIENTS, make_patient, write_patients
+from reconcile import CHECKS, reconcile
+
+def broken_patients():
+    return SAMPLE_PATIENTS + [
+        # Outstanding and status disagree with the amounts
+        make_patient('P006', 'Wrong Outstanding', bill_amount=900.0, amount_paid=400.0, outstanding_amount=900.0,
+                     payment_status='Unpaid'),
+        make_patient('P007', 'Negative Bill', bill_amount=-10.0, outstanding_amount=0, payment_status='Fully Paid'),
+        make_patient('P001', 'Duplicate Id'),
+    ]
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def test_reconcile_reports_every_check(data_dir):
+    write_patients(utils.CSV_FILE, broken_patients())
+    report = reconcile(utils.CSV_FILE)
+    assert report['rows'] == 8
+    assert list(report['counts']) == list(CHECKS)
+    assert report['counts'] == {'invalid_amount': 0, 'negative_amount': 1, 'outstanding_mismatch': 1,
+                                'status_mismatch': 1, 'duplicate_id': 2}
+    assert report['samples']['outstanding_mismatch'] == [
+        {'line': 7, 'patient_id': 'P006', 'stored': '900.0', 'expected': 500.0}]
+    assert report['corrected'] == 0 and report['output'] is None
+
+def test_reconcile_flags_unparseable_amounts(data_dir):
+    write_patients(utils.CSV_FILE, SAMPLE_PATIENTS + [make_patient('P006', 'Bad Amount', bill_amount='abc')])
+    report = reconcile(utils.CSV_FILE)
+    assert report['counts']['invalid_amount'] == 1
+    assert report['counts']['outstanding_mismatch'] == 0
+
+def test_reconcile_fixes_in_place_and_keeps_other_columns(data_dir):
+    write_patients(utils.CSV_FILE, broken_patients())
+    os.chmod(utils.CSV_FILE, 0o640)
+    before = read_rows(utils.CSV_FILE)
+
+    report = reconcile(utils.CSV_FILE, output=utils.CSV_FILE)
+    assert report['corrected'] == 1
+    after = read_rows(utils.CSV_FILE)
+    assert after[5]['outstanding_amount'] == '500.0' and after[5]['payment_status'] == 'Partially Paid'
+    # Rows needing a person's decision are reported but left as they were
+    assert after[6] == before[6] and after[7] == before[7]
+    assert [row for i, row in enumerate(after) if i != 5] == [row for i, row in enumerate(before) if i != 5]
+    assert oct(os.stat(utils.CSV_FILE).st_mode & 0o777) == oct(0o640)
+
+    again = reconcile(utils.CSV_FILE)
+    assert again['counts']['outstanding_mismatch'] == 0 and again['counts']['status_mismatch'] == 0
+
+def test_reconcile_writes_a_separate_output(data_dir):
+    write_patients(utils.CSV_FILE, broken_patients())
+    before = read_rows(utils.CSV_FILE)
+    report = reconcile(utils.CSV_FILE, output='fixed.csv')
+    assert report['corrected'] == 1 and report['output'] == 'fixed.csv'
+    assert read_rows(utils.CSV_FILE) == before
+    assert read_rows('fixed.csv')[5]['payment_status'] == 'Partially Paid'
+
+def test_reconcile_in_place_waits_for_the_appenders_lock(data_dir):
+    write_patients(utils.CSV_FILE, broken_patients())
+    reports = []
+    with utils.locked_patient_csv() as f:
+        worker = threading.Thread(target=lambda: reports.append(reconcile(utils.CSV_FILE, output=utils.CSV_FILE)))
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive()
+        # A registration appended under the lock is read, not overwritten
+        csv.writer(f).writerow(utils.patient_to_row(make_patient('P008', 'Late Arrival')))
+    worker.join()
+    assert reports[0]['rows'] == 9
+    assert read_rows(utils.CSV_FILE)[-1]['patient_id'] == 'P008'
@@ -0,0 +1,44 @@
+import billing
+import utils
+from conftest import make_patient
+
+def counting_rollup(monkeypatch):
+    calls = []
+    original = billing.get_revenue_rollup
+
+    def get_revenue_rollup():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(billing, 'get_revenue_rollup', get_revenue_rollup)
+    return calls
+
+def test_matching_etag_answers_304_without_running_the_view(client, monkeypatch):
+    calls = counting_rollup(monkeypatch)
+    first = client.get('/api/billing/rollup')
+    assert first.status_code == 200 and len(calls) == 1
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    revalidated = client.get('/api/billing/rollup', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.headers['ETag'] == etag
+    assert revalidated.get_data() == b''
+    assert len(calls) == 1
+
+def test_repeat_requests_are_served_from_the_cache(client, monkeypatch):
+    calls = counting_rollup(monkeypatch)
+    first = client.get('/api/billing/rollup?grain=day')
+    second = client.get('/api/billing/rollup?grain=day')
+    assert second.get_data() == first.get_data() and len(calls) == 1
+    # Different arguments are a different entry
+    client.get('/api/billing/rollup?grain=month')
+    assert len(calls) == 2
+
+def test_a_write_changes_the_etag(client, monkeypatch):
+    calls = counting_rollup(monkeypatch)
+    etag = client.get('/api/billing/rollup').headers['ETag']
+    utils.save_patient_to_csv(make_patient('', 'Walk In'))
+
+    response = client.get('/api/billing/rollup', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert len(calls) == 2
@@ -0,0 +1,70 @@
+from datetime import date
+
+import pytest
+
+import utils
+from conftest import SAMPLE_PATIENTS, make_patient
+from ml_insights import _linear_next, _monthly_history, generate_financial_forecast
+from models import RevenueRollup
+
+def test_series_by_month_and_day_with_breakdowns():
+    rollup = RevenueRollup.from_patients(SAMPLE_PATIENTS)
+    assert [(row['period'], row['billed'], row['paid'], row['patients']) for row in rollup.series()] == [
+        ('2025-01', 1000.0, 0.0, 1), ('2025-02', 1300.0, 1000.0, 2), ('2025-03', 1000.0, 0.0, 1),
+        ('2025-04', 1200.0, 0.0, 1)]
+    february = rollup.series('month', 'payment_status', start='2025-02', end='2025-02')
+    assert [(row['payment_status'], row['outstanding']) for row in february] == [
+        ('Fully Paid', 0.0), ('Partially Paid', 300.0)]
+    assert [row['period'] for row in rollup.series('day', start='2025-02-15', end='2025-03-31')] == [
+        '2025-02-20', '2025-03-15']
+
+def test_incremental_updates_match_a_rebuild():
+    rollup = RevenueRollup.from_patients(SAMPLE_PATIENTS[:4])
+    rollup.add_patient(SAMPLE_PATIENTS[4])
+    previous = SAMPLE_PATIENTS[1]
+    paid = make_patient('P002', 'Ravi Kumar', locality='Bandra', bill_amount=500.0, amount_paid=500.0,
+                        outstanding_amount=0, payment_status='Fully Paid', admission_date='2025-02-11')
+    rollup.replace_patient(previous, paid)
+
+    rebuilt = RevenueRollup.from_patients([SAMPLE_PATIENTS[0], paid, *SAMPLE_PATIENTS[2:]])
+    assert rollup.daily == rebuilt.daily and rollup.monthly == rebuilt.monthly
+    assert '2025-02-11|Partially Paid|No' not in rollup.daily
+
+def test_monthly_history_fills_gaps_and_leaves_out_the_current_month():
+    this_month = date.today().isoformat()
+    rollup = RevenueRollup.from_patients([
+        make_patient('P1', 'A', admission_date='2024-11-10', amount_paid=100.0),
+        make_patient('P2', 'B', admission_date='2025-02-03', amount_paid=400.0),
+        make_patient('P3', 'C', admission_date=this_month, amount_paid=9000.0),
+    ])
+    history = _monthly_history(rollup)
+    assert [row['period'] for row in history] == ['2024-11', '2024-12', '2025-01', '2025-02']
+    assert [row['paid'] for row in history] == [100.0, 0.0, 0.0, 400.0]
+    assert [row['period'] for row in _monthly_history(rollup, months=2)] == ['2025-01', '2025-02']
+    assert _monthly_history(RevenueRollup()) == []
+
+def test_forecast_extends_the_monthly_trend():
+    assert _linear_next([]) == 0.0 and _linear_next([5.0]) == 5.0
+    assert _linear_next([100.0, 200.0, 300.0]) == pytest.approx(400.0)
+    assert _linear_next([300.0, 100.0]) == 0.0
+
+    rollup = RevenueRollup.from_patients([
+        make_patient(f'P{month}', 'A', admission_date=f'2025-0{month}-10', bill_amount=1000.0 * month,
+                     amount_paid=100.0 * month) for month in (1, 2, 3)])
+    forecast = generate_financial_forecast(rollup)
+    assert forecast['months'] == 3
+    assert forecast['revenue_forecast'] == pytest.approx(400.0)
+    assert forecast['billed_forecast'] == pytest.approx(4000.0)
+    assert forecast['expense_forecast'] + forecast['profit_forecast'] == pytest.approx(400.0)
+
+def test_rollup_api(client):
+    body = client.get('/api/billing/rollup?by=insurance_coverage&from=2025-02&to=2025-03').get_json()
+    assert body['grain'] == 'month' and body['by'] == 'insurance_coverage'
+    assert [(row['period'], row['insurance_coverage'], row['billed']) for row in body['series']] == [
+        ('2025-02', 'No', 1300.0), ('2025-03', 'No', 1000.0)]
+    assert client.get('/api/billing/rollup?grain=week').status_code == 400
+    assert client.get('/api/billing/rollup?by=locality').status_code == 400
+
+    assert utils.post_payments([('P001', 250.0, '')])[0][0] == 'applied'
+    january = client.get('/api/billing/rollup?from=2025-01&to=2025-01').get_json()['series']
+    assert january == [{'period': '2025-01', 'billed': 1000.0, 'paid': 250.0, 'outstanding': 750.0, 'patients': 1}]
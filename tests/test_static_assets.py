@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+from flask import Flask, url_for
+
+from static_assets import IMMUTABLE_CACHE_CONTROL, StaticAssets
+
+CSS = b'body { color: #333; }\n' * 100
+
+@pytest.fixture
+def static_app(tmp_path):
+    (tmp_path / 'site.css').write_bytes(CSS)
+    (tmp_path / 'tiny.js').write_bytes(b'let a = 1;\n')
+    app = Flask('static_test', static_folder=str(tmp_path), static_url_path='/static')
+    app.extensions['static_assets'] = StaticAssets(app)
+    return app
+
+def test_urls_carry_the_content_hash(static_app):
+    with static_app.test_request_context():
+        assert url_for('static', filename='site.css') == f"/static/site.css?v={hashlib.sha1(CSS).hexdigest()[:12]}"
+        assert url_for('static', filename='missing.css') == '/static/missing.css'
+
+def test_fingerprinted_urls_are_immutable_and_gzipped(static_app):
+    with static_app.test_request_context():
+        url = url_for('static', filename='site.css')
+    response = static_app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == CSS
+
+    plain = static_app.test_client().get(url)
+    assert plain.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert 'Content-Encoding' not in plain.headers and plain.get_data() == CSS
+    plain.close()
+
+def test_small_files_are_immutable_but_not_gzipped(static_app):
+    with static_app.test_request_context():
+        url = url_for('static', filename='tiny.js')
+    response = static_app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert 'Content-Encoding' not in response.headers
+    response.close()
+
+def test_stale_or_missing_versions_revalidate(static_app):
+    client = static_app.test_client()
+    for url in ('/static/site.css', '/static/site.css?v=0123456789ab'):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'immutable' not in response.headers.get('Cache-Control', '')
+        response.close()
+
+def test_changed_file_gets_a_new_fingerprint(static_app, tmp_path):
+    assets = static_app.extensions['static_assets']
+    before = assets.fingerprint('site.css')
+    (tmp_path / 'site.css').write_bytes(CSS + b'a { color: red; }\n')
+    os.utime(tmp_path / 'site.css', ns=(1, 1))
+    assert assets.fingerprint('site.css') not in (None, before)
+
+def test_gzipped_etag_revalidates(static_app):
+    with static_app.test_request_context():
+        url = url_for('static', filename='site.css')
+    client = static_app.test_client()
+    etag = client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    response = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import warmup
+
+@pytest.fixture
+def fresh_status(monkeypatch):
+    monkeypatch.setattr(warmup, '_status', {'status': 'not_started', 'started_at': None, 'finished_at': None,
+                                            'total_ms': None, 'steps': []})
+
+def test_not_started_worker_is_ready(client, fresh_status):
+    response = client.get('/api/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'not_started'
+    assert response.headers['Cache-Control'] == 'no-store'
+
+def test_readiness_is_503_while_warming_up(client, fresh_status, monkeypatch):
+    release = threading.Event()
+
+    def slow_step(app, results):
+        release.wait(5)
+        return 'warmed'
+
+    monkeypatch.setattr(warmup, 'WARMUP_STEPS', [('slow', slow_step)])
+    thread = warmup.warm_up(None, background=True)
+    try:
+        assert client.get('/api/ready').status_code == 503
+        assert warmup.warm_up(None, background=True) is None
+    finally:
+        release.set()
+        thread.join()
+
+    body = client.get('/api/ready').get_json()
+    assert body['ready'] and body['status'] == 'ready'
+    assert body['steps'] == [{'name': 'slow', 'status': 'done', 'duration_ms': body['steps'][0]['duration_ms'],
+                              'detail': 'warmed'}]
+
+def test_failed_data_step_stops_and_degrades(fresh_status, monkeypatch):
+    ran = []
+
+    def broken(app, results):
+        raise OSError('no csv')
+
+    monkeypatch.setattr(warmup, 'WARMUP_STEPS', [('patient_data', broken),
+                                                 ('patient_index', lambda app, results: ran.append(1))])
+    warmup.warm_up(None)
+    status = warmup.warmup_status()
+    assert status['status'] == 'degraded' and status['ready']
+    assert [(step['name'], step['status'], step['detail']) for step in status['steps']] == [
+        ('patient_data', 'failed', 'no csv')]
+    assert not ran
+
+def test_data_and_index_steps_warm_the_snapshot(client, fresh_status, monkeypatch):
+    import utils
+    from app import app
+
+    monkeypatch.setattr(warmup, 'WARMUP_STEPS', warmup.WARMUP_STEPS[:2])
+    warmup.warm_up(app)
+    assert warmup.warmup_status()['status'] == 'ready'
+    snapshot = utils._snapshot_cache['snapshot']
+    assert snapshot is not None and snapshot.index is not None and len(snapshot.index.patients) == 5
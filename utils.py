@@ -1,16 +1,58 @@
-import pandas as pd
+import base64
+import bisect
 import csv
+import fcntl
+import io
+import itertools
 import os
+import json
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from models import Patient, EmergencyCase
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, fields, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from flask import g, has_app_context
+from models import Patient, EmergencyCase, DashboardAggregates, PatientSnapshot, AgingSummary, RevenueRollup
+from patient_index import PatientIndex
+from emergency_queue import EmergencyQueue
+from payment_references import PaymentReferenceJournal
 
 # CSV file path
 CSV_FILE = 'patient_records_with_timestamp.csv'
 
+# Aggregate state persisted alongside the CSV, tagged with the data generation
+STATE_FILE = 'patient_records_state.json'
+
+# Emergency queue journal, seeded once from the old CSV queue
+EMERGENCY_JOURNAL_FILE = 'emergency_queue.journal'
+EMERGENCY_CSV_FILE = 'emergency_cases.csv'
+
+PATIENT_CSV_HEADER = [
+    'patient_id', 'name', 'age', 'gender', 'locality',
+    'condition_severity', 'priority_level', 'medical_history',
+    'bill_amount', 'amount_paid', 'outstanding_amount',
+    'payment_status', 'insurance_coverage', 'insurance_details',
+    'admission_date', 'discharge_date', 'timestamp'
+]
+
+# References of the remittance payments already applied, so a resubmitted batch is not applied twice
+PAYMENT_REFERENCES_FILE = 'payment_references.journal'
+payment_references = PaymentReferenceJournal(PAYMENT_REFERENCES_FILE)
+
+_state_lock = threading.RLock()
+_data_state = {'generation': 0, 'signature': None, 'aggregates': None, 'aging': None, 'rollup': None}
+
+# Latest patient snapshot, reused by every request until the generation changes
+_snapshot_cache = {'snapshot': None}
+
 def load_patients_from_csv() -> List[Patient]:
     """Load all patients from CSV file with proper comma delimiter handling"""
+    # Imported here so app start-up does not pay for pandas
+    import pandas as pd
+    
     patients = []
     
     if not os.path.exists(CSV_FILE):
@@ -59,46 +101,119 @@ def load_patients_from_csv() -> List[Patient]:
 
 def save_patient_to_csv(patient: Patient) -> bool:
     """Save a single patient to CSV file"""
+    return append_patients_to_csv([patient])
+
+@contextmanager
+def locked_patient_csv(path: Optional[str] = None) -> Iterator[Any]:
+    """Exclusive lock on a patient CSV (CSV_FILE by default), shared by appends, rewrites and reconciliation.
+
+    Yields the locked file opened for appending.
+    """
+    path = path or CSV_FILE
+    while True:
+        f = open(path, 'a', newline='', encoding='utf-8')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # The file was replaced (e.g. by a rewrite) while we waited: lock the new one
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except BaseException:
+            f.close()
+            raise
+        f.close()
     try:
-        # Check if file exists and has data
-        file_exists = os.path.exists(CSV_FILE)
-        has_data = False
-        
-        if file_exists:
-            with open(CSV_FILE, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                has_data = sum(1 for _ in reader) > 1  # More than just header
-        
-        # Write header if file is new or empty
-        with open(CSV_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
+        yield f
+    finally:
+        # Closing the file releases the lock
+        f.close()
+
+def append_patients_to_csv(patients: List[Patient]) -> bool:
+    """Append patients to the CSV in one buffered write under an exclusive file lock.
+
+    Patients without a patient_id are given one here, under the lock, so no
+    concurrent registration (in any process) can be handed the same ID.
+    """
+    try:
+        with locked_patient_csv() as f:
+            base_signature = begin_write()
+            unassigned = [patient for patient in patients if not patient.patient_id]
+            if unassigned:
+                # The snapshot is synced with the locked file, so its IDs are exactly the file's
+                taken = get_patient_index(_load_patient_snapshot()).id_positions
+                for patient, patient_id in zip(unassigned, generate_patient_ids(len(unassigned), taken)):
+                    patient.patient_id = patient_id
             
-            if not file_exists or not has_data:
-                # Write header
-                writer.writerow([
-                    'patient_id', 'name', 'age', 'gender', 'locality',
-                    'condition_severity', 'priority_level', 'medical_history',
-                    'bill_amount', 'amount_paid', 'outstanding_amount',
-                    'payment_status', 'insurance_coverage', 'insurance_details',
-                    'admission_date', 'discharge_date', 'timestamp'
-                ])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # Write the header if the file is new or empty
+            if os.fstat(f.fileno()).st_size == 0:
+                writer.writerow(PATIENT_CSV_HEADER)
+            writer.writerows(patient_to_row(patient) for patient in patients)
+            f.write(buffer.getvalue())
+            f.flush()
             
-            # Write patient data
-            writer.writerow([
-                patient.patient_id, patient.name, patient.age, patient.gender,
-                patient.locality, patient.condition_severity, patient.priority_level,
-                patient.medical_history, patient.bill_amount, patient.amount_paid,
-                patient.outstanding_amount, patient.payment_status,
-                patient.insurance_coverage, patient.insurance_details,
-                patient.admission_date, patient.discharge_date or '',
-                patient.timestamp or datetime.now().isoformat()
-            ])
-        
+            # Still under the lock, so the recorded signature covers exactly these rows
+            record_registrations(patients, base_signature)
         return True
     except Exception as e:
-        logging.error(f"Error saving patient to CSV: {e}")
+        logging.error(f"Error saving patients to CSV: {e}")
         return False
 
+def _write_patients_csv(patients: List[Patient]) -> None:
+    """Replace the patient CSV with these rows: write a temp file, fsync it, rename it into place.
+
+    The caller holds `locked_patient_csv()`; a crash leaves the old file whole.
+    """
+    directory = os.path.dirname(os.path.abspath(CSV_FILE))
+    fd, tmp_path = tempfile.mkstemp(prefix='.patients-', suffix='.csv', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            # mkstemp creates the file owner-only; keep the CSV's own permissions
+            os.fchmod(f.fileno(), stat.S_IMODE(os.stat(CSV_FILE).st_mode))
+            writer = csv.writer(f)
+            writer.writerow(PATIENT_CSV_HEADER)
+            writer.writerows(patient_to_row(patient) for patient in patients)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CSV_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def patient_to_row(patient: Patient) -> list:
+    """Convert a patient into a CSV row ordered like PATIENT_CSV_HEADER"""
+    return [
+        patient.patient_id, patient.name, patient.age, patient.gender,
+        patient.locality, patient.condition_severity, patient.priority_level,
+        patient.medical_history, patient.bill_amount, patient.amount_paid,
+        patient.outstanding_amount, patient.payment_status,
+        patient.insurance_coverage, patient.insurance_details,
+        patient.admission_date, patient.discharge_date or '',
+        patient.timestamp or datetime.now().isoformat()
+    ]
+
+def derive_payment_fields(bill_amount: float, amount_paid: float) -> Tuple[str, float]:
+    """Payment status and outstanding amount implied by a bill and the amount paid"""
+    if amount_paid >= bill_amount:
+        return 'Fully Paid', 0
+    # Amounts are money: keep them to the cent so rows survive a CSV round trip unchanged
+    outstanding_amount = round(bill_amount - amount_paid, 2)
+    if amount_paid > 0:
+        return 'Partially Paid', outstanding_amount
+    return 'Unpaid', outstanding_amount
+
+def generate_patient_ids(count: int, taken=()) -> List[str]:
+    """`count` distinct patient IDs, none of which is in `taken` (any container of IDs)"""
+    base = generate_patient_id()
+    ids, suffix = [], 0
+    while len(ids) < count:
+        # IDs are minute-granular, so disambiguate repeats within the same minute
+        candidate = base if suffix == 0 else f"{base}-{suffix}"
+        suffix += 1
+        if candidate not in taken:
+            ids.append(candidate)
+    return ids
+
 def generate_patient_id() -> str:
     """Generate a unique patient ID"""
     timestamp = datetime.now()
@@ -107,14 +222,11 @@ def generate_patient_id() -> str:
     unique_part = f"{timestamp.month:02d}{timestamp.day:02d}{timestamp.hour:02d}{timestamp.minute:02d}"
     return f"HMS-{year}-{unique_part}"
 
-def get_emergency_cases() -> List[EmergencyCase]:
-    """Get all emergency cases from dedicated emergency CSV file"""
+def _emergency_cases_from_csv() -> List[EmergencyCase]:
+    """Cases from the old CSV queue, imported once into the emergency journal"""
     emergency_cases = []
-    emergency_csv_path = "emergency_cases.csv"
-    
     try:
-        # First try to load from dedicated emergency CSV
-        with open(emergency_csv_path, 'r', encoding='utf-8') as file:
+        with open(EMERGENCY_CSV_FILE, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             for row in reader:
                 try:
@@ -133,115 +245,85 @@ def get_emergency_cases() -> List[EmergencyCase]:
                 except (ValueError, TypeError) as e:
                     logging.error(f"Error processing emergency case row: {e}")
                     continue
-        
-        # Sort by priority level (1 = highest priority) and time added
-        emergency_cases.sort(key=lambda x: (x.priority_level, x.time_added))
-        
     except FileNotFoundError:
-        # If emergency CSV doesn't exist, fall back to patient data
-        logging.info("Emergency CSV not found, using patient data for emergency cases")
-        patients = load_patients_from_csv()
-        
-        priority_mapping = {
-            'Emergency': (1, 'Emergency'),
-            'Critical': (1, 'Emergency'),
-            'High': (2, 'Urgent'),
-            'Urgent': (2, 'Urgent'),
-            'Severe': (2, 'Urgent'),
-            'Moderate': (3, 'Standard'),
-            'Standard': (3, 'Standard'),
-            'Mild': (4, 'Routine'),
-            'Routine': (4, 'Routine')
-        }
-        
-        for patient in patients:
-            if patient.is_emergency:
-                priority_info = priority_mapping.get(patient.condition_severity, (4, 'Routine'))
-                
-                case = EmergencyCase(
-                    patient_id=patient.patient_id,
-                    name=patient.name,
-                    condition=patient.medical_history or f"{patient.condition_severity} condition",
-                    priority=patient.condition_severity,
-                    priority_level=priority_info[0],
-                    priority_name=priority_info[1],
-                    time_added=patient.timestamp or patient.admission_date,
-                    formatted_time=format_timestamp(patient.timestamp or patient.admission_date)
-                )
-                emergency_cases.append(case)
-        
-        emergency_cases.sort(key=lambda x: x.priority_level)
+        pass
+    return emergency_cases
+
+def _emergency_cases_from_patients() -> List[EmergencyCase]:
+    """Read-only queue derived from patient data, used until a case is ever queued"""
+    emergency_cases = []
+    patients = load_patients_from_csv()
     
-    except Exception as e:
-        logging.error(f"Error reading emergency cases: {e}")
+    priority_mapping = {
+        'Emergency': (1, 'Emergency'),
+        'Critical': (1, 'Emergency'),
+        'High': (2, 'Urgent'),
+        'Urgent': (2, 'Urgent'),
+        'Severe': (2, 'Urgent'),
+        'Moderate': (3, 'Standard'),
+        'Standard': (3, 'Standard'),
+        'Mild': (4, 'Routine'),
+        'Routine': (4, 'Routine')
+    }
     
+    for patient in patients:
+        if patient.is_emergency:
+            priority_info = priority_mapping.get(patient.condition_severity, (4, 'Routine'))
+            
+            case = EmergencyCase(
+                patient_id=patient.patient_id,
+                name=patient.name,
+                condition=patient.medical_history or f"{patient.condition_severity} condition",
+                priority=patient.condition_severity,
+                priority_level=priority_info[0],
+                priority_name=priority_info[1],
+                time_added=patient.timestamp or patient.admission_date,
+                formatted_time=format_timestamp(patient.timestamp or patient.admission_date)
+            )
+            emergency_cases.append(case)
+    
+    emergency_cases.sort(key=lambda x: x.priority_level)
     return emergency_cases
 
-def save_emergency_case_to_csv(case: EmergencyCase) -> bool:
-    """Save an emergency case to the emergency CSV file"""
+def _retire_emergency_csv() -> None:
+    """Rename the old CSV queue once it is imported, so it is never imported twice"""
     try:
-        emergency_csv_path = "emergency_cases.csv"
-        file_exists = os.path.exists(emergency_csv_path)
-        
-        with open(emergency_csv_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Write header if file is new
-            if not file_exists:
-                writer.writerow([
-                    'patient_id', 'name', 'condition', 'priority', 
-                    'priority_level', 'time_added'
-                ])
-            
-            # Write emergency case data
-            writer.writerow([
-                case.patient_id, case.name, case.condition, 
-                case.priority, case.priority_level, case.time_added
-            ])
-        
-        return True
+        os.replace(EMERGENCY_CSV_FILE, f"{EMERGENCY_CSV_FILE}.imported")
+    except OSError as e:
+        logging.error(f"Could not rename {EMERGENCY_CSV_FILE} after importing it: {e}")
+
+# Emergency queue shared by all requests, persisted in an append-only journal
+emergency_queue = EmergencyQueue(EMERGENCY_JOURNAL_FILE, seed=_emergency_cases_from_csv,
+                                 after_seed=_retire_emergency_csv)
+
+def get_emergency_cases() -> List[EmergencyCase]:
+    """All emergency cases in treatment order (priority level, then time added)"""
+    try:
+        if not emergency_queue.exists() and not os.path.exists(EMERGENCY_CSV_FILE):
+            # Nothing has ever been queued: fall back to patient data
+            logging.info("No emergency queue yet, using patient data for emergency cases")
+            return _emergency_cases_from_patients()
+        return emergency_queue.cases()
     except Exception as e:
-        logging.error(f"Error saving emergency case to CSV: {e}")
-        return False
+        logging.error(f"Error reading emergency cases: {e}")
+        return []
 
-def remove_emergency_case_from_csv(patient_id: str) -> bool:
-    """Remove an emergency case from the CSV file"""
+def save_emergency_case(case: EmergencyCase) -> bool:
+    """Add an emergency case to the queue"""
     try:
-        emergency_csv_path = "emergency_cases.csv"
-        if not os.path.exists(emergency_csv_path):
-            return False
-        
-        # Read all cases except the one to remove
-        remaining_cases = []
-        with open(emergency_csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get('patient_id') != patient_id:
-                    remaining_cases.append(row)
-        
-        # Rewrite the file with remaining cases
-        with open(emergency_csv_path, 'w', newline='', encoding='utf-8') as f:
-            if remaining_cases:
-                fieldnames = ['patient_id', 'name', 'condition', 'priority', 'priority_level', 'time_added']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(remaining_cases)
-            else:
-                # Write just the header if no cases remain
-                writer = csv.writer(f)
-                writer.writerow(['patient_id', 'name', 'condition', 'priority', 'priority_level', 'time_added'])
-        
+        emergency_queue.push(case)
         return True
     except Exception as e:
-        logging.error(f"Error removing emergency case from CSV: {e}")
+        logging.error(f"Error saving emergency case: {e}")
         return False
 
-def get_next_emergency_case():
-    """Get the next highest priority emergency case"""
-    cases = get_emergency_cases()
-    if cases:
-        return cases[0]  # First case is highest priority due to sorting
-    return None
+def pop_next_emergency_case() -> Optional[EmergencyCase]:
+    """Remove and return the highest-priority emergency case, or None if the queue is empty"""
+    try:
+        return emergency_queue.pop()
+    except Exception as e:
+        logging.error(f"Error processing emergency case: {e}")
+        return None
 
 def format_timestamp(timestamp_str: str) -> str:
     """Format timestamp for display"""
@@ -267,67 +349,548 @@ def create_sample_csv():
     try:
         with open(CSV_FILE, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow([
-                'patient_id', 'name', 'age', 'gender', 'locality',
-                'condition_severity', 'priority_level', 'medical_history',
-                'bill_amount', 'amount_paid', 'outstanding_amount',
-                'payment_status', 'insurance_coverage', 'insurance_details',
-                'admission_date', 'discharge_date', 'timestamp'
-            ])
+            writer.writerow(PATIENT_CSV_HEADER)
         logging.info(f"Created new CSV file: {CSV_FILE}")
     except Exception as e:
         logging.error(f"Error creating sample CSV: {e}")
 
-def calculate_dashboard_stats() -> Dict[str, Any]:
-    """Calculate dashboard statistics from patient data"""
+def _csv_signature() -> Optional[list]:
+    """Cheap change detector for the patient CSV (size, mtime and inode)"""
+    try:
+        st = os.stat(CSV_FILE)
+    except OSError:
+        return None
+    # An atomic rewrite can keep the size and land in the same mtime tick, but always has a new inode
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+def _read_state_file() -> Optional[Dict[str, Any]]:
+    """Read the persisted aggregate state, if any"""
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable state file {STATE_FILE}: {e}")
+        return None
+
+def _write_state_file() -> None:
+    """Atomically persist the in-memory aggregate state"""
+    payload = {
+        'generation': _data_state['generation'],
+        'signature': _data_state['signature'],
+        'aggregates': asdict(_data_state['aggregates']),
+        'aging': asdict(_data_state['aging']) if _data_state['aging'] is not None else None,
+        'rollup': asdict(_data_state['rollup']) if _data_state['rollup'] is not None else None
+    }
+    try:
+        # A unique temp file per writer: workers cold-starting together rebuild without the CSV lock
+        fd, tmp_path = tempfile.mkstemp(prefix='.state-', suffix='.json',
+                                        dir=os.path.dirname(os.path.abspath(STATE_FILE)))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, STATE_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logging.error(f"Error persisting state file: {e}")
+
+def _rebuild_data_state(previous_generation: int) -> None:
+    """Recompute the aggregates from the CSV and start a new generation"""
     patients = load_patients_from_csv()
+    _data_state.update(
+        aggregates=DashboardAggregates.from_patients(patients),
+        aging=AgingSummary.from_patients(patients, date.today().isoformat()),
+        rollup=RevenueRollup.from_patients(patients),
+        generation=previous_generation + 1,
+        signature=_csv_signature()
+    )
+    _write_state_file()
+    # The rows just read double as the first snapshot of this generation
+    _snapshot_cache['snapshot'] = PatientSnapshot(generation=_data_state['generation'], patients=patients)
+    logging.info(f"Rebuilt dashboard aggregates at generation {_data_state['generation']}")
+
+def _current_data_state() -> Dict[str, Any]:
+    """Return the aggregate state, reloading it only if the CSV has changed"""
+    signature = _csv_signature()
+    if _data_state['aggregates'] is not None and signature == _data_state['signature']:
+        return _data_state
     
-    if not patients:
+    with _state_lock:
+        signature = _csv_signature()
+        if _data_state['aggregates'] is not None and signature == _data_state['signature']:
+            return _data_state
+        
+        # Another process may have written the CSV and persisted its state
+        persisted = _read_state_file()
+        # State written before a field was added to the aggregates cannot be resumed from
+        if (persisted and signature is not None and persisted.get('signature') == signature
+                and persisted['aggregates'].keys() >= {f.name for f in fields(DashboardAggregates)}):
+            _data_state.update(
+                generation=persisted['generation'],
+                signature=signature,
+                aggregates=DashboardAggregates(**persisted['aggregates']),
+                # Older state files have no aging summary or rollup; they are rebuilt on first use
+                aging=AgingSummary(**persisted['aging']) if persisted.get('aging') else None,
+                rollup=RevenueRollup(**persisted['rollup']) if persisted.get('rollup') else None
+            )
+        else:
+            previous = max(_data_state['generation'], persisted.get('generation', 0) if persisted else 0)
+            _rebuild_data_state(previous)
+    
+    return _data_state
+
+def begin_write() -> Optional[list]:
+    """Sync the aggregate state with the CSV before writing; returns its signature"""
+    return _current_data_state()['signature']
+
+def _record_write(update, base_signature: Optional[list], update_snapshot=None) -> None:
+    """Apply an O(1) update to the aggregates, aging and rollup after a successful write and bump the generation.
+
+    Requests may still be reading the current aggregates and snapshot, so
+    the update is applied to copies that are swapped in together; nothing a
+    request already holds changes under it.
+    """
+    with _state_lock:
+        if _data_state['aggregates'] is None or _data_state['signature'] != base_signature:
+            # The cached totals did not describe the file we wrote to: cold-start on next read
+            _data_state.update(aggregates=None, aging=None, rollup=None)
+            _snapshot_cache['snapshot'] = None
+            return
+        updated = {key: _data_state[key].copy() if _data_state[key] is not None else None
+                   for key in ('aggregates', 'aging', 'rollup')}
+        update(updated)
+        generation = _data_state['generation'] + 1
+        
+        # Build the next snapshot (and its index) from the cached one instead of reloading it
+        snapshot = _snapshot_cache['snapshot']
+        if snapshot is not None and update_snapshot is not None and snapshot.generation == generation - 1:
+            snapshot = update_snapshot(snapshot, generation)
+        else:
+            snapshot = None
+        
+        _data_state.update(updated, generation=generation, signature=_csv_signature())
+        _snapshot_cache['snapshot'] = snapshot
+        _write_state_file()
+
+def _append_to_snapshot(snapshot: PatientSnapshot, patients: List[Patient], generation: int) -> PatientSnapshot:
+    """New snapshot with rows appended, leaving `snapshot` as it was"""
+    if snapshot.index is None:
+        return PatientSnapshot(generation=generation, patients=snapshot.patients + list(patients))
+    index = snapshot.index.copy()
+    for patient in patients:
+        index.add(patient)
+    return PatientSnapshot(generation=generation, patients=index.patients, index=index)
+
+def _replace_in_snapshot(snapshot: PatientSnapshot, patients: List[Patient],
+                         generation: int) -> Optional[PatientSnapshot]:
+    """New snapshot with updated records swapped in by ID, or None if one is not in it"""
+    index = snapshot.index.copy() if snapshot.index is not None else None
+    rows = index.patients if index is not None else list(snapshot.patients)
+    for patient in patients:
+        if index is not None:
+            position = index.position_of(patient.patient_id)
+        else:
+            position = next((i for i, p in enumerate(rows) if p.patient_id == patient.patient_id), None)
+        if position is None:
+            return None
+        
+        if index is not None:
+            index.replace(position, patient)
+        else:
+            rows[position] = patient
+    return PatientSnapshot(generation=generation, patients=rows, index=index)
+
+def record_registration(patient: Patient, base_signature: Optional[list]) -> None:
+    """Update the aggregates for a newly appended patient row"""
+    record_registrations([patient], base_signature)
+
+def record_registrations(patients: List[Patient], base_signature: Optional[list]) -> None:
+    """Update the aggregates for patient rows appended in one write (one generation bump)"""
+    def add_all(state: Dict[str, Any]) -> None:
+        for patient in patients:
+            state['aggregates'].add_patient(patient)
+            if state['aging'] is not None:
+                state['aging'].add_patient(patient)
+            if state['rollup'] is not None:
+                state['rollup'].add_patient(patient)
+    
+    _record_write(add_all, base_signature,
+                  lambda snapshot, generation: _append_to_snapshot(snapshot, patients, generation))
+
+def record_payments(changes: List[Tuple[Patient, Patient]], base_signature: Optional[list]) -> None:
+    """Update the aggregates for (patient, record before payment) pairs written in one rewrite"""
+    def apply_all(state: Dict[str, Any]) -> None:
+        for patient, previous in changes:
+            state['aggregates'].apply_payment(patient, previous)
+            if state['aging'] is not None:
+                state['aging'].apply_payment(patient, previous.outstanding_amount)
+            if state['rollup'] is not None:
+                state['rollup'].replace_patient(previous, patient)
+    
+    _record_write(apply_all, base_signature,
+                  lambda snapshot, generation: _replace_in_snapshot(
+                      snapshot, [patient for patient, _ in changes], generation))
+
+def apply_payment_to(patient: Patient, amount: float) -> Patient:
+    """Copy of a patient with a payment added and the derived fields recomputed"""
+    amount_paid = round(patient.amount_paid + amount, 2)
+    payment_status, outstanding_amount = derive_payment_fields(patient.bill_amount, amount_paid)
+    return replace(patient, amount_paid=amount_paid, outstanding_amount=outstanding_amount,
+                   payment_status=payment_status)
+
+def post_payments(payments: List[Tuple[str, float, str]]) -> Optional[List[Tuple[str, Optional[Patient]]]]:
+    """Apply (patient_id, amount, reference) payments and persist them with a single locked rewrite.
+
+    Returns a (status, patient) pair per payment: ('applied', updated
+    patient), ('not_found', None), or ('duplicate_reference', None) when a
+    non-empty reference was already applied, by an earlier call or earlier
+    in this one. Returns None if the file could not be written. Several
+    payments for the same patient accumulate in order.
+
+    The rows are read, updated and replaced under the CSV lock, so
+    concurrent payments and registrations cannot overwrite each other. The
+    payments themselves are applied one by one, because later payments to
+    a patient build on earlier ones.
+    """
+    try:
+        with locked_patient_csv():
+            base_signature = begin_write()
+            snapshot = _load_patient_snapshot()
+            index = get_patient_index(snapshot)
+            seen = payment_references.applied(reference for _, _, reference in payments if reference)
+            
+            updated: Dict[int, Patient] = {}
+            originals: Dict[int, Patient] = {}
+            results: List[Tuple[str, Optional[Patient]]] = []
+            new_references: List[str] = []
+            for patient_id, amount, reference in payments:
+                if reference and reference in seen:
+                    results.append(('duplicate_reference', None))
+                    continue
+                position = index.position_of(patient_id)
+                if position is None:
+                    results.append(('not_found', None))
+                    continue
+                if reference:
+                    seen.add(reference)
+                    new_references.append(reference)
+                previous = updated.get(position, index.patients[position])
+                originals.setdefault(position, previous)
+                patient = apply_payment_to(previous, amount)
+                updated[position] = patient
+                results.append(('applied', patient))
+            
+            if updated:
+                # Never mutate the shared snapshot rows; the next snapshot is built from copies
+                patients = list(index.patients)
+                for position, patient in updated.items():
+                    patients[position] = patient
+                _write_patients_csv(patients)
+                # Recorded once the rows are in place: a crash in between can let a retry apply
+                # a payment twice, but a reference is never marked applied without its payment
+                payment_references.record(new_references)
+                record_payments([(patient, originals[position]) for position, patient in updated.items()],
+                                base_signature)
+            return results
+    except OSError as e:
+        logging.error(f"Error posting payments: {e}")
+        return None
+
+def get_data_generation() -> int:
+    """Return the current data generation (bumped on every write)"""
+    return _current_data_state()['generation']
+
+def current_data_generation() -> Optional[int]:
+    """Generation of the data this request renders (its snapshot's, if it took one)"""
+    snapshot = _reuse_patient_snapshot(None)
+    if snapshot is not None:
+        return snapshot.generation
+    return get_data_generation()
+
+def get_data_last_modified() -> datetime:
+    """Return when the current data generation was written (CSV mtime)"""
+    signature = _current_data_state()['signature']
+    if signature is None:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(signature[1] / 1e9, tz=timezone.utc)
+
+def _cells_drift(cached: Dict[str, list], actual: Dict[str, list]) -> List[str]:
+    """Keys whose [amounts..., count] cells differ by more than a cent or in count"""
+    drifted = []
+    for key in set(cached) | set(actual):
+        cached_cell, actual_cell = cached.get(key), actual.get(key)
+        if (cached_cell is None or actual_cell is None or cached_cell[-1] != actual_cell[-1]
+                or any(abs(a - b) > 0.01 for a, b in zip(cached_cell[:-1], actual_cell[:-1]))):
+            drifted.append(key)
+    return sorted(drifted)
+
+def refresh_aging_summary() -> AgingSummary:
+    """Rebuild the aging summary as of today from the current snapshot (nightly rollover)"""
+    with _state_lock:
+        state = _current_data_state()
+        snapshot = _load_patient_snapshot()
+        aging = AgingSummary.from_patients(snapshot.patients, date.today().isoformat())
+        # Only keep it if no write landed while the rows were read
+        if snapshot.generation == state['generation']:
+            state['aging'] = aging
+            _write_state_file()
+        return aging
+
+def get_aging_summary() -> Dict[str, Any]:
+    """Receivables aging by bucket and insurance coverage, without scanning patients.
+
+    The summary is maintained on every registration and payment; only the
+    first read of a new day rebuilds it, since balances move between buckets
+    as days pass.
+    """
+    aging = _current_data_state()['aging']
+    if aging is None or aging.as_of != date.today().isoformat():
+        aging = refresh_aging_summary()
+    return aging.to_summary()
+
+def get_revenue_rollup() -> RevenueRollup:
+    """Daily/monthly billing rollup for the current data, rebuilt only when missing"""
+    state = _current_data_state()
+    if state['rollup'] is None:
+        with _state_lock:
+            snapshot = _load_patient_snapshot()
+            rollup = RevenueRollup.from_patients(snapshot.patients)
+            # Only keep it if no write landed while the rows were read
+            if snapshot.generation == state['generation']:
+                state['rollup'] = rollup
+                _write_state_file()
+            return rollup
+    return state['rollup']
+
+def verify_dashboard_aggregates() -> Dict[str, Any]:
+    """Integrity check: recompute the aggregates from the CSV and repair drift"""
+    with _state_lock:
+        state = _current_data_state()
+        cached = state['aggregates']
+        patients = load_patients_from_csv()
+        recomputed = DashboardAggregates.from_patients(patients)
+        
+        mismatches = {}
+        for field, cached_value in asdict(cached).items():
+            actual_value = getattr(recomputed, field)
+            if abs(cached_value - actual_value) > 0.01:
+                mismatches[field] = {'cached': cached_value, 'actual': actual_value}
+        
+        aging = state['aging']
+        recomputed_aging = AgingSummary.from_patients(patients, aging.as_of if aging else date.today().isoformat())
+        if aging is not None and _cells_drift(aging.cells, recomputed_aging.cells):
+            mismatches['aging'] = {'cached': aging.to_summary()['buckets'], 'actual': recomputed_aging.to_summary()['buckets']}
+        state['aging'] = recomputed_aging
+        
+        rollup, recomputed_rollup = state['rollup'], RevenueRollup.from_patients(patients)
+        if rollup is not None:
+            drifted = _cells_drift(rollup.daily, recomputed_rollup.daily)
+            if drifted:
+                mismatches['rollup'] = {'cached': f"{len(drifted)} cells", 'actual': drifted[:10]}
+        state['rollup'] = recomputed_rollup
+        
+        if mismatches:
+            logging.warning(f"Dashboard aggregates drifted, repairing: {mismatches}")
+            state['aggregates'] = recomputed
+            state['generation'] += 1
+            state['signature'] = _csv_signature()
+            _write_state_file()
+        
         return {
-            'total_patients': 0,
-            'emergency_cases': 0,
-            'total_revenue': 0.0,
-            'avg_bill': 0.0,
-            'collection_rate': 0.0
+            'generation': state['generation'],
+            'consistent': not mismatches,
+            'mismatches': mismatches
         }
+
+def _load_patient_snapshot() -> PatientSnapshot:
+    """Load the patients together with the generation they belong to"""
+    state = _current_data_state()
+    generation, signature = state['generation'], state['signature']
     
-    total_patients = len(patients)
-    emergency_cases = len([p for p in patients if p.is_emergency])
-    total_billed = sum(p.bill_amount for p in patients)
-    total_paid = sum(p.amount_paid for p in patients)
-    total_revenue = total_paid
-    avg_bill = total_billed / total_patients if total_patients > 0 else 0.0
-    collection_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0.0
+    cached = _snapshot_cache['snapshot']
+    if cached is not None and cached.generation == generation:
+        return cached
     
-    return {
-        'total_patients': total_patients,
-        'emergency_cases': emergency_cases,
-        'total_revenue': total_revenue,
-        'avg_bill': avg_bill,
-        'collection_rate': collection_rate,
-        'total_billed': total_billed,
-        'total_paid': total_paid,
-        'total_outstanding': total_billed - total_paid
-    }
-
-def search_patients(query: str = "", severity_filter: str = "", status_filter: str = "") -> List[Patient]:
-    """Search and filter patients"""
     patients = load_patients_from_csv()
+    if _csv_signature() != signature:
+        # A write landed while we were reading: the rows match no known generation
+        return PatientSnapshot(generation=None, patients=patients)
+    
+    snapshot = PatientSnapshot(generation=generation, patients=patients)
+    _snapshot_cache['snapshot'] = snapshot
+    return snapshot
+
+def get_patient_snapshot() -> PatientSnapshot:
+    """Return the request's patient snapshot, reading the CSV at most once per request"""
+    if not has_app_context():
+        return _load_patient_snapshot()
     
+    snapshot = g.get('patient_snapshot')
+    if snapshot is None:
+        snapshot = g.patient_snapshot = _load_patient_snapshot()
+    return snapshot
+
+def _reuse_patient_snapshot(snapshot: Optional[PatientSnapshot]) -> Optional[PatientSnapshot]:
+    """Fall back to the snapshot already taken in this request, without loading one"""
+    if snapshot is None and has_app_context():
+        return g.get('patient_snapshot')
+    return snapshot
+
+def calculate_dashboard_stats(snapshot: Optional[PatientSnapshot] = None) -> Dict[str, Any]:
+    """Dashboard statistics read from the incrementally maintained aggregates"""
+    snapshot = _reuse_patient_snapshot(snapshot)
+    state = _current_data_state()
+    if snapshot is None or snapshot.generation == state['generation']:
+        return state['aggregates'].to_stats()
+    
+    # The data moved on since the snapshot was taken: keep figures consistent with it
+    return DashboardAggregates.from_patients(snapshot.patients).to_stats()
+
+def get_patient_index(snapshot: Optional[PatientSnapshot] = None) -> PatientIndex:
+    """Return the bitmap/ID index for a snapshot, built once per data generation"""
+    snapshot = _reuse_patient_snapshot(snapshot) or get_patient_snapshot()
+    if snapshot.index is None:
+        snapshot.index = PatientIndex(snapshot.patients)
+    return snapshot.index
+
+def _search_masks(index: PatientIndex, query: str, filters: Dict[str, str]) -> Tuple[int, int]:
+    """Bitmap of rows matching the text query, and of rows matching query and filters"""
+    query_mask = index.all_mask
     if query:
         query = query.lower()
-        patients = [p for p in patients if 
-                   query in p.name.lower() or 
-                   query in p.patient_id.lower() or
-                   query in p.medical_history.lower()]
-    
-    if severity_filter:
-        patients = [p for p in patients if p.condition_severity == severity_filter]
+        query_mask = index.mask_from_positions(
+            position for position, p in enumerate(index.patients) if
+            query in p.name.lower() or
+            query in p.patient_id.lower() or
+            query in p.medical_history.lower())
+    return query_mask, index.filter_mask(filters, query_mask)
+
+def _search_filters(severity_filter: str, status_filter: str, payment_status_filter: str,
+                    locality_filter: str) -> Dict[str, str]:
+    return {
+        'condition_severity': severity_filter,
+        # Unknown status values do not filter, as before
+        'status': status_filter if status_filter in ('Active', 'Discharged') else '',
+        'payment_status': payment_status_filter,
+        'locality': locality_filter
+    }
+
+def _sort_key(patient: Patient, field: Optional[str]) -> Tuple[bool, Any]:
+    """Sort key with missing values last; JSON-serializable so it can go into a cursor"""
+    if field is None:
+        return (False, 0)
+    value = getattr(patient, field)
+    return (value is None, value if value is not None else 0)
+
+def encode_query_cursor(key: Tuple[bool, Any], position: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key[0], key[1], position]).encode('utf-8')).decode('ascii')
+
+def decode_query_cursor(cursor: str) -> Tuple[Tuple[bool, Any], int]:
+    """Inverse of encode_query_cursor; raises ValueError for a malformed cursor"""
+    try:
+        missing, value, position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(missing, bool) or not isinstance(position, int):
+        raise ValueError("Invalid cursor")
+    return (missing, value), position
+
+def _facet_mask(index: PatientIndex, filters: Dict[str, str]) -> int:
+    return index.filter_mask(_search_filters(filters.get('condition_severity', ''), filters.get('status', ''),
+                                             filters.get('payment_status', ''), filters.get('locality', '')))
+
+def _admitted_between(patient: Patient, admitted_from: str, admitted_to: str) -> bool:
+    return admitted_from <= (patient.admission_date or '')[:10] <= (admitted_to or '9999-12-31')
+
+def iter_filtered_patients(filters: Dict[str, str], admitted_from: str = "", admitted_to: str = "",
+                           snapshot: Optional[PatientSnapshot] = None, reverse: bool = False,
+                           after: Optional[int] = None) -> Iterator[Tuple[int, Patient]]:
+    """Lazily yield (row position, patient) for rows matching facet filters and an admission date range.
+
+    `filters` uses the facet field names (condition_severity, status,
+    payment_status, locality); dates are inclusive YYYY-MM-DD bounds. Rows
+    come in file order, or reversed; `after` skips to the rows past that
+    position in that order.
+    """
+    index = get_patient_index(snapshot)
+    mask = _facet_mask(index, filters)
+    if after is not None:
+        mask &= (1 << max(after, 0)) - 1 if reverse else ~((1 << (after + 1)) - 1)
+    for position in index.positions(mask, reverse):
+        patient = index.patients[position]
+        if (admitted_from or admitted_to) and not _admitted_between(patient, admitted_from, admitted_to):
+            continue
+        yield position, patient
+
+def query_patients(filters: Dict[str, str], admitted_from: str = "", admitted_to: str = "",
+                   sort_field: Optional[str] = None, descending: bool = False, limit: int = 100,
+                   cursor: str = "", snapshot: Optional[PatientSnapshot] = None) -> Tuple[List[Patient], Optional[str]]:
+    """One page of filtered, sorted patients and the cursor for the next page (None on the last).
+
+    Pages are keyed on (sort value, row position) rather than offsets, so
+    registrations between requests neither repeat nor skip rows. A page
+    walks rows from the cursor and stops once it is full: in file order
+    when unsorted, else in the index's sort order for the field, which is
+    sorted once per data generation.
+    """
+    index = get_patient_index(snapshot)
+    start_key, start_position = decode_query_cursor(cursor) if cursor else (None, None)
     
-    if status_filter:
-        if status_filter == "Active":
-            patients = [p for p in patients if not p.discharge_date]
-        elif status_filter == "Discharged":
-            patients = [p for p in patients if p.discharge_date]
+    if sort_field is None:
+        if start_key is not None and start_key != _sort_key(None, None):
+            raise ValueError("Cursor does not belong to this sort order")
+        candidates = ((_sort_key(None, None), position) for position, _ in iter_filtered_patients(
+            filters, admitted_from, admitted_to, snapshot, reverse=descending, after=start_position))
+    else:
+        order = index.sort_order(sort_field, lambda patient: _sort_key(patient, sort_field))
+        try:
+            if descending:
+                end = bisect.bisect_left(order, (start_key, start_position)) if cursor else len(order)
+                walk = range(end - 1, -1, -1)
+            else:
+                begin = bisect.bisect_right(order, (start_key, start_position)) if cursor else 0
+                walk = range(begin, len(order))
+        except TypeError:
+            raise ValueError("Cursor does not belong to this sort order")
+        
+        mask = _facet_mask(index, filters)
+        # Test bits in bytes: shifting the whole bitmap per row would cost O(rows) each time
+        bits = mask.to_bytes((len(index.patients) + 7) // 8, 'little') if mask != index.all_mask else None
+        candidates = (order[i] for i in walk
+                      if (bits is None or bits[order[i][1] >> 3] >> (order[i][1] & 7) & 1)
+                      and (not (admitted_from or admitted_to)
+                           or _admitted_between(index.patients[order[i][1]], admitted_from, admitted_to)))
     
+    # One row past the page tells whether there is a next one
+    page = list(itertools.islice(candidates, limit + 1))
+    next_cursor = encode_query_cursor(*page[limit - 1]) if len(page) > limit else None
+    return [index.patients[position] for _, position in page[:limit]], next_cursor
+
+def search_patients(query: str = "", severity_filter: str = "", status_filter: str = "",
+                    snapshot: Optional[PatientSnapshot] = None, payment_status_filter: str = "",
+                    locality_filter: str = "") -> List[Patient]:
+    """Search and filter patients"""
+    patients, _ = search_patients_with_facets(query, severity_filter, status_filter, snapshot,
+                                              payment_status_filter, locality_filter)
     return patients
+
+def fuzzy_search_patients(query: str, max_distance: int = 2, limit: int = 20, severity_filter: str = "",
+                          status_filter: str = "", snapshot: Optional[PatientSnapshot] = None,
+                          payment_status_filter: str = "", locality_filter: str = "") -> List[Tuple[Patient, int]]:
+    """Typo-tolerant name search: (patient, edit distance) pairs, closest first"""
+    index = get_patient_index(snapshot)
+    filters = _search_filters(severity_filter, status_filter, payment_status_filter, locality_filter)
+    mask = index.filter_mask(filters) if any(filters.values()) else None
+    return index.fuzzy_match(query, max_distance, limit, mask)
+
+def search_patients_with_facets(query: str = "", severity_filter: str = "", status_filter: str = "",
+                                snapshot: Optional[PatientSnapshot] = None, payment_status_filter: str = "",
+                                locality_filter: str = "") -> Tuple[List[Patient], Dict[str, List[Tuple[str, int]]]]:
+    """Search and filter patients, also returning facet counts for the current query"""
+    index = get_patient_index(snapshot)
+    filters = _search_filters(severity_filter, status_filter, payment_status_filter, locality_filter)
+    query_mask, result_mask = _search_masks(index, query, filters)
+    return index.select(result_mask), index.facet_counts(filters, query_mask)
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Pages rendered once during warm-up so their response and fragment caches are hot
+WARM_PAGES = ('/', '/patients', '/billing_dashboard', '/financial_report', '/reports_dashboard')
+
+_status_lock = threading.Lock()
+_status: Dict[str, Any] = {
+    'status': 'not_started',
+    'started_at': None,
+    'finished_at': None,
+    'total_ms': None,
+    'steps': []
+}
+
+def _warm_data(app, results: Dict[str, Any]) -> str:
+    from utils import get_patient_snapshot, calculate_dashboard_stats
+    with app.app_context():
+        snapshot = get_patient_snapshot()
+        calculate_dashboard_stats(snapshot)
+    results['snapshot'] = snapshot
+    return f"{len(snapshot.patients)} patients, generation {snapshot.generation}"
+
+def _warm_index(app, results: Dict[str, Any]) -> str:
+    from utils import get_patient_index
+    index = get_patient_index(results['snapshot'])
+    return f"{len(index.patients)} rows indexed"
+
+def _warm_insights(app, results: Dict[str, Any]) -> str:
+    from ml_insights import get_lazy_insights
+    with app.app_context():
+        insights, generation = get_lazy_insights()
+        for name in insights.SECTIONS:
+            insights.section(name)
+    return f"{len(insights.SECTIONS)} sections computed"
+
+def _warm_pages(app, results: Dict[str, Any]) -> str:
+    client = app.test_client()
+    statuses = {path: client.get(path).status_code for path in WARM_PAGES}
+    failed = [path for path, status in statuses.items() if status != 200]
+    if failed:
+        raise RuntimeError(f"non-200 responses from {', '.join(failed)}")
+    return f"{len(statuses)} pages rendered"
+
+WARMUP_STEPS: List[tuple] = [
+    ('patient_data', _warm_data),
+    ('patient_index', _warm_index),
+    ('ml_insights', _warm_insights),
+    ('pages', _warm_pages)
+]
+
+def _run_step(name: str, step: Callable, app, results: Dict[str, Any]) -> bool:
+    entry = {'name': name, 'status': 'running', 'duration_ms': None, 'detail': None}
+    with _status_lock:
+        _status['steps'].append(entry)
+
+    started = time.perf_counter()
+    try:
+        detail, status = step(app, results), 'done'
+    except Exception as e:
+        logging.error(f"Warm-up step {name} failed: {e}")
+        detail, status = str(e), 'failed'
+
+    with _status_lock:
+        entry.update(status=status, detail=detail, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    logging.info(f"Warm-up step {name} {status} in {entry['duration_ms']} ms: {detail}")
+    return status == 'done'
+
+def _run(app) -> None:
+    started = time.perf_counter()
+    results: Dict[str, Any] = {}
+    ok = True
+    for name, step in WARMUP_STEPS:
+        if not _run_step(name, step, app, results):
+            ok = False
+            # Later steps build on the loaded data, so stop if it could not be read
+            if name == 'patient_data':
+                break
+
+    with _status_lock:
+        _status.update(
+            status='ready' if ok else 'degraded',
+            finished_at=datetime.now().isoformat(),
+            total_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+    logging.info(f"Warm-up {_status['status']} in {_status['total_ms']} ms")
+
+def warm_up(app, background: bool = False) -> Optional[threading.Thread]:
+    """Load the data, build the indexes and ML insights, and render the main pages.
+
+    Runs once per process. With `background=True` the work happens on a daemon
+    thread and the readiness endpoint reports progress until it finishes.
+    """
+    with _status_lock:
+        if _status['status'] != 'not_started':
+            return None
+        _status.update(status='running', started_at=datetime.now().isoformat())
+
+    if not background:
+        _run(app)
+        return None
+    thread = threading.Thread(target=_run, args=(app,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def warmup_status() -> Dict[str, Any]:
+    """Snapshot of the warm-up progress; `ready` is False only while a warm-up is running.
+
+    Gunicorn starts warm-up before a worker accepts connections, so a process
+    still at not_started was never asked to warm up (WARMUP_MODE=off, or not
+    run under gunicorn) and serves cold from the start.
+    """
+    with _status_lock:
+        status = {**_status, 'steps': [dict(step) for step in _status['steps']]}
+    status['ready'] = status['status'] in ('not_started', 'ready', 'degraded')
+    return status